@@ -7,81 +7,224 @@ instancia esté preparada para operar contra Matriz en modo LIVE.
 from __future__ import annotations
 
 import os
+import re
+import sys
 import json
-from dataclasses import dataclass
-from pathlib import Path
-from typing import Optional, Dict, Any
+import stat
+import functools
+from types import MappingProxyType
+from dataclasses import dataclass, field
+from typing import Any, ClassVar, Dict, Mapping, Optional, Tuple
+
+try:  # pragma: no cover - optional dependency
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:  # pragma: no cover - stdlib fallback
+    _json_loads = json.loads
+
+
+# Niveles de log válidos; aceptan mayúsculas o minúsculas sin llamar a .upper()
+_LOG_LEVELS: Dict[str, str] = {
+    variant: sys.intern(level)
+    for level in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+    for variant in (level, level.lower())
+}
+
+_DEFAULT_LIVE_URL = sys.intern("https://api.eco.xoms.com.ar/")
+_DEFAULT_BROKER_CFG = sys.intern("broker_config.json")
+
+# Defaults numéricos ya convertidos: si la variable no está, no se parsea nada
+_DEFAULT_COMMISSION_RATE = 0.005
+_DEFAULT_SESSION_TTL_HOURS = 8
+_DEFAULT_PYROFEX_TIMEOUT_SECONDS = 10
+
+# Directorio del módulo (para broker_config.json relativo al repo)
+_MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Referencia a variable de entorno en el campo password: "${MERVAL_PASSWORD}"
+_ENV_REF_RE = re.compile(r"^\$\{([^}]+)\}$")
+
+# Candidatos de broker_config.json que no existían (ENOENT) en la última lectura;
+# no se vuelven a probar con stat hasta `Settings.reload()`.
+_MISSING_PATHS: set[str] = set()
+
+
+@functools.lru_cache(maxsize=8)
+def _candidate_paths(config_path: str, cwd: str) -> Tuple[str, ...]:
+    """Rutas candidatas para broker_config.json, resueltas una vez por (path, cwd)."""
+    if os.path.isabs(config_path):
+        return (config_path,)
+    return (os.path.join(cwd, config_path), os.path.join(_MODULE_DIR, config_path))
+
+
+@functools.lru_cache(maxsize=8)
+def _read_broker_config_cached(path: str, mtime_ns: int, size: int) -> Dict[str, Any]:
+    """Parsear broker_config.json una sola vez por versión (mtime/tamaño) del archivo."""
+    with open(path, "rb") as f:
+        return _json_loads(f.read())
+
+
+_TRUE_BOOLS = frozenset({"1", "true", "t", "yes", "y"})
 
 
 def _to_bool(value: Optional[str], *, default: bool = False) -> bool:
     """Convertir str booleano en bool real."""
     if value is None:
         return default
-    return value.strip().lower() in {"1", "true", "t", "yes", "y"}
+    return value.strip().lower() in _TRUE_BOOLS
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Settings:
     """Valores de configuración para el servidor MCP.
 
     - Obliga entorno LIVE (sin modo REMARKET/offline).
     - Garantiza que las operaciones de MEP usen tasas reales.
     - Soporta configuración de brokers desde archivo JSON.
+    - Inmutable: para cambiar valores usar `Settings.reload()`.
     """
 
     log_level: str = "INFO"
-    commission_rate: float = 0.005
-    session_ttl_hours: int = 8
+    commission_rate: float = _DEFAULT_COMMISSION_RATE
+    session_ttl_hours: int = _DEFAULT_SESSION_TTL_HOURS
     marketdata_url: Optional[str] = None
     use_pyrofex_for_mep: bool = False
     force_live_environment: bool = True
-    pyrofx_live_url: str = "https://api.eco.xoms.com.ar/"
-    pyrofx_request_timeout: int = 10
+    # None → URL del broker por defecto de broker_config.json, o ECO (ver __post_init__)
+    pyrofx_live_url: Optional[str] = None
+    pyrofx_request_timeout: int = _DEFAULT_PYROFEX_TIMEOUT_SECONDS
     pyrofx_ws_insecure: bool = False
     require_credentials: bool = True
     mcp_api_key: Optional[str] = None
     broker_config_path: Optional[str] = None
     broker_config: Optional[Dict[str, Any]] = None
 
+    # Índices derivados de broker_config, calculados una vez en __post_init__
+    _brokers_by_id: Dict[str, Dict[str, Any]] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _users_by_id: Dict[str, Dict[str, Any]] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _default_broker: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
+    _default_broker_url: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    _broker_ids_tuple: Tuple[str, ...] = field(default=(), init=False, repr=False, compare=False)
+    _user_ids_tuple: Tuple[str, ...] = field(default=(), init=False, repr=False, compare=False)
+    # user_id -> (cuenta sin password, variable de entorno o None, password literal)
+    _user_templates: Dict[str, Tuple[Dict[str, Any], Optional[str], str]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    # Cuentas ya resueltas por get_user_account (se descartan con reload())
+    _user_cache: Dict[str, Mapping[str, Any]] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    _instance: ClassVar[Optional["Settings"]] = None
+
+    def __post_init__(self) -> None:
+        # Instancia congelada: los índices derivados se asignan con object.__setattr__
+        set_attr = object.__setattr__
+        if self.broker_config:
+            brokers = self.broker_config.get("brokers") or {}
+            users = self.broker_config.get("user_accounts") or {}
+            set_attr(self, "_brokers_by_id", brokers)
+            set_attr(self, "_users_by_id", users)
+            default_broker, default_broker_url = self._pick_default(brokers)
+            set_attr(self, "_default_broker", default_broker)
+            set_attr(self, "_default_broker_url", default_broker_url)
+            set_attr(self, "_broker_ids_tuple", tuple(brokers))
+            set_attr(self, "_user_ids_tuple", tuple(users))
+            set_attr(self, "_user_templates", {
+                user_id: self._compile_user_template(account)
+                for user_id, account in users.items()
+                if account
+            })
+
+        if self.pyrofx_live_url is None:
+            set_attr(self, "pyrofx_live_url", self._default_broker_url or _DEFAULT_LIVE_URL)
+
+    @staticmethod
+    def _pick_default(brokers: Dict[str, Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Devuelve (broker por defecto, su api_url) en una sola pasada, o (None, None)."""
+        for broker in brokers.values():
+            if broker.get("default", False):
+                return broker, broker.get("api_url")
+        return None, None
+
+    @staticmethod
+    def _compile_user_template(account: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str], str]:
+        """Separar el password de la cuenta y detectar si referencia una variable de entorno."""
+        template = {key: value for key, value in account.items() if key != "password"}
+        password = account.get("password", "")
+        match = _ENV_REF_RE.match(password) if isinstance(password, str) else None
+        if match:
+            return template, match.group(1), ""
+        return template, None, password
+
     @classmethod
     def load(cls) -> "Settings":
-        """Construye `Settings` leyendo variables de entorno y configuración de brokers."""
-        commission_rate = float(os.getenv("COMMISSION_RATE", "0.005"))
-        session_ttl_hours = int(os.getenv("SESSION_TTL_HOURS", "8"))
-        pyrofx_request_timeout = int(os.getenv("PYROFEX_TIMEOUT_SECONDS", "10"))
+        """Construye `Settings` leyendo variables de entorno y configuración de brokers.
+
+        La instancia se memoiza: llamadas posteriores devuelven la misma hasta
+        que se invoque `Settings.reload()`.
+        """
+        if cls._instance is not None:
+            return cls._instance
+
+        # Una sola referencia a os.environ; cada lectura es un dict.get local
+        env = os.environ.get
+        to_bool = _to_bool
+
+        raw_log_level = env("LOG_LEVEL", "INFO")
+        log_level = _LOG_LEVELS.get(raw_log_level) or sys.intern(raw_log_level.upper())
+
+        raw = env("COMMISSION_RATE")
+        commission_rate = _DEFAULT_COMMISSION_RATE if raw is None else float(raw)
+        raw = env("SESSION_TTL_HOURS")
+        session_ttl_hours = _DEFAULT_SESSION_TTL_HOURS if raw is None else int(raw)
+        raw = env("PYROFEX_TIMEOUT_SECONDS")
+        pyrofx_request_timeout = _DEFAULT_PYROFEX_TIMEOUT_SECONDS if raw is None else int(raw)
 
         # Load broker configuration if available
-        broker_config_path = os.getenv("BROKER_CONFIG_PATH", "broker_config.json")
+        broker_config_path = env("BROKER_CONFIG_PATH") or _DEFAULT_BROKER_CFG
         broker_config = cls._load_broker_config(broker_config_path)
 
-        # Use default broker URL from config, or fall back to env var or default ECO
-        default_broker_url = "https://api.eco.xoms.com.ar/"
-        if broker_config and "brokers" in broker_config:
-            # Find default broker
-            for broker_id, broker_data in broker_config["brokers"].items():
-                if broker_data.get("default", False):
-                    default_broker_url = broker_data.get("api_url", default_broker_url)
-                    break
-
         instance = cls(
-            log_level=os.getenv("LOG_LEVEL", "INFO").upper(),
+            log_level=log_level,
             commission_rate=commission_rate,
             session_ttl_hours=session_ttl_hours,
-            marketdata_url=os.getenv("MARKETDATA_URL"),
+            marketdata_url=env("MARKETDATA_URL"),
             # Predeterminado True para alinear con flujo recomendado (precios vía REST)
-            use_pyrofex_for_mep=_to_bool(os.getenv("USE_PYROFEX_FOR_MEP"), default=True),
-            force_live_environment=_to_bool(os.getenv("FORCE_LIVE_ENVIRONMENT"), default=True),
-            pyrofx_live_url=os.getenv("PYROFEX_URL", default_broker_url),
+            use_pyrofex_for_mep=to_bool(env("USE_PYROFEX_FOR_MEP"), default=True),
+            force_live_environment=to_bool(env("FORCE_LIVE_ENVIRONMENT"), default=True),
+            # Sin PYROFEX_URL (o vacía) se usa la URL del broker por defecto (resuelta en __post_init__)
+            pyrofx_live_url=env("PYROFEX_URL") or None,
             pyrofx_request_timeout=pyrofx_request_timeout,
-            pyrofx_ws_insecure=_to_bool(os.getenv("PYROFEX_WS_INSECURE"), default=False),
-            require_credentials=_to_bool(os.getenv("REQUIRE_BROKER_CREDENTIALS"), default=True),
-            mcp_api_key=os.getenv("MCP_API_KEY"),
+            pyrofx_ws_insecure=to_bool(env("PYROFEX_WS_INSECURE"), default=False),
+            require_credentials=to_bool(env("REQUIRE_BROKER_CREDENTIALS"), default=True),
+            mcp_api_key=env("MCP_API_KEY"),
             broker_config_path=broker_config_path,
             broker_config=broker_config,
         )
         instance.validate()
+        cls._instance = instance
         return instance
 
+    @classmethod
+    def reload(cls) -> "Settings":
+        """Limpia todas las cachés de configuración y vuelve a construir `Settings`.
+
+        Descarta el JSON parseado, los paths inexistentes, las rutas candidatas y
+        las cuentas resueltas por `get_user_account`. La nueva instancia se
+        publica como `config.settings`, que es lo que leen server.py y los
+        módulos de lib/ en cada uso.
+        """
+        global settings
+        _read_broker_config_cached.cache_clear()
+        _candidate_paths.cache_clear()
+        _MISSING_PATHS.clear()
+        if cls._instance is not None:
+            # No dejar passwords resueltos vivos en la instancia descartada
+            cls._instance._user_cache.clear()
+        cls._instance = None
+        settings = cls.load()
+        return settings
+
     @staticmethod
     def _load_broker_config(config_path: str) -> Optional[Dict[str, Any]]:
         """Load broker configuration from JSON file.
@@ -90,35 +233,39 @@ class Settings:
         directory containing this module, so the server works when launched
         from other repos.
         """
-        candidate_paths: list[Path] = []
-
-        path = Path(config_path)
-        if path.is_absolute():
-            candidate_paths.append(path)
-        else:
-            candidate_paths.append(Path.cwd() / path)
-            module_dir = Path(__file__).resolve().parent
-            candidate_paths.append(module_dir / path)
-
-        for candidate in candidate_paths:
+        for candidate in _candidate_paths(config_path, os.getcwd()):
+            if candidate in _MISSING_PATHS:
+                continue
+            # Single stat per candidate: existence and regular-file check together
             try:
-                if candidate.exists() and candidate.is_file():
-                    with open(candidate, "r", encoding="utf-8") as f:
-                        return json.load(f)
+                st = os.stat(candidate)
+            except FileNotFoundError:
+                # Negative cache only for ENOENT; other errors (EACCES, EIO) may be transient
+                _MISSING_PATHS.add(candidate)
+                continue
+            except OSError:
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            try:
+                # Cached per (path, mtime, size): edits to the file invalidate the entry
+                return _read_broker_config_cached(candidate, st.st_mtime_ns, st.st_size)
             except Exception:
-                # Silently ignore if config doesn't exist or fails to load
+                # Silently ignore if config fails to load
                 continue
 
         return None
 
     def validate(self) -> None:
         """Valida consistencia de la configuración cargada."""
-        if self.commission_rate < 0:
-            raise ValueError("COMMISSION_RATE no puede ser negativo")
-        if self.session_ttl_hours <= 0:
-            raise ValueError("SESSION_TTL_HOURS debe ser mayor a cero")
-        if self.pyrofx_request_timeout <= 0:
-            raise ValueError("PYROFEX_TIMEOUT_SECONDS debe ser mayor a cero")
+        errors = (
+            (self.commission_rate < 0, "COMMISSION_RATE no puede ser negativo"),
+            (self.session_ttl_hours <= 0, "SESSION_TTL_HOURS debe ser mayor a cero"),
+            (self.pyrofx_request_timeout <= 0, "PYROFEX_TIMEOUT_SECONDS debe ser mayor a cero"),
+        )
+        error = next((message for failed, message in errors if failed), None)
+        if error:
+            raise ValueError(error)
 
     @property
     def live_environment(self) -> str:
@@ -127,66 +274,72 @@ class Settings:
 
     def get_broker_config(self, broker_id: str) -> Optional[Dict[str, Any]]:
         """Get configuration for a specific broker by ID."""
-        if not self.broker_config or "brokers" not in self.broker_config:
-            return None
-        return self.broker_config["brokers"].get(broker_id)
+        return self._brokers_by_id.get(broker_id)
 
     def get_default_broker(self) -> Optional[Dict[str, Any]]:
         """Get the default broker configuration."""
-        if not self.broker_config or "brokers" not in self.broker_config:
-            return None
-        for broker_id, broker_data in self.broker_config["brokers"].items():
-            if broker_data.get("default", False):
-                return broker_data
-        return None
+        return self._default_broker
 
-    def list_available_brokers(self) -> list[str]:
-        """List all configured broker IDs."""
-        if not self.broker_config or "brokers" not in self.broker_config:
-            return []
-        return list(self.broker_config["brokers"].keys())
+    def list_available_brokers(self) -> Tuple[str, ...]:
+        """List all configured broker IDs (tuple precalculada, no se copia)."""
+        return self._broker_ids_tuple
 
-    def get_user_account(self, user_id: str) -> Optional[Dict[str, Any]]:
+    def get_user_account(self, user_id: str) -> Optional[Mapping[str, Any]]:
         """Get account configuration for a specific user.
 
         Supports environment variable substitution in password field.
         Example: "password": "${MERVAL_PASSWORD}" will read from env var.
 
+        The resolved account is memoized per user and returned as a read-only
+        `MappingProxyType`; callers that need to modify it must copy it with
+        `dict(...)`. Changes to the referenced env var require
+        `Settings.reload()`. A reference to an env var that is still unset is
+        not cached, so exporting it later takes effect.
+
         Args:
             user_id: User identifier from broker_config.json
 
         Returns:
-            Dict with 'broker', 'username', 'password', 'account' or None if not found
+            Read-only mapping with 'broker', 'username', 'password', 'account' or None if not found
         """
-        if not self.broker_config or "user_accounts" not in self.broker_config:
-            return None
+        cached = self._user_cache.get(user_id)
+        if cached is not None:
+            return cached
 
-        account = self.broker_config["user_accounts"].get(user_id)
-        if not account:
+        compiled = self._user_templates.get(user_id)
+        if compiled is None:
             return None
 
-        # Clone to avoid modifying original config
-        account = account.copy()
-
-        # Resolve environment variable in password if present
-        password = account.get("password", "")
-        if password.startswith("${") and password.endswith("}"):
-            env_var = password[2:-1]
-            account["password"] = os.getenv(env_var, "")
+        template, env_var, literal_password = compiled
+        if env_var:
+            password = os.environ.get(env_var)
+            if password is None:
+                return MappingProxyType({**template, "password": ""})
+        else:
+            password = literal_password
 
+        account = MappingProxyType({**template, "password": password})
+        self._user_cache[user_id] = account
         return account
 
-    def list_configured_users(self) -> list[str]:
-        """List all user IDs configured in user_accounts section."""
-        if not self.broker_config or "user_accounts" not in self.broker_config:
-            return []
-        return list(self.broker_config["user_accounts"].keys())
+    def list_configured_users(self) -> Tuple[str, ...]:
+        """List all user IDs configured in user_accounts section (tuple precalculada)."""
+        return self._user_ids_tuple
 
     def get_default_user(self) -> Optional[str]:
         """Get the first configured user ID, or None if no users configured."""
-        users = self.list_configured_users()
+        users = self._user_ids_tuple
         return users[0] if users else None
 
 
-settings = Settings.load()
-"""Instancia global de configuración, lista para importar."""
+def __getattr__(name: str) -> Any:
+    """Construye `settings` (instancia global de configuración) en el primer acceso.
+
+    Importar `config` no lee variables de entorno ni archivos; eso ocurre recién
+    cuando alguien pide `config.settings` (o `from config import settings`).
+    """
+    if name == "settings":
+        global settings
+        settings = Settings.load()
+        return settings
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
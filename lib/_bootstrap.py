@@ -0,0 +1,13 @@
+"""Put the vendored pyRofex sources on sys.path.
+
+Imported for its side effect by every module under lib/ that needs pyRofex;
+Python's module cache makes the path setup run once per process.
+"""
+
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PYROFEX_SRC = os.path.join(REPO_ROOT, "pyRofex-master", "src")
+if PYROFEX_SRC not in sys.path:
+    sys.path.insert(0, PYROFEX_SRC)
@@ -6,17 +6,18 @@ Provides symbol mapping, market segment handling, and parameter validation.
 """
 
 import os
+import re
 import sys
 import logging
 import time
-from typing import Dict, Any, List, Optional, Tuple
+import functools
+import threading
+from types import MappingProxyType
+from typing import Dict, Any, List, Mapping, Optional, Tuple
 from enum import Enum
 
 # Add pyRofex to path
-REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-PYROFEX_SRC = os.path.abspath(os.path.join(REPO_ROOT, "pyRofex-master", "src"))
-if PYROFEX_SRC not in sys.path:
-    sys.path.insert(0, PYROFEX_SRC)
+from lib import _bootstrap  # noqa: F401
 
 try:
     import pyRofex
@@ -29,8 +30,106 @@ except ImportError as e:
     logging.error(f"pyRofex not available: {e}")
     PYROFEX_AVAILABLE = False
 
+# String → pyRofex enum tables used by the map_* helpers (empty without pyRofex)
+if PYROFEX_AVAILABLE:
+    _SIDE_MAP = {"BUY": Side.BUY, "SELL": Side.SELL}
+    _ORDER_TYPE_MAP = {"MARKET": OrderType.MARKET, "LIMIT": OrderType.LIMIT}
+    # pyRofex names these members ImmediateOrCancel/FillOrKill/GoodTillDate
+    _TIF_MAP = {
+        "DAY": TimeInForce.DAY,
+        "IOC": TimeInForce.ImmediateOrCancel,
+        "FOK": TimeInForce.FillOrKill,
+        "GTD": TimeInForce.GoodTillDate,
+    }
+    _MD_ENTRY_MAP = {
+        "BIDS": MarketDataEntry.BIDS,
+        "BID": MarketDataEntry.BIDS,
+        "OFFERS": MarketDataEntry.OFFERS,
+        "OFFER": MarketDataEntry.OFFERS,
+        "ASK": MarketDataEntry.OFFERS,
+        "LAST": MarketDataEntry.LAST,
+        "TRADE": MarketDataEntry.LAST,
+        "VOLUME": MarketDataEntry.TRADE_VOLUME,
+        "HIGH": MarketDataEntry.HIGH_PRICE,
+        "LOW": MarketDataEntry.LOW_PRICE,
+        "OPEN": MarketDataEntry.OPENING_PRICE,
+        "CLOSE": MarketDataEntry.CLOSING_PRICE,
+    }
+    # MERV instruments use Market.ROFEX
+    _MARKET_MAP = {"ROFEX": Market.ROFEX, "MERV": Market.ROFEX}
+    _SEGMENT_MAP = {"DDF": MarketSegment.DDF, "MERV": MarketSegment.MERV}
+    _CFI_MAP = {"STOCK": CFICode.STOCK, "BOND": CFICode.BOND, "CEDEAR": CFICode.CEDEAR}
+else:
+    _SIDE_MAP = _ORDER_TYPE_MAP = _TIF_MAP = _MD_ENTRY_MAP = {}
+    _MARKET_MAP = _SEGMENT_MAP = _CFI_MAP = {}
+
 logger = logging.getLogger(__name__)
 
+# Symbol format accepted by validate_symbol (e.g. "GGAL", "DLR/DIC23")
+_SYMBOL_RE = re.compile(r'^[A-Z0-9]+(/[A-Z]{3}\d{2})?(-\w+)?$')
+
+# Settlement terms, bare ("<ROOT> - 24HS") and space-prefixed ("<ROOT> 24HS"),
+# as tuples so a single C-level str.endswith() checks all of them
+_SETTLEMENT_SHORT = ("24HS", "48HS", "CI", "T0", "T1")
+_SETTLEMENT_SPACED = tuple(f" {term}" for term in _SETTLEMENT_SHORT)
+
+# BYMA tickers: "MERV - XMEV - <ROOT> - <SETTLEMENT>" and "<ROOT> - <SETTLEMENT>"
+_BYMA_FULL_RE = re.compile(r'^MERV\s* - \s*XMEV\s* - (.*?) - ')
+_BYMA_SHORT_RE = re.compile(r'^((?:(?! - ).)*) - \s*(?:' + "|".join(_SETTLEMENT_SHORT) + r')$')
+
+# Currency suffixes for bond tickers (AL30 → AL30D, AL30C, ...)
+_CURRENCY_SUFFIXES = ("D", "C", "N", "L")
+
+
+def _div100(v: Any) -> Any:
+    """Broker units → display units for bond prices; non-numeric values pass through."""
+    # Numeric fast path: skip float() for values that already are numbers;
+    # round() stays so 80123.3 shows as 801.233 and not 801.2330000000001
+    if type(v) is float or type(v) is int:
+        return round(v / 100.0, 6)
+    if v is None:
+        return None
+    try:
+        return round(float(v) / 100.0, 6)
+    except Exception:
+        return v
+
+
+def _expand_bond_keys(keys: set) -> frozenset:
+    """
+    Build the single membership set used by `is_bond_symbol`.
+
+    Adds, for every known key, its currency-suffixed variants and its
+    suffix-stripped form, so a query only needs to test the symbol and its
+    root instead of expanding candidates on each call. Keys are interned so
+    lookups with interned queries hit the identity shortcut.
+    """
+    base = set(keys)
+    for key in keys:
+        if len(key) > 1 and key.endswith(_CURRENCY_SUFFIXES):
+            base.add(key[:-1])
+    expanded = set(base)
+    for key in base:
+        for suffix in _CURRENCY_SUFFIXES:
+            expanded.add(f"{key}{suffix}")
+    return frozenset(map(sys.intern, expanded))
+
+
+# Fallback common bond roots if remote fetch is unavailable (env read once, at import)
+_BOND_FALLBACK_ROOTS = frozenset(
+    root.strip()
+    for root in (os.getenv("BOND_FALLBACK_ROOTS") or "AL30,AL35,GD30,GD35,AE38,AL41,GD41").upper().split(",")
+    if root.strip()
+)
+# Fallback roots plus their currency variants (AL30, AL30D, AL30C, ...)
+_BOND_FALLBACK_VARIANTS = frozenset(
+    _BOND_FALLBACK_ROOTS | {f"{root}{suffix}" for root in _BOND_FALLBACK_ROOTS for suffix in _CURRENCY_SUFFIXES}
+)
+_BOND_FALLBACK_KEYS = _expand_bond_keys(_BOND_FALLBACK_ROOTS)
+
+# (ARS side, USD side) combinations accepted for a MEP order pair
+_VALID_MEP_SIDES = frozenset({("BUY", "SELL"), ("SELL", "BUY")})
+
 
 class MarketHelpers:
     """Utility functions for market operations and data transformation."""
@@ -61,19 +160,27 @@ class MarketHelpers:
         "MIRGOR": "MIRG",
         "MOLINOS": "MOLI",
     }
+    # Same aliases also reachable with spaces ("BANCO MACRO"), so lookups need a single probe
+    _ALIAS_LOOKUP: Dict[str, str] = {
+        **{alias.replace("_", " "): canonical for alias, canonical in _ALIAS_MAP.items()},
+        **_ALIAS_MAP,
+    }
     
     # ---------------------------------------------------------------------
     # Bond instrument cache (for price normalization decisions)
     # ---------------------------------------------------------------------
+    BOND_CACHE_TTL_SECONDS: int = int(os.getenv("BOND_CACHE_TTL_SECONDS", "43200"))  # 12h
     _bond_cache: Dict[str, Any] = {
         "root_symbols": set(),      # e.g., {"AL30", "GD30"}
         "full_tickers": set(),      # e.g., {"MERV - XMEV - AL30 - 24hs", ...}
         "symbol_variants": set(),   # e.g., {"AL30", "AL30D"}
-        "updated_at": 0.0
+        # Union of the sets above plus fallback roots, expanded with currency suffixes
+        "all_keys": _BOND_FALLBACK_KEYS,
+        "updated_at": 0.0           # time.monotonic() of last build; 0.0 = never built
     }
-    BOND_CACHE_TTL_SECONDS: int = int(os.getenv("BOND_CACHE_TTL_SECONDS", "43200"))  # 12h
-    # Fallback common bond roots if remote fetch is unavailable
-    _BOND_FALLBACK_ROOTS: set = set((os.getenv("BOND_FALLBACK_ROOTS") or "AL30,AL35,GD30,GD35,AE38,AL41,GD41").upper().split(","))
+    # Serializes the first (synchronous) load and the start of background refreshes
+    _refresh_lock = threading.Lock()
+    _refresh_inflight = threading.Event()
 
     @staticmethod
     def _extract_root_symbol(symbol: str) -> str:
@@ -83,25 +190,70 @@ class MarketHelpers:
         """
         if not symbol:
             return symbol
-        s = symbol.strip().upper()
+        return MarketHelpers._extract_root_symbol_upper(symbol.strip().upper())
+
+    @staticmethod
+    def _extract_root_symbol_upper(s: str) -> str:
+        """`_extract_root_symbol` for input that is already stripped and upper-cased."""
+        # Plain roots ("AL30", "GGAL") are the common case: no separator, nothing to extract
+        if " - " not in s:
+            return s
         # Typical format: MERV - XMEV - <ROOT> - <SETTLEMENT>
-        parts = [p.strip() for p in s.split(" - ")]
-        if len(parts) >= 4 and parts[0] == "MERV" and parts[1] == "XMEV":
-            return parts[2]
+        if s.startswith("MERV"):
+            match = _BYMA_FULL_RE.match(s)
+            if match:
+                return match.group(1).strip()
         # Also support simpler format: <ROOT> - <SETTLEMENT>
-        if len(parts) == 2 and parts[1] in ("24HS", "48HS", "CI", "T0", "T1"):
-            return parts[0]
+        if s.endswith(_SETTLEMENT_SHORT):
+            match = _BYMA_SHORT_RE.match(s)
+            if match:
+                return match.group(1).strip()
         return s
 
     @staticmethod
     def _refresh_bond_cache_if_needed() -> None:
+        """
+        Refresh the bond cache when its TTL expired (stale-while-revalidate).
+
+        The first load runs synchronously; later refreshes run in a daemon
+        thread while lookups keep using the previous cache.
+        """
         if not PYROFEX_AVAILABLE:
             return
-        now = time.time()
-        cache = MarketHelpers._bond_cache
+        # Monotonic clock: wall-clock jumps (NTP) must not trigger or delay refreshes
+        now = time.monotonic()
+        ttl = MarketHelpers.BOND_CACHE_TTL_SECONDS
+        updated_at = MarketHelpers._bond_cache["updated_at"]
         # Throttle refreshes regardless of whether previous fetch returned data
-        if cache.get("updated_at", 0) and (now - cache["updated_at"]) < MarketHelpers.BOND_CACHE_TTL_SECONDS:
+        if updated_at and (now - updated_at) < ttl:
             return
+        if not updated_at:
+            with MarketHelpers._refresh_lock:
+                # Another thread may have finished the first load while we waited
+                if not MarketHelpers._bond_cache.get("updated_at", 0):
+                    MarketHelpers._rebuild_bond_cache(now)
+            return
+        with MarketHelpers._refresh_lock:
+            if MarketHelpers._refresh_inflight.is_set():
+                return
+            MarketHelpers._refresh_inflight.set()
+        threading.Thread(
+            target=MarketHelpers._background_refresh,
+            args=(now,),
+            name="bond-cache-refresh",
+            daemon=True,
+        ).start()
+
+    @staticmethod
+    def _background_refresh(now: float) -> None:
+        try:
+            MarketHelpers._rebuild_bond_cache(now)
+        finally:
+            MarketHelpers._refresh_inflight.clear()
+
+    @staticmethod
+    def _rebuild_bond_cache(now: float) -> None:
+        """Fetch bond instruments and swap in a freshly built cache."""
         try:
             result = pyRofex.get_instruments('by_cfi', cfi_code=[CFICode.BOND])
             instruments = result.get("instruments", []) if isinstance(result, dict) else []
@@ -113,35 +265,41 @@ class MarketHelpers:
                 sym = instrument_id.get("symbol")
                 if not sym:
                     continue
-                s_upper = str(sym).upper()
+                s_upper = sys.intern(str(sym).strip().upper())
                 full_set.add(s_upper)
-                root = MarketHelpers._extract_root_symbol(s_upper)
+                root = sys.intern(MarketHelpers._extract_root_symbol_upper(s_upper))
                 root_set.add(root)
                 variant_set.add(s_upper)
                 variant_set.add(root)
                 # Precompute common currency suffix variants so AL30D, AL30C etc. are recognized
-                for suffix in ("D", "C", "N", "L"):
+                for suffix in _CURRENCY_SUFFIXES:
                     variant_set.add(f"{root}{suffix}")
 
             # If remote delivers no bond instruments, fall back to known common roots
             if not root_set:
-                fallback_roots = MarketHelpers._BOND_FALLBACK_ROOTS
-                for root in fallback_roots:
-                    root_set.add(root)
-                    variant_set.add(root)
-                    for suffix in ("D", "C", "N", "L"):
-                        variant_set.add(f"{root}{suffix}")
+                root_set = set(_BOND_FALLBACK_ROOTS)
+                variant_set = set(_BOND_FALLBACK_VARIANTS)
                 full_set = set()
+                all_keys = _BOND_FALLBACK_KEYS
                 logger.debug("Bond cache using fallback roots (remote empty)")
-
-            cache["root_symbols"] = root_set
-            cache["full_tickers"] = full_set
-            cache["symbol_variants"] = variant_set
-            cache["updated_at"] = now
+            else:
+                all_keys = _expand_bond_keys(root_set | variant_set | full_set | _BOND_FALLBACK_ROOTS)
+
+            # Built off to the side and published with a single assignment, so
+            # concurrent lookups see either the old or the new cache, never a mix
+            MarketHelpers._bond_cache = {
+                "root_symbols": root_set,
+                "full_tickers": full_set,
+                "symbol_variants": variant_set,
+                "all_keys": all_keys,
+                "updated_at": now,
+            }
+            # Las respuestas memoizadas contra el key set anterior ya no sirven
+            MarketHelpers._is_bond_symbol_cached.cache_clear()
             logger.info(f"Bond cache built: roots={len(root_set)}, full_tickers={len(full_set)}")
         except Exception as e:
             # Avoid tight loop on repeated failures
-            cache["updated_at"] = now
+            MarketHelpers._bond_cache["updated_at"] = now
             logger.warning(f"Failed to refresh bond cache: {e}")
 
     @staticmethod
@@ -153,55 +311,24 @@ class MarketHelpers:
         if not symbol:
             return False
         MarketHelpers._refresh_bond_cache_if_needed()
-        s_upper = symbol.strip().upper()
-        root = MarketHelpers._extract_root_symbol(s_upper)
-
-        candidates = {s_upper, root}
-
-        # If symbol carries a currency suffix (e.g., AL30D), include stripped variant
-        for suffix in ("D", "C", "N", "L"):
-            if s_upper.endswith(suffix) and len(s_upper) > len(suffix):
-                candidates.add(s_upper[:-len(suffix)])
-                if root.endswith(suffix):
-                    candidates.add(root[:-len(suffix)])
-
-        normalized_candidates = set()
-        for cand in candidates:
-            if not cand:
-                continue
-            normalized_candidates.add(cand)
-            normalized_candidates.add(MarketHelpers._extract_root_symbol(cand))
-
-        # Include derived variants (root + currency suffixes) for completeness
-        derived = set()
-        for cand in normalized_candidates:
-            if not cand:
-                continue
-            for suffix in ("D", "C", "N", "L"):
-                derived.add(f"{cand}{suffix}")
-        candidates |= normalized_candidates | derived
-
-        cache = MarketHelpers._bond_cache
-        symbol_variants = cache.get("symbol_variants", set())
-        if any(candidate in symbol_variants for candidate in candidates):
-            return True
-
-        if any(candidate in cache["full_tickers"] for candidate in candidates):
-            return True
-
-        if any(candidate in cache["root_symbols"] for candidate in candidates):
-            return True
+        return MarketHelpers._is_bond_symbol_cached(symbol, MarketHelpers._bond_cache["all_keys"])
 
-        # Fallback on common bond roots when cache is empty or refresh failed
-        fallback_roots = MarketHelpers._BOND_FALLBACK_ROOTS
-        if not cache["root_symbols"] and not cache["full_tickers"]:
-            return any(candidate in fallback_roots for candidate in candidates)
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _is_bond_symbol_cached(symbol: str, keys: frozenset) -> bool:
+        """
+        Bond lookup memoized per (symbol, key set).
 
-        # If cache exists but symbol not found, rely on fallback as last resort
-        if any(candidate in fallback_roots for candidate in candidates):
+        Keying on the key set itself (its hash is cached by frozenset) keeps a
+        lookup racing with a background refresh from memoizing a stale answer.
+        """
+        s_upper = sys.intern(symbol.strip().upper())
+        if s_upper in keys:
             return True
-
-        return False
+        # Plain symbols are their own root; only BYMA tickers need a second probe
+        if " - " not in s_upper:
+            return False
+        return MarketHelpers._extract_root_symbol_upper(s_upper) in keys
 
     @staticmethod
     def normalize_price_for_display(symbol: str, price: Optional[float]) -> Optional[float]:
@@ -212,10 +339,7 @@ class MarketHelpers:
         if price is None:
             return None
         if MarketHelpers.is_bond_symbol(symbol):
-            try:
-                return round(float(price) / 100.0, 6)
-            except Exception:
-                return price
+            return _div100(price)
         return price
 
     @staticmethod
@@ -243,21 +367,10 @@ class MarketHelpers:
             return data
         if not MarketHelpers.is_bond_symbol(symbol):
             return data
-
-        def _div100(v: Any) -> Any:
-            if v is None:
-                return None
-            try:
-                return round(float(v) / 100.0, 6)
-            except Exception:
-                return v
-
-        if "bid" in data and isinstance(data["bid"], dict):
-            data["bid"]["price"] = _div100(data["bid"].get("price"))
-        if "offer" in data and isinstance(data["offer"], dict):
-            data["offer"]["price"] = _div100(data["offer"].get("price"))
-        if "last" in data and isinstance(data["last"], dict):
-            data["last"]["price"] = _div100(data["last"].get("price"))
+        for key in ("bid", "offer", "last"):
+            block = data.get(key)
+            if isinstance(block, dict):
+                block["price"] = _div100(block.get("price"))
         for key in ("open", "close", "high", "low"):
             if key in data:
                 data[key] = _div100(data.get(key))
@@ -278,9 +391,7 @@ class MarketHelpers:
             return False
         
         # Basic validation - allow alphanumeric, /, -, and common suffixes
-        import re
-        pattern = r'^[A-Z0-9]+(/[A-Z]{3}\d{2})?(-\w+)?$'
-        return bool(re.match(pattern, symbol.upper()))
+        return _SYMBOL_RE.match(symbol.upper()) is not None
     
     @staticmethod
     def canonicalize_symbol(symbol: str) -> str:
@@ -309,20 +420,15 @@ class MarketHelpers:
         base = s_upper
         
         # Handle BYMA formatted full tickers: MERV - XMEV - <ROOT> - <TERM>
-        parts = [p.strip() for p in base.split(" - ")]
-        if len(parts) >= 4 and parts[0] == "MERV" and parts[1] == "XMEV":
-            base = parts[2]
-        else:
-            # Strip common settlement suffixes if present at the end
-            for suffix in (" 24HS", " 48HS", " CI", " T0", " T1"):
-                if base.endswith(suffix):
-                    base = base[: -len(suffix)]
-                    break
-        
-        # Some inputs may come with underscores instead of spaces
-        base_alt = base.replace(" ", "_")
-        
-        mapped = MarketHelpers._ALIAS_MAP.get(base) or MarketHelpers._ALIAS_MAP.get(base_alt)
+        match = _BYMA_FULL_RE.match(base) if base.startswith("MERV") else None
+        if match:
+            base = match.group(1).strip()
+        elif base.endswith(_SETTLEMENT_SPACED):
+            # Strip common settlement suffix (" 24HS", " CI", ...) present at the end
+            base = base[: base.rindex(" ")]
+        
+        # Aliases are indexed with both underscores and spaces
+        mapped = MarketHelpers._ALIAS_LOOKUP.get(base)
         if mapped and mapped != base:
             try:
                 logger.info(f"Canonicalized symbol '{symbol}' → '{mapped}'")
@@ -345,14 +451,7 @@ class MarketHelpers:
         """
         if not PYROFEX_AVAILABLE:
             return None
-        
-        side_upper = side.upper()
-        if side_upper == "BUY":
-            return Side.BUY
-        elif side_upper == "SELL":
-            return Side.SELL
-        else:
-            return None
+        return _SIDE_MAP.get(side.upper())
     
     @staticmethod
     def map_order_type_to_enum(order_type: str) -> Optional['OrderType']:
@@ -367,14 +466,7 @@ class MarketHelpers:
         """
         if not PYROFEX_AVAILABLE:
             return None
-        
-        type_upper = order_type.upper()
-        if type_upper == "MARKET":
-            return OrderType.MARKET
-        elif type_upper == "LIMIT":
-            return OrderType.LIMIT
-        else:
-            return None
+        return _ORDER_TYPE_MAP.get(order_type.upper())
     
     @staticmethod
     def map_time_in_force_to_enum(tif: str) -> Optional['TimeInForce']:
@@ -389,18 +481,7 @@ class MarketHelpers:
         """
         if not PYROFEX_AVAILABLE:
             return None
-        
-        tif_upper = tif.upper()
-        if tif_upper == "DAY":
-            return TimeInForce.DAY
-        elif tif_upper == "IOC":
-            return TimeInForce.IOC
-        elif tif_upper == "FOK":
-            return TimeInForce.FOK
-        elif tif_upper == "GTD":
-            return TimeInForce.GTD
-        else:
-            return None
+        return _TIF_MAP.get(tif.upper())
     
     @staticmethod
     def map_market_data_entries(entries: List[str]) -> List['MarketDataEntry']:
@@ -416,27 +497,16 @@ class MarketHelpers:
         if not PYROFEX_AVAILABLE:
             return []
         
-        mapped = []
-        for entry in entries:
-            entry_upper = entry.upper()
-            if entry_upper == "BIDS" or entry_upper == "BID":
-                mapped.append(MarketDataEntry.BIDS)
-            elif entry_upper == "OFFERS" or entry_upper == "OFFER" or entry_upper == "ASK":
-                mapped.append(MarketDataEntry.OFFERS)
-            elif entry_upper == "LAST" or entry_upper == "TRADE":
-                mapped.append(MarketDataEntry.LAST)
-            elif entry_upper == "VOLUME":
-                mapped.append(MarketDataEntry.VOLUME)
-            elif entry_upper == "HIGH":
-                mapped.append(MarketDataEntry.HIGH)
-            elif entry_upper == "LOW":
-                mapped.append(MarketDataEntry.LOW)
-            elif entry_upper == "OPEN":
-                mapped.append(MarketDataEntry.OPEN)
-            elif entry_upper == "CLOSE":
-                mapped.append(MarketDataEntry.CLOSE)
-        
-        return mapped
+        # Fresh list per call: the memoized tuple is shared
+        return list(MarketHelpers._map_market_data_entries_cached(tuple(entries)))
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=512)
+    def _map_market_data_entries_cached(entries: Tuple[str, ...]) -> Tuple['MarketDataEntry', ...]:
+        """Entry mapping memoized per entry tuple."""
+        # Unknown entries are skipped
+        lookup = _MD_ENTRY_MAP.get
+        return tuple(mapped for mapped in (lookup(entry.upper()) for entry in entries) if mapped is not None)
     
     @staticmethod
     def map_market_to_enum(market: str) -> Optional['Market']:
@@ -451,14 +521,7 @@ class MarketHelpers:
         """
         if not PYROFEX_AVAILABLE:
             return None
-        
-        market_upper = market.upper()
-        if market_upper == "ROFEX":
-            return Market.ROFEX
-        elif market_upper == "MERV":
-            return Market.ROFEX  # MERV instruments use Market.ROFEX
-        else:
-            return None
+        return _MARKET_MAP.get(market.upper())
     
     @staticmethod
     def map_market_segment_to_enum(segment: str) -> Optional['MarketSegment']:
@@ -473,14 +536,7 @@ class MarketHelpers:
         """
         if not PYROFEX_AVAILABLE:
             return None
-        
-        segment_upper = segment.upper()
-        if segment_upper == "DDF":
-            return MarketSegment.DDF
-        elif segment_upper == "MERV":
-            return MarketSegment.MERV
-        else:
-            return None
+        return _SEGMENT_MAP.get(segment.upper())
     
     @staticmethod
     def map_cfi_code_to_enum(cfi_code: str) -> Optional['CFICode']:
@@ -495,16 +551,7 @@ class MarketHelpers:
         """
         if not PYROFEX_AVAILABLE:
             return None
-        
-        cfi_upper = cfi_code.upper()
-        if cfi_upper == "STOCK":
-            return CFICode.STOCK
-        elif cfi_upper == "BOND":
-            return CFICode.BOND
-        elif cfi_upper == "CEDEAR":
-            return CFICode.CEDEAR
-        else:
-            return None
+        return _CFI_MAP.get(cfi_code.upper())
     
     @staticmethod
     def format_market_data_response(response: Dict[str, Any]) -> Dict[str, Any]:
@@ -527,48 +574,54 @@ class MarketHelpers:
             available_keys = list(response.keys()) if response else []
             return {"error": f"No 'marketData' key in response. Available keys: {available_keys}"}
         
-        market_data = response["marketData"]
+        md = response["marketData"]
+        inst = response.get("instrumentId") or {}
+        data: Dict[str, Any] = {}
         formatted = {
-            "symbol": response.get("instrumentId", {}).get("symbol", ""),
-            "market": response.get("instrumentId", {}).get("marketId", ""),
+            "symbol": inst.get("symbol", ""),
+            "market": inst.get("marketId", ""),
             "timestamp": response.get("timestamp"),
-            "data": {}
+            "data": data
         }
         
         # Extract common fields - handle None values gracefully
-        if "BI" in market_data and market_data["BI"] and len(market_data["BI"]) > 0:
-            formatted["data"]["bid"] = {
-                "price": market_data["BI"][0].get("price"),
-                "size": market_data["BI"][0].get("size")
-            }
-
-        if "OF" in market_data and market_data["OF"] and len(market_data["OF"]) > 0:
-            formatted["data"]["offer"] = {
-                "price": market_data["OF"][0].get("price"),
-                "size": market_data["OF"][0].get("size")
-            }
-
-        if "LA" in market_data and market_data["LA"]:
-            formatted["data"]["last"] = {
-                "price": market_data["LA"].get("price"),
-                "size": market_data["LA"].get("size"),
-                "datetime": market_data["LA"].get("datetime")
+        bi = md.get("BI")
+        if bi:
+            top = bi[0]
+            data["bid"] = {"price": top.get("price"), "size": top.get("size")}
+
+        of = md.get("OF")
+        if of:
+            top = of[0]
+            data["offer"] = {"price": top.get("price"), "size": top.get("size")}
+
+        la = md.get("LA")
+        if la:
+            data["last"] = {
+                "price": la.get("price"),
+                "size": la.get("size"),
+                "datetime": la.get("datetime")
             }
         
-        if "OP" in market_data:
-            formatted["data"]["open"] = market_data["OP"].get("price")
+        op = md.get("OP")
+        if op is not None:
+            data["open"] = op.get("price")
         
-        if "CL" in market_data:
-            formatted["data"]["close"] = market_data["CL"].get("price")
+        cl = md.get("CL")
+        if cl is not None:
+            data["close"] = cl.get("price")
         
-        if "HI" in market_data:
-            formatted["data"]["high"] = market_data["HI"].get("price")
+        hi = md.get("HI")
+        if hi is not None:
+            data["high"] = hi.get("price")
         
-        if "LO" in market_data:
-            formatted["data"]["low"] = market_data["LO"].get("price")
+        lo = md.get("LO")
+        if lo is not None:
+            data["low"] = lo.get("price")
         
-        if "VU" in market_data:
-            formatted["data"]["volume"] = market_data["VU"].get("size")
+        vu = md.get("VU")
+        if vu is not None:
+            data["volume"] = vu.get("size")
         
         return formatted
     
@@ -594,14 +647,15 @@ class MarketHelpers:
             return {"error": f"No 'order' key in response. Available keys: {available_keys}"}
         
         order = response["order"]
-        symbol_from_resp = (order.get("instrumentId", {}) or {}).get("symbol")
+        inst = order.get("instrumentId") or {}
+        symbol_from_resp = inst.get("symbol")
         raw_price = order.get("price")
         normalized_price = MarketHelpers.normalize_price_for_display(symbol_from_resp or "", raw_price)
         return {
             "order_id": order.get("clientId"),
             "proprietary": order.get("proprietary"),
             "symbol": symbol_from_resp,
-            "market": order.get("instrumentId", {}).get("marketId"),
+            "market": inst.get("marketId"),
             "side": order.get("side"),
             "type": order.get("type"),
             "quantity": order.get("orderQty"),
@@ -656,6 +710,7 @@ class MarketHelpers:
         return True, None
     
     @staticmethod
+    @functools.lru_cache(maxsize=512)
     def detect_market_and_ticker(symbol: str, settlement: str = "24hs") -> Tuple[Optional['Market'], str]:
         """
         Auto-detect market and construct full ticker for BYMA instruments.
@@ -717,25 +772,30 @@ class MarketHelpers:
     # MEP DOLLAR TRADING HELPERS
     # =============================================================================
 
+    # ARS bond → USD counterpart, and the reverse index for USD → ARS lookups
+    _MEP_PAIRS: Dict[str, str] = {
+        "AL30": "AL30D",
+        "GD30": "GD30D",
+        "AE38": "AE38D",
+        "AL35": "AL35D",
+        "GD35": "GD35D",
+        "AL41": "AL41D",
+        "GD41": "GD41D",
+        "DICP": "DICPD",
+        "CUAP": "CUAPD",
+    }
+    _MEP_PAIRS_REV: Dict[str, str] = {usd: ars for ars, usd in _MEP_PAIRS.items()}
+    _MEP_PAIRS_VIEW: Mapping[str, str] = MappingProxyType(_MEP_PAIRS)
+
     @staticmethod
-    def get_mep_bond_pairs() -> Dict[str, str]:
+    def get_mep_bond_pairs() -> Mapping[str, str]:
         """
         Get available MEP bond pairs (ARS/USD).
 
         Returns:
-            Dictionary mapping ARS bond symbol to its USD counterpart
+            Read-only mapping from ARS bond symbol to its USD counterpart
         """
-        return {
-            "AL30": "AL30D",
-            "GD30": "GD30D",
-            "AE38": "AE38D",
-            "AL35": "AL35D",
-            "GD35": "GD35D",
-            "AL41": "AL41D",
-            "GD41": "GD41D",
-            "DICP": "DICPD",
-            "CUAP": "CUAPD",
-        }
+        return MarketHelpers._MEP_PAIRS_VIEW
 
     @staticmethod
     def is_mep_eligible_bond(symbol: str) -> bool:
@@ -748,9 +808,7 @@ class MarketHelpers:
         Returns:
             True if bond can be used for MEP
         """
-        mep_pairs = MarketHelpers.get_mep_bond_pairs()
-        base_symbol = symbol.rstrip('D')  # Remove 'D' suffix if present
-        return base_symbol in mep_pairs
+        return symbol in MarketHelpers._MEP_PAIRS or symbol in MarketHelpers._MEP_PAIRS_REV
 
     @staticmethod
     def get_mep_counterpart(symbol: str) -> Optional[str]:
@@ -763,15 +821,8 @@ class MarketHelpers:
         Returns:
             Counterpart symbol (e.g., "AL30D" for "AL30", "AL30" for "AL30D")
         """
-        mep_pairs = MarketHelpers.get_mep_bond_pairs()
-
-        if symbol.endswith('D'):
-            # USD bond -> ARS bond
-            base_symbol = symbol[:-1]  # Remove 'D'
-            return base_symbol if base_symbol in mep_pairs else None
-        else:
-            # ARS bond -> USD bond
-            return mep_pairs.get(symbol)
+        # ARS bond -> USD bond, or USD bond -> ARS bond
+        return MarketHelpers._MEP_PAIRS.get(symbol) or MarketHelpers._MEP_PAIRS_REV.get(symbol)
 
     @staticmethod
     def detect_mep_operation(orders: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
@@ -787,28 +838,17 @@ class MarketHelpers:
         if len(orders) != 2:
             return None
 
-        symbols = [order.get('symbol', '') for order in orders]
-        sides = [order.get('side', '') for order in orders]
-
-        # Check if we have a bond pair
-        ars_symbols = [s for s in symbols if not s.endswith('D')]
-        usd_symbols = [s for s in symbols if s.endswith('D')]
-
-        if len(ars_symbols) != 1 or len(usd_symbols) != 1:
+        # Classify both orders in one pass: exactly one ARS bond and one USD ("D") bond
+        first, second = orders
+        first_is_usd = first.get('symbol', '').endswith('D')
+        if first_is_usd == second.get('symbol', '').endswith('D'):
             return None
-
-        ars_bond = ars_symbols[0]
-        usd_bond = usd_symbols[0]
+        usd_order, ars_order = (first, second) if first_is_usd else (second, first)
+        ars_bond = ars_order.get('symbol', '')
+        usd_bond = usd_order['symbol']
 
         # Verify it's a valid MEP pair
-        if MarketHelpers.get_mep_counterpart(ars_bond) != usd_bond:
-            return None
-
-        # Find the orders for each bond
-        ars_order = next((o for o in orders if o.get('symbol') == ars_bond), None)
-        usd_order = next((o for o in orders if o.get('symbol') == usd_bond), None)
-
-        if not ars_order or not usd_order:
+        if MarketHelpers._MEP_PAIRS.get(ars_bond) != usd_bond:
             return None
 
         # Determine operation type based on USD bond side
@@ -843,81 +883,76 @@ class MarketHelpers:
             Tuple of (is_valid, error_message)
         """
         try:
-            # Check symbols
-            ars_symbol = ars_order.get('symbol', '')
-            usd_symbol = usd_order.get('symbol', '')
-
-            if not MarketHelpers.is_mep_eligible_bond(ars_symbol):
-                return False, f"Bond {ars_symbol} is not MEP eligible"
+            # Read each field once
+            ars_get, usd_get = ars_order.get, usd_order.get
+            ars_symbol, usd_symbol = ars_get('symbol', ''), usd_get('symbol', '')
+            ars_size, usd_size = ars_get('size', 0), usd_get('size', 0)
+            ars_settlement, usd_settlement = ars_get('settlement', 'T1'), usd_get('settlement', 'T1')
 
+            # Check symbols (only MEP-eligible bonds have a counterpart)
             expected_usd = MarketHelpers.get_mep_counterpart(ars_symbol)
+            if expected_usd is None:
+                return False, f"Bond {ars_symbol} is not MEP eligible"
             if usd_symbol != expected_usd:
                 return False, f"Invalid MEP pair: {ars_symbol} should pair with {expected_usd}, not {usd_symbol}"
 
-            # Check quantities match
-            ars_size = ars_order.get('size', 0)
-            usd_size = usd_order.get('size', 0)
-
+            # Cheap equality checks before normalizing sides
             if ars_size != usd_size:
                 return False, f"MEP order sizes must match: ARS={ars_size}, USD={usd_size}"
+            if ars_settlement != usd_settlement:
+                return False, f"MEP orders must have same settlement: ARS={ars_settlement}, USD={usd_settlement}"
 
             # Check sides are opposite
-            ars_side = ars_order.get('side', '').upper()
-            usd_side = usd_order.get('side', '').upper()
-
-            valid_combinations = [('BUY', 'SELL'), ('SELL', 'BUY')]
-            if (ars_side, usd_side) not in valid_combinations:
+            ars_side = ars_get('side', '').upper()
+            usd_side = usd_get('side', '').upper()
+            if (ars_side, usd_side) not in _VALID_MEP_SIDES:
                 return False, f"Invalid MEP side combination: ARS={ars_side}, USD={usd_side}"
 
-            # Check settlement (should be same)
-            ars_settlement = ars_order.get('settlement', 'T1')
-            usd_settlement = usd_order.get('settlement', 'T1')
-
-            if ars_settlement != usd_settlement:
-                return False, f"MEP orders must have same settlement: ARS={ars_settlement}, USD={usd_settlement}"
-
             return True, "Valid MEP order pair"
 
         except Exception as e:
             return False, f"Error validating MEP pair: {str(e)}"
 
+    # Recommended MEP bonds with metadata, built once; the getter hands out plain dict copies
+    _RECOMMENDED_MEP_BONDS: Tuple[Dict[str, Any], ...] = (
+        {
+            'symbol': 'AL30',
+            'usd_symbol': 'AL30D',
+            'name': 'BODEN 2030',
+            'currency': 'USD',
+            'maturity': '2030-07-09',
+            'liquidity': 'high',
+            'recommended': True,
+            'description': 'Bono más líquido para operaciones MEP'
+        },
+        {
+            'symbol': 'GD30',
+            'usd_symbol': 'GD30D',
+            'name': 'GLOBALES 2030',
+            'currency': 'USD',
+            'maturity': '2030-07-09',
+            'liquidity': 'high',
+            'recommended': True,
+            'description': 'Alternativa líquida al AL30'
+        },
+        {
+            'symbol': 'AE38',
+            'usd_symbol': 'AE38D',
+            'name': 'BONARES 2038',
+            'currency': 'EUR',
+            'maturity': '2038-01-09',
+            'liquidity': 'medium',
+            'recommended': False,
+            'description': 'Bono en euros, menor liquidez'
+        },
+    )
+
     @staticmethod
     def get_recommended_mep_bonds() -> List[Dict[str, Any]]:
         """
         Get list of recommended bonds for MEP operations with metadata.
 
         Returns:
-            List of bond information dictionaries
+            List of bond information dictionaries (fresh copies of the shared constant)
         """
-        return [
-            {
-                'symbol': 'AL30',
-                'usd_symbol': 'AL30D',
-                'name': 'BODEN 2030',
-                'currency': 'USD',
-                'maturity': '2030-07-09',
-                'liquidity': 'high',
-                'recommended': True,
-                'description': 'Bono más líquido para operaciones MEP'
-            },
-            {
-                'symbol': 'GD30',
-                'usd_symbol': 'GD30D',
-                'name': 'GLOBALES 2030',
-                'currency': 'USD',
-                'maturity': '2030-07-09',
-                'liquidity': 'high',
-                'recommended': True,
-                'description': 'Alternativa líquida al AL30'
-            },
-            {
-                'symbol': 'AE38',
-                'usd_symbol': 'AE38D',
-                'name': 'BONARES 2038',
-                'currency': 'EUR',
-                'maturity': '2038-01-09',
-                'liquidity': 'medium',
-                'recommended': False,
-                'description': 'Bono en euros, menor liquidez'
-            }
-        ]
+        return [dict(bond) for bond in MarketHelpers._RECOMMENDED_MEP_BONDS]
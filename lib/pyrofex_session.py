@@ -6,33 +6,62 @@ Provides isolated pyRofex REST and WebSocket clients per user to enable multi-te
 """
 
 import os
-import sys
+import re
+import ssl
 import logging
 import time
+from concurrent.futures import Future
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Set, Tuple
 
 # Add pyRofex to path
-REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-PYROFEX_SRC = os.path.abspath(os.path.join(REPO_ROOT, "pyRofex-master", "src"))
-if PYROFEX_SRC not in sys.path:
-    sys.path.insert(0, PYROFEX_SRC)
+from lib import _bootstrap  # noqa: F401
 
 try:
     import pyRofex
     from pyRofex.clients.rest_rfx import RestClient
     from pyRofex.clients.websocket_rfx import WebSocketClient
     from pyRofex.components.enums import Environment, Side, OrderType, TimeInForce, MarketDataEntry
+    from pyRofex.components import globals as pyrofex_globals
     PYROFEX_AVAILABLE = True
 except ImportError as e:
     logging.error(f"pyRofex not available: {e}")
     PYROFEX_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
+
+# Duración de una sesión autenticada (token de ROFEX)
+SESSION_DURATION = timedelta(hours=8)
+
+# ssl_opt para el WS con PYROFEX_WS_INSECURE (sólo desarrollo). pyRofex y
+# websocket-client lo leen sin modificarlo, así que se comparte entre sesiones.
+_INSECURE_SSL_OPT = {"cert_reqs": ssl.CERT_NONE, "check_hostname": False}
+
+# Entornos aceptados por authenticate()
+_VALID_ENVIRONMENTS = frozenset({"LIVE", "REMARKET"})
+
+# Errores de credenciales/validación: reintentar no tiene sentido
+_NON_RETRY_RE = re.compile(
+    "|".join(map(re.escape, (
+        "Invalid username or password",
+        "not authorized",
+        "Invalid credentials",
+        "Missing required credentials",
+        "Invalid environment",
+    )))
+)
 try:
-    from config import settings
+    import config
 except Exception:
-    settings = None
+    config = None
+
+
+def _ws_insecure() -> bool:
+    """True si PYROFEX_WS_INSECURE pide desactivar la verificación SSL del WS."""
+    try:
+        return bool(config and getattr(config.settings, 'pyrofx_ws_insecure', False))
+    except Exception:
+        return False
 
 
 class PyRofexSession:
@@ -63,16 +92,30 @@ class PyRofexSession:
         self.authenticated = False
         
         # Session metadata
-        self.created_at = datetime.utcnow()
-        self.last_activity = datetime.utcnow()
+        now = datetime.utcnow()
+        self.created_at = now
+        self.last_activity = now
         self.expires_at = None
+        # Nombre de atributo -> (datetime formateado, isoformat); ver _iso()
+        self._iso_cache: Dict[str, Tuple[datetime, str]] = {}
+        # Vencimiento en reloj monotónico: is_valid() compara floats sin crear datetimes
+        self._expires_monotonic: Optional[float] = None
         
-        # WebSocket subscriptions
-        self.active_subscriptions = {}
+        # Respuesta JSON de login "Already authenticated": (expires_at con que se armó, JSON)
+        self._login_response_json: Optional[Tuple[Optional[datetime], str]] = None
+
+        # Último chequeo de API de get_session_status: (time.monotonic(), resultado)
+        self._last_api_probe: Optional[Tuple[float, bool]] = None
+        # Probe de API en vuelo (uno por sesión, para no apilar llamadas colgadas)
+        self._api_probe_future: Optional[Future] = None
+
+        # WebSocket subscriptions ("md:<symbol>", "or:<account>")
+        self.active_subscriptions: Set[str] = set()
         
         logger.debug(f"Created PyRofexSession for user {user_id}")
     
-    def authenticate(self, user: str, password: str, account: str, environment: str = "LIVE") -> bool:
+    def authenticate(self, user: str, password: str, account: str, environment: str = "LIVE",
+                     api_url: Optional[str] = None) -> bool:
         """
         Authenticate with ROFEX API and create isolated client instances.
         
@@ -81,6 +124,7 @@ class PyRofexSession:
             password: ROFEX password  
             account: Trading account
             environment: LIVE or REMARKET
+            api_url: Broker REST URL for LIVE (defaults to PYROFEX_URL)
             
         Returns:
             bool: True if authentication successful
@@ -92,7 +136,7 @@ class PyRofexSession:
             logger.info(f"Authenticating user {self.user_id} with ROFEX {environment}")
             
             # Validate inputs
-            if not all([user, password, account]):
+            if not (user and password and account):
                 missing_fields = []
                 if not user: missing_fields.append("user")
                 if not password: missing_fields.append("password")
@@ -100,25 +144,19 @@ class PyRofexSession:
                 raise ValueError(f"Missing required credentials: {', '.join(missing_fields)}")
             
             # Validate environment
-            if environment not in ["LIVE", "REMARKET"]:
+            if environment not in _VALID_ENVIRONMENTS:
                 raise ValueError(f"Invalid environment '{environment}'. Must be 'LIVE' or 'REMARKET'")
             
             # Map environment string to enum
             self.environment = Environment.LIVE if environment == "LIVE" else Environment.REMARKET
             
             # Set up the global environment configuration for pyRofex
-            self._setup_pyrofex_environment(user, password, account, self.environment)
+            self._setup_pyrofex_environment(user, password, account, self.environment, api_url)
             
             # Use pyRofex initialization to authenticate and get token
             logger.info(f"Calling pyRofex.initialize for user {self.user_id}")
             # Provide ssl_opt if WS insecure is enabled (dev fallback)
-            ssl_opt = None
-            try:
-                if settings and getattr(settings, 'pyrofx_ws_insecure', False):
-                    import ssl
-                    ssl_opt = {"cert_reqs": ssl.CERT_NONE, "check_hostname": False}
-            except Exception:
-                ssl_opt = None
+            ssl_opt = _INSECURE_SSL_OPT if _ws_insecure() else None
 
             pyRofex.initialize(
                 user=user,
@@ -129,12 +167,11 @@ class PyRofexSession:
             )
             
             # Get the REST client from the initialized environment
-            from pyRofex.components import globals
-            
-            if self.environment not in globals.environment_config:
+            env_config = pyrofex_globals.environment_config.get(self.environment)
+            if env_config is None:
                 raise Exception(f"Environment {self.environment} not configured after initialization")
-                
-            env_config = globals.environment_config[self.environment]
+            # pyRofex actualiza este dict in-place: refresh_token/init_websocket lo reutilizan
+            self.environment_config = env_config
             self.rest_client = env_config.get("rest_client")
             
             if not self.rest_client:
@@ -149,8 +186,7 @@ class PyRofexSession:
                 raise Exception("No authentication token received from ROFEX")
                 
             self.authenticated = True
-            self.last_activity = datetime.utcnow()
-            self.expires_at = datetime.utcnow() + timedelta(hours=8)  # 8-hour session
+            self._start_validity_window()
             
             logger.info(f"✅ Successfully authenticated user {self.user_id}, token: {self.token[:20]}...")
             return True
@@ -181,7 +217,8 @@ class PyRofexSession:
                 raise Exception(f"Authentication error: {str(e)}")
     
     def authenticate_with_retry(self, user: str, password: str, account: str, 
-                               environment: str = "LIVE", max_retries: int = 3) -> bool:
+                               environment: str = "LIVE", max_retries: int = 3,
+                               api_url: Optional[str] = None) -> bool:
         """
         Authenticate with retry logic for transient failures.
         
@@ -191,6 +228,7 @@ class PyRofexSession:
             account: Trading account
             environment: LIVE or REMARKET
             max_retries: Maximum number of retry attempts
+            api_url: Broker REST URL for LIVE (defaults to PYROFEX_URL)
             
         Returns:
             bool: True if authentication successful
@@ -204,20 +242,14 @@ class PyRofexSession:
                     logger.info(f"Retry attempt {attempt + 1}/{max_retries} for user {self.user_id} (waiting {delay}s)")
                     time.sleep(delay)
                 
-                return self.authenticate(user, password, account, environment)
+                return self.authenticate(user, password, account, environment, api_url=api_url)
                 
             except Exception as e:
                 last_error = e
                 error_msg = str(e)
                 
                 # Don't retry for credential errors or validation errors
-                if any(phrase in error_msg for phrase in [
-                    "Invalid username or password", 
-                    "not authorized", 
-                    "Invalid credentials",
-                    "Missing required credentials",
-                    "Invalid environment"
-                ]):
+                if _NON_RETRY_RE.search(error_msg):
                     logger.error(f"Authentication failed with credential error (not retrying): {e}")
                     raise e
                 
@@ -228,7 +260,8 @@ class PyRofexSession:
         logger.error(f"Authentication failed after {max_retries} attempts for user {self.user_id}")
         raise Exception(f"Authentication failed after {max_retries} attempts: {last_error}")
     
-    def _setup_pyrofex_environment(self, user: str, password: str, account: str, environment: Environment):
+    def _setup_pyrofex_environment(self, user: str, password: str, account: str, environment: Environment,
+                                   api_url: Optional[str] = None):
         """
         Set up pyRofex global environment configuration for this user session.
         
@@ -237,39 +270,33 @@ class PyRofexSession:
             password: ROFEX password
             account: Trading account
             environment: ROFEX environment enum
+            api_url: Broker REST URL for LIVE (defaults to PYROFEX_URL)
         """
-        from pyRofex.components import globals
+        env_config = pyrofex_globals.environment_config[environment]
         
         # Configure URLs for EcoValores if LIVE environment
         if environment == Environment.LIVE:
-            url = os.getenv("PYROFEX_URL", "https://api.eco.xoms.com.ar/")
+            url = api_url or os.getenv("PYROFEX_URL", "https://api.eco.xoms.com.ar/")
             ws = os.getenv("PYROFEX_WS", "wss://api.eco.xoms.com.ar/")
             proprietary = os.getenv("PYROFEX_PROP", "PBCP")
             
             # Update the global configuration with EcoValores settings
-            globals.environment_config[environment].update({
+            env_config.update({
                 "url": url,
                 "ws": ws,
                 "proprietary": proprietary
             })
             # Optionally relax SSL verification for WS if configured (development fallback)
-            try:
-                if settings and getattr(settings, 'pyrofx_ws_insecure', False):
-                    import ssl
-                    globals.environment_config[environment]["ssl_opt"] = {
-                        "cert_reqs": ssl.CERT_NONE,
-                        "check_hostname": False,
-                    }
-                    logger.warning("WS SSL verification disabled via PYROFEX_WS_INSECURE (development mode)")
-            except Exception as _e:
-                logger.debug(f"Could not set WS ssl_opt: {_e}")
+            if _ws_insecure():
+                env_config["ssl_opt"] = _INSECURE_SSL_OPT
+                logger.warning("WS SSL verification disabled via PYROFEX_WS_INSECURE (development mode)")
             
             logger.info(f"Configured EcoValores environment: {url}")
         
         # Store user credentials in global config (will be used by pyRofex.initialize)
-        globals.environment_config[environment]["user"] = user
-        globals.environment_config[environment]["password"] = password
-        globals.environment_config[environment]["account"] = account
+        env_config["user"] = user
+        env_config["password"] = password
+        env_config["account"] = account
     
     def is_valid(self) -> bool:
         """
@@ -281,7 +308,8 @@ class PyRofexSession:
         if not self.authenticated:
             return False
         
-        if self.expires_at and datetime.utcnow() > self.expires_at:
+        expires = self._expires_monotonic
+        if expires is not None and time.monotonic() > expires:
             logger.warning(f"Session expired for user {self.user_id}")
             return False
         
@@ -290,6 +318,14 @@ class PyRofexSession:
         
         return True
     
+    def _start_validity_window(self) -> None:
+        """Arranca una nueva ventana de validez de SESSION_DURATION desde ahora."""
+        now = datetime.utcnow()
+        self.last_activity = now
+        # expires_at queda para mostrar en to_dict(); la validez se chequea con el reloj monotónico
+        self.expires_at = now + SESSION_DURATION
+        self._expires_monotonic = time.monotonic() + SESSION_DURATION.total_seconds()
+    
     def refresh_token(self) -> bool:
         """
         Refresh authentication token if needed.
@@ -303,11 +339,9 @@ class PyRofexSession:
         try:
             self.rest_client.update_token()
             
-            # Get updated token from globals
-            from pyRofex.components import globals
-            self.token = globals.environment_config[self.environment]["token"]
-            self.last_activity = datetime.utcnow()
-            self.expires_at = datetime.utcnow() + timedelta(hours=8)
+            # Get updated token from the cached environment config
+            self.token = self.environment_config["token"]
+            self._start_validity_window()
             logger.info(f"Token refreshed for user {self.user_id}")
             return True
         except Exception as e:
@@ -334,8 +368,7 @@ class PyRofexSession:
         try:
             # Create WebSocket client
             self.ws_client = WebSocketClient(self.environment)
-            from pyRofex.components import globals
-            globals.environment_config[self.environment]["ws_client"] = self.ws_client
+            self.environment_config["ws_client"] = self.ws_client
             
             # Initialize connection with handlers
             pyRofex.init_websocket_connection(
@@ -373,6 +406,28 @@ class PyRofexSession:
         except Exception as e:
             logger.warning(f"Error closing session for user {self.user_id}: {e}")
     
+    def _iso(self, name: str) -> Optional[str]:
+        """isoformat() del atributo datetime `name`, recalculado sólo si el valor cambió."""
+        value = getattr(self, name)
+        if value is None:
+            return None
+        cached = self._iso_cache.get(name)
+        if cached is None or cached[0] is not value:
+            cached = self._iso_cache[name] = (value, value.isoformat())
+        return cached[1]
+
+    @property
+    def created_at_iso(self) -> str:
+        return self._iso("created_at")
+
+    @property
+    def last_activity_iso(self) -> str:
+        return self._iso("last_activity")
+
+    @property
+    def expires_at_iso(self) -> Optional[str]:
+        return self._iso("expires_at")
+
     def to_dict(self) -> Dict[str, Any]:
         """
         Convert session to dictionary for storage.
@@ -387,8 +442,8 @@ class PyRofexSession:
             "environment": self.environment.name if self.environment else None,
             "authenticated": self.authenticated,
             "token": self.token,
-            "created_at": self.created_at.isoformat(),
-            "last_activity": self.last_activity.isoformat(),
-            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
-            "active_subscriptions": list(self.active_subscriptions.keys())
+            "created_at": self.created_at_iso,
+            "last_activity": self.last_activity_iso,
+            "expires_at": self.expires_at_iso,
+            "active_subscriptions": sorted(self.active_subscriptions)
         }
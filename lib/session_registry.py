@@ -2,19 +2,49 @@
 
 from __future__ import annotations
 
+import heapq
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+from typing import Any, Deque, Dict, Hashable, List, Optional, Tuple
 
 from .pyrofex_session import PyRofexSession
 
+# Cantidad máxima de order reports recientes que se guardan por usuario
+MAX_ORDER_UPDATES = 100
+
+# Segundos sin uso tras los cuales cleanup() descarta el estado WebSocket de un
+# usuario que ya no tiene sesión
+CONNECTION_TTL_SECONDS = 3600.0
+
+# Intervalo mínimo entre barridos de cleanup() disparados por maybe_cleanup()
+CLEANUP_INTERVAL_SECONDS = 60.0
+
 
 @dataclass
 class SessionRegistry:
     """Almacén en memoria para sesiones y estado WebSocket por usuario."""
 
     _sessions: Dict[str, PyRofexSession] = field(default_factory=dict)
-    _quotes: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # user_id -> SYMBOL -> payload: cada usuario accede sólo a sus propias cotizaciones
+    _quotes: Dict[str, Dict[str, Dict[str, Any]]] = field(default_factory=dict)
+    # Total de cotizaciones entre todos los usuarios, mantenido al guardar/borrar
+    _total_quotes: int = 0
+    # user_id -> evento que store_quote() setea al llegar una cotización
+    _quote_events: Dict[str, threading.Event] = field(default_factory=dict)
     _connections: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # user_id -> lock que serializa init del WebSocket y suscripciones
+    _ws_locks: Dict[str, threading.Lock] = field(default_factory=dict)
+    # user_id -> último acceso (monotónico), del más viejo al más reciente
+    _connection_touched: "OrderedDict[str, float]" = field(default_factory=OrderedDict)
+    # Los handlers del WebSocket tocan estados desde otros hilos mientras cleanup() recorre
+    _touch_lock: threading.Lock = field(default_factory=threading.Lock)
+    _cleanup_lock: threading.Lock = field(default_factory=threading.Lock)
+    _next_cleanup: float = 0.0
+    # Min-heap (vencimiento monotónico, user_id); las entradas viejas se descartan al salir
+    _expiry_heap: List[Tuple[float, str]] = field(default_factory=list)
 
     # ------------------------------------------------------------------
     # Sesiones
@@ -29,6 +59,9 @@ class SessionRegistry:
 
     def store_session(self, session: PyRofexSession) -> None:
         self._sessions[session.user_id] = session
+        # Sin vencimiento registrado se revisa en el próximo cleanup()
+        expires = session._expires_monotonic
+        heapq.heappush(self._expiry_heap, (expires if expires is not None else 0.0, session.user_id))
 
     def remove_session(self, user_id: str) -> None:
         session = self._sessions.pop(user_id, None)
@@ -37,7 +70,7 @@ class SessionRegistry:
                 session.close()
             except Exception:
                 pass
-        self._connections.pop(user_id, None)
+        self.remove_connection(user_id)
         self._remove_quotes(user_id)
 
     def iter_sessions(self):
@@ -53,39 +86,57 @@ class SessionRegistry:
     # Quotes cache
     # ------------------------------------------------------------------
     def store_quote(self, user_id: str, symbol: str, payload: Dict[str, Any]) -> None:
-        self._quotes[f"{user_id}:{symbol.upper()}"] = payload
+        user_quotes = self._quotes.get(user_id)
+        if user_quotes is None:
+            user_quotes = self._quotes[user_id] = {}
+        # Interned: todos los usuarios comparten la misma clave por símbolo
+        key = sys.intern(symbol.upper())
+        if key not in user_quotes:
+            self._total_quotes += 1
+        user_quotes[key] = payload
+        event = self._quote_events.get(user_id)
+        if event is not None:
+            event.set()
+
+    def quote_event(self, user_id: str) -> threading.Event:
+        """Evento que se setea con cada cotización nueva del usuario (para esperar sin polling)."""
+        event = self._quote_events.get(user_id)
+        if event is None:
+            event = self._quote_events.setdefault(user_id, threading.Event())
+        return event
 
     def list_quotes(self, user_id: str) -> Dict[str, Dict[str, Any]]:
-        prefix = f"{user_id}:"
-        result: Dict[str, Dict[str, Any]] = {}
-        for key, value in self._quotes.items():
-            if key.startswith(prefix):
-                symbol = key.split(":", 1)[1]
-                result[symbol] = value
-        return result
+        user_quotes = self._quotes.get(user_id)
+        return dict(user_quotes) if user_quotes else {}
 
     def quote_count(self) -> int:
-        return len(self._quotes)
+        return self._total_quotes
 
     def _remove_quotes(self, user_id: str) -> None:
-        prefix = f"{user_id}:"
-        keys = [key for key in self._quotes if key.startswith(prefix)]
-        for key in keys:
-            del self._quotes[key]
+        user_quotes = self._quotes.pop(user_id, None)
+        if user_quotes:
+            self._total_quotes -= len(user_quotes)
 
     # ------------------------------------------------------------------
     # WebSocket connections & order updates
     # ------------------------------------------------------------------
     def get_connection_state(self, user_id: str) -> Dict[str, Any]:
-        return self._connections.setdefault(
-            user_id,
-            {
+        state = self._connections.get(user_id)
+        if state is None:
+            # Sólo se arma el estado inicial si el usuario no tiene uno
+            state = self._connections[user_id] = {
                 "initialized": False,
                 "market_subscriptions": [],
+                # (tickers, entries, market) ya suscriptos en el WebSocket actual
+                "market_data_keys": set(),
                 "order_subscriptions": [],
-                "order_updates": [],
-            },
-        )
+                "order_updates": deque(maxlen=MAX_ORDER_UPDATES),
+            }
+        touched = self._connection_touched
+        with self._touch_lock:
+            touched[user_id] = time.monotonic()
+            touched.move_to_end(user_id)
+        return state
 
     def peek_connection_state(self, user_id: str) -> Optional[Dict[str, Any]]:
         return self._connections.get(user_id)
@@ -100,40 +151,106 @@ class SessionRegistry:
     def mark_websocket_initialized(self, user_id: str) -> None:
         state = self.get_connection_state(user_id)
         state["initialized"] = True
+        # Un WebSocket nuevo arranca sin suscripciones
+        state["market_data_keys"].clear()
+
+    def ws_lock(self, user_id: str) -> threading.Lock:
+        """Lock por usuario para que requests concurrentes no re-inicialicen ni re-suscriban a la vez."""
+        lock = self._ws_locks.get(user_id)
+        if lock is None:
+            lock = self._ws_locks.setdefault(user_id, threading.Lock())
+        return lock
+
+    def market_data_subscribed(self, user_id: str, key: Hashable) -> bool:
+        state = self._connections.get(user_id)
+        return bool(state and state["initialized"] and key in state["market_data_keys"])
+
+    def record_market_data_subscription(self, user_id: str, key: Hashable) -> None:
+        self.get_connection_state(user_id)["market_data_keys"].add(key)
 
     def append_order_update(self, user_id: str, update: Dict[str, Any]) -> None:
         state = self.get_connection_state(user_id)
-        updates: List[Dict[str, Any]] = state.setdefault("order_updates", [])
+        # deque acotado: al superar el máximo descarta el más viejo en O(1)
+        updates: Deque[Dict[str, Any]] = state["order_updates"]
         updates.append(update)
-        if len(updates) > 100:
-            state["order_updates"] = updates[-100:]
 
     def list_order_updates(self, user_id: str) -> List[Dict[str, Any]]:
         state = self._connections.get(user_id)
         if not state:
             return []
-        return list(state.get("order_updates", []))
+        return list(state.get("order_updates", ()))
 
     def order_update_count(self, user_id: str) -> int:
         state = self._connections.get(user_id)
         if not state:
             return 0
-        return len(state.get("order_updates", []))
+        return len(state.get("order_updates", ()))
 
     def remove_connection(self, user_id: str) -> None:
         self._connections.pop(user_id, None)
+        with self._touch_lock:
+            self._connection_touched.pop(user_id, None)
+        self._ws_locks.pop(user_id, None)
+        self._quote_events.pop(user_id, None)
 
     def clear_user_quotes(self, user_id: str) -> None:
         self._remove_quotes(user_id)
 
-    def cleanup(self) -> int:
-        """Remueve sesiones inválidas y estados huérfanos. Devuelve la cantidad limpiada."""
-        invalid_users = [
-            user_id for user_id, session in self._sessions.items() if not session.is_valid()
-        ]
+    def cleanup(self, connection_ttl: float = CONNECTION_TTL_SECONDS) -> int:
+        """Remueve sesiones vencidas y estados huérfanos. Devuelve la cantidad limpiada.
+
+        Sólo revisa las entradas del heap cuyo vencimiento ya pasó, en lugar de
+        recorrer todas las sesiones. Sesiones inválidas por otro motivo se
+        descartan igual al pedirlas con `get_session`. Los estados WebSocket sin
+        sesión y sin uso hace más de `connection_ttl` segundos también se borran.
+        """
+        now = time.monotonic()
+        heap = self._expiry_heap
+        invalid_users = []
+        while heap and heap[0][0] <= now:
+            expires, user_id = heapq.heappop(heap)
+            session = self._sessions.get(user_id)
+            if session is None:
+                continue
+            current = session._expires_monotonic
+            if current is not None and current != expires and current > now:
+                # Ventana renovada (refresh_token o re-login): reprogramar
+                heapq.heappush(heap, (current, user_id))
+                continue
+            if not session.is_valid() and user_id not in invalid_users:
+                invalid_users.append(user_id)
         for user_id in invalid_users:
             self.remove_session(user_id)
-        return len(invalid_users)
+        return len(invalid_users) + self._prune_connections(now - connection_ttl)
+
+    def maybe_cleanup(self, interval: float = CLEANUP_INTERVAL_SECONDS) -> int:
+        """Corre cleanup() si pasaron `interval` segundos desde el último barrido.
+
+        Pensado para el camino de cada request: no bloquea si otro hilo ya
+        está limpiando. Devuelve la cantidad limpiada (0 si no tocaba).
+        """
+        if time.monotonic() < self._next_cleanup or not self._cleanup_lock.acquire(blocking=False):
+            return 0
+        try:
+            self._next_cleanup = time.monotonic() + interval
+            return self.cleanup()
+        finally:
+            self._cleanup_lock.release()
+
+    def _prune_connections(self, cutoff: float) -> int:
+        """Borra estados WebSocket huérfanos tocados antes de `cutoff`."""
+        stale = []
+        with self._touch_lock:
+            candidates = list(self._connection_touched.items())
+        # Orden de último acceso: se corta en la primera entrada reciente
+        for user_id, touched_at in candidates:
+            if touched_at > cutoff:
+                break
+            if user_id not in self._sessions:
+                stale.append(user_id)
+        for user_id in stale:
+            self.remove_connection(user_id)
+        return len(stale)
 
 
 session_registry = SessionRegistry()
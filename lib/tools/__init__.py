@@ -1,5 +1,6 @@
 """Tool registration helpers for the pyRofex trading server."""
 
+import importlib
 from typing import TYPE_CHECKING
 
 from .common import bind_mcp
@@ -9,13 +10,23 @@ if TYPE_CHECKING:  # pragma: no cover
 
 __all__ = ["register_all_tools"]
 
+# Tool modules, imported in this order once the MCP instance is bound.
+_TOOL_MODULES = ("auth", "market_data", "mep", "trading", "websocket")
+_REGISTERED = False
+
 
 def register_all_tools(mcp: "FastMCP") -> None:
-    """Bind shared FastMCP instance and import tool modules for registration."""
+    """Bind shared FastMCP instance and import tool modules for registration.
+
+    Idempotent: the tool decorators run on first import only, so later calls
+    are no-ops instead of re-binding the instance.
+    """
+    global _REGISTERED
+    if _REGISTERED:
+        return
     bind_mcp(mcp)
 
     # Import modules lazily so decorators run after the MCP instance is bound.
-    from . import auth, market_data, mep, trading, websocket  # noqa: F401
-
-    # Explicitly reference modules to silence lint about unused imports.
-    _ = (auth, market_data, mep, trading, websocket)
+    for name in _TOOL_MODULES:
+        importlib.import_module(f"{__name__}.{name}")
+    _REGISTERED = True
@@ -9,17 +9,18 @@ This module contains MCP tools for:
 - API connectivity checks
 """
 
-import os
-import sys
 import logging
+import threading
+import time
+from concurrent.futures import Future
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
 
 # Add pyRofex to path
-REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-PYROFEX_SRC = os.path.abspath(os.path.join(REPO_ROOT, "pyRofex-master", "src"))
-if PYROFEX_SRC not in sys.path:
-    sys.path.insert(0, PYROFEX_SRC)
+from lib import _bootstrap  # noqa: F401
 
 try:
     import pyRofex
@@ -28,7 +29,7 @@ except ImportError:
     PYROFEX_AVAILABLE = False
 
 # Import configuration and components
-from config import settings
+import config
 from lib.pyrofex_session import PyRofexSession
 from lib.session_registry import session_registry
 # Import common utilities
@@ -39,6 +40,37 @@ logger = logging.getLogger(__name__)
 # Shared FastMCP instance provided by server
 mcp = get_mcp()
 
+# Respuesta fija de login cuando pyRofex no se pudo importar
+_PYROFEX_UNAVAILABLE_JSON = _safe_json({"success": False, "error": "pyRofex library not available"})
+
+# Sesión HTTP compartida para los health checks: reutiliza la conexión TLS
+_HTTP = requests.Session()
+_HTTP.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=0))
+_HTTP.headers.update({"User-Agent": "Liggio-MCP-HealthCheck/1.0"})
+
+# (fragmento del error técnico, mensaje para el usuario), en orden de prioridad
+_LOGIN_ERROR_MAP: Tuple[Tuple[str, str], ...] = (
+    ("Invalid username or password", "Credenciales incorrectas. Verifica tu usuario y contraseña."),
+    ("not authorized", "La cuenta {account} no está autorizada para operar en LIVE."),
+    ("Cannot connect to ROFEX API", "No se puede conectar con ROFEX. Verifica tu conexión e intenta más tarde."),
+    ("Connection timeout", "No se puede conectar con ROFEX. Verifica tu conexión e intenta más tarde."),
+    ("Missing required credentials", "Faltan credenciales requeridas. Proporciona usuario, contraseña y cuenta."),
+    ("Invalid credentials", "Faltan credenciales requeridas. Proporciona usuario, contraseña y cuenta."),
+    ("pyRofex library not available", "Servicio de trading no disponible temporalmente."),
+    ("Invalid environment", "Se fuerza el entorno LIVE. Verificá la configuración del broker."),
+    ("no access token received", "Error de autenticación con ROFEX. Verifica tus credenciales."),
+    ("Token not obtained", "Error de autenticación con ROFEX. Verifica tus credenciales."),
+)
+
+# Último resultado de check_rofex_connectivity: (time.monotonic(), payload)
+_CONN_TTL = 10.0
+_CONN_CACHE: Optional[Tuple[float, Dict[str, Any]]] = None
+_CONN_LOCK = threading.Lock()
+
+# Chequeo de API en get_session_status: resultado por sesión y espera máxima
+_API_PROBE_TTL = 5.0
+_API_PROBE_TIMEOUT = 2.0
+
 
 @mcp.tool()
 def login(
@@ -62,9 +94,9 @@ def login(
         JSON string with login result
     """
     if not PYROFEX_AVAILABLE:
-        return _safe_json({"success": False, "error": "pyRofex library not available"})
+        return _PYROFEX_UNAVAILABLE_JSON
 
-    if settings.force_live_environment and environment.upper() != settings.live_environment:
+    if config.settings.force_live_environment and environment.upper() != config.settings.live_environment:
         return _safe_json({
             "success": False,
             "error": "Solo se admite el entorno LIVE de Matriz"
@@ -74,9 +106,9 @@ def login(
         logger.info(f"=== LOGIN ATTEMPT ===")
         logger.info(f"User ID: {user_id}")
         logger.info(f"ROFEX User: {user}")
-        logger.info(f"Environment: {settings.live_environment}")
+        logger.info(f"Environment: {config.settings.live_environment}")
 
-        if settings.require_credentials and not all([user, password, account]):
+        if config.settings.require_credentials and not (user and password and account):
             return _safe_json({
                 "success": False,
                 "error": "Faltan credenciales Matriz (usuario, contraseña o cuenta)"
@@ -86,17 +118,22 @@ def login(
         existing_success, _, existing_session = _get_session(user_id)
         if existing_success and existing_session:
             logger.info(f"User {user_id} already has active session")
-            return _safe_json({
-                "success": True,
-                "message": "Already authenticated",
-                "session_info": {
-                    "user_id": user_id,
-                    "account": existing_session.account,
-                    "environment": existing_session.environment.name if existing_session.environment else None,
-                    "authenticated_at": existing_session.created_at.isoformat(),
-                    "expires_at": existing_session.expires_at.isoformat() if existing_session.expires_at else None
-                }
-            })
+            # La respuesta sólo cambia cuando la sesión se renueva (nuevo expires_at)
+            cached = existing_session._login_response_json
+            if cached is None or cached[0] is not existing_session.expires_at:
+                env = existing_session.environment
+                cached = existing_session._login_response_json = (existing_session.expires_at, _safe_json({
+                    "success": True,
+                    "message": "Already authenticated",
+                    "session_info": {
+                        "user_id": user_id,
+                        "account": existing_session.account,
+                        "environment": env.name if env else None,
+                        "authenticated_at": existing_session.created_at_iso,
+                        "expires_at": existing_session.expires_at_iso
+                    }
+                }))
+            return cached[1]
 
         # Create new session
         session = PyRofexSession(user_id)
@@ -106,7 +143,7 @@ def login(
             user,
             password,
             account,
-            settings.live_environment,
+            config.settings.live_environment,
             max_retries=3
         )
 
@@ -122,8 +159,8 @@ def login(
                     "user_id": user_id,
                     "account": session.account,
                     "environment": session.environment.name,
-                    "authenticated_at": session.created_at.isoformat(),
-                    "expires_at": session.expires_at.isoformat() if session.expires_at else None,
+                    "authenticated_at": session.created_at_iso,
+                    "expires_at": session.expires_at_iso,
                     "storage": "Memory"
                 }
             })
@@ -135,23 +172,10 @@ def login(
         logger.error(f"L Login failed for user {user_id}: {error_msg}")
 
         # Map technical errors to user-friendly Spanish messages
-        if "Invalid username or password" in error_msg:
-            user_error = "Credenciales incorrectas. Verifica tu usuario y contraseña."
-        elif "not authorized" in error_msg:
-            user_error = f"La cuenta {account} no está autorizada para operar en LIVE."
-        elif "Cannot connect to ROFEX API" in error_msg or "Connection timeout" in error_msg:
-            user_error = "No se puede conectar con ROFEX. Verifica tu conexión e intenta más tarde."
-        elif "Missing required credentials" in error_msg or "Invalid credentials" in error_msg:
-            user_error = "Faltan credenciales requeridas. Proporciona usuario, contraseña y cuenta."
-        elif "pyRofex library not available" in error_msg:
-            user_error = "Servicio de trading no disponible temporalmente."
-        elif "Invalid environment" in error_msg:
-            user_error = "Se fuerza el entorno LIVE. Verificá la configuración del broker."
-        elif "no access token received" in error_msg or "Token not obtained" in error_msg:
-            user_error = "Error de autenticación con ROFEX. Verifica tus credenciales."
-        else:
-            # Generic error message for unexpected issues
-            user_error = f"Error de autenticación: {error_msg}"
+        user_error = next(
+            (message.format(account=account) for needle, message in _LOGIN_ERROR_MAP if needle in error_msg),
+            f"Error de autenticación: {error_msg}",
+        )
 
         return _safe_json({"success": False, "error": user_error})
 
@@ -161,94 +185,105 @@ def check_rofex_connectivity() -> str:
     """
     Check if ROFEX API endpoints are reachable and responsive.
 
+    Results are reused for _CONN_TTL seconds; concurrent calls wait for the
+    probe in flight instead of starting another one.
+
     Returns:
         JSON string con el estado de conectividad LIVE
     """
-    import requests
-
+    global _CONN_CACHE
+    with _CONN_LOCK:
+        cached = _CONN_CACHE
+        if cached is not None and time.monotonic() - cached[0] < _CONN_TTL:
+            return _safe_json({**cached[1], "cached": True})
+
+        payload = _probe_rofex_connectivity()
+        if payload["success"]:
+            _CONN_CACHE = (time.monotonic(), payload)
+    return _safe_json(payload)
+
+
+def _probe_one(env_name: str, base_url: str, session: requests.Session) -> Dict[str, Any]:
+    """Probe a single ROFEX environment and return its result entry."""
+    # Test a basic endpoint that doesn't require authentication
+    test_url = f"{base_url.rstrip('/')}/rest/risk/allowedBalanceByEnvironment"
     try:
-        logger.info("Checking ROFEX API connectivity")
+        logger.info(f"Testing {env_name} connectivity: {test_url}")
+        start = time.perf_counter()
 
-        # Solo probamos el endpoint LIVE de Matriz
-        urls = {
-            "LIVE": settings.pyrofx_live_url,
+        response = session.get(test_url, timeout=10)  # 10 second timeout
+
+        response_time_ms = int((time.perf_counter() - start) * 1000)
+
+        logger.info(f" {env_name} reachable: {response.status_code} ({response_time_ms}ms)")
+        return {
+            "reachable": True,
+            "status_code": response.status_code,
+            "response_time_ms": response_time_ms,
+            "url": test_url,
+            "status": "healthy" if response.status_code < 500 else "degraded"
         }
 
-        results = {}
-        overall_status = True
+    except requests.exceptions.Timeout:
+        logger.warning(f"L {env_name} timeout")
+        return {
+            "reachable": False,
+            "error": "Connection timeout (>10s)",
+            "url": test_url,
+            "status": "unreachable"
+        }
 
-        for env_name, base_url in urls.items():
-            try:
-                # Test a basic endpoint that doesn't require authentication
-                test_url = f"{base_url.rstrip('/')}/rest/risk/allowedBalanceByEnvironment"
+    except requests.exceptions.ConnectionError as e:
+        logger.warning(f"L {env_name} connection error: {e}")
+        return {
+            "reachable": False,
+            "error": f"Connection error: {str(e)[:100]}",
+            "url": test_url,
+            "status": "unreachable"
+        }
 
-                logger.info(f"Testing {env_name} connectivity: {test_url}")
-                start_time = datetime.utcnow()
+    except Exception as e:
+        logger.error(f"L {env_name} error: {e}")
+        return {
+            "reachable": False,
+            "error": f"Unexpected error: {str(e)[:100]}",
+            "url": test_url,
+            "status": "error"
+        }
 
-                response = requests.get(
-                    test_url,
-                    timeout=10,  # 10 second timeout
-                    headers={"User-Agent": "Liggio-MCP-HealthCheck/1.0"}
-                )
 
-                end_time = datetime.utcnow()
-                response_time_ms = int((end_time - start_time).total_seconds() * 1000)
+def _probe_rofex_connectivity() -> Dict[str, Any]:
+    """Hit the ROFEX endpoints and build the check_rofex_connectivity payload."""
+    try:
+        logger.info("Checking ROFEX API connectivity")
 
-                results[env_name] = {
-                    "reachable": True,
-                    "status_code": response.status_code,
-                    "response_time_ms": response_time_ms,
-                    "url": test_url,
-                    "status": "healthy" if response.status_code < 500 else "degraded"
-                }
+        # Solo probamos el endpoint LIVE de Matriz
+        urls = {
+            "LIVE": config.settings.pyrofx_live_url,
+        }
 
-                logger.info(f" {env_name} reachable: {response.status_code} ({response_time_ms}ms)")
+        # En serie a propósito: con un solo entorno un pool no ahorra nada. Si se
+        # suman entornos, repartir _probe_one en un pool acotado (latencia max(RTT))
+        results = {name: _probe_one(name, url, _HTTP) for name, url in urls.items()}
 
-            except requests.exceptions.Timeout:
-                results[env_name] = {
-                    "reachable": False,
-                    "error": "Connection timeout (>10s)",
-                    "url": test_url,
-                    "status": "unreachable"
-                }
-                overall_status = False
-                logger.warning(f"L {env_name} timeout")
-
-            except requests.exceptions.ConnectionError as e:
-                results[env_name] = {
-                    "reachable": False,
-                    "error": f"Connection error: {str(e)[:100]}",
-                    "url": test_url,
-                    "status": "unreachable"
-                }
-                overall_status = False
-                logger.warning(f"L {env_name} connection error: {e}")
-
-            except Exception as e:
-                results[env_name] = {
-                    "reachable": False,
-                    "error": f"Unexpected error: {str(e)[:100]}",
-                    "url": test_url,
-                    "status": "error"
-                }
-                overall_status = False
-                logger.error(f"L {env_name} error: {e}")
+        overall_status = all(result["reachable"] for result in results.values())
 
-        return _safe_json({
+        tested_at = datetime.utcnow()
+        return {
             "success": True,
             "overall_status": "healthy" if overall_status else "degraded",
             "environments": results,
-            "timestamp": datetime.utcnow().isoformat(),
-            "tested_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
-        })
+            "timestamp": tested_at.isoformat(),
+            "tested_at": tested_at.strftime("%Y-%m-%d %H:%M:%S UTC")
+        }
 
     except Exception as e:
         logger.error(f"L Connectivity check failed: {e}")
-        return _safe_json({
+        return {
             "success": False,
             "error": f"Connectivity check failed: {str(e)}",
             "timestamp": datetime.utcnow().isoformat()
-        })
+        }
 
 
 @mcp.tool()
@@ -287,6 +322,49 @@ def logout(user_id: str = "anonymous") -> str:
         return _safe_json({"success": False, "error": str(e)})
 
 
+def _probe_session_api(session: PyRofexSession) -> bool:
+    """Check the session against the API, reusing the result for _API_PROBE_TTL seconds.
+
+    The call is bounded by _API_PROBE_TIMEOUT; a slow ROFEX counts as a failed probe.
+    At most one probe per session is in flight at a time.
+    """
+    if not session.rest_client:
+        return False
+
+    now = time.monotonic()
+    cached = session._last_api_probe
+    if cached is not None and now - cached[0] < _API_PROBE_TTL:
+        return cached[1]
+
+    future = session._api_probe_future
+    if future is None or future.done():
+        future = session._api_probe_future = _start_api_probe()
+    # Si el probe anterior sigue colgado se lo vuelve a esperar en vez de lanzar otro
+    try:
+        future.result(timeout=_API_PROBE_TIMEOUT)
+        api_test = True
+    except Exception:
+        api_test = False
+    session._last_api_probe = (now, api_test)
+    return api_test
+
+
+def _start_api_probe() -> Future:
+    """Run pyRofex.get_segments on its own daemon thread; a hung call never blocks other probes."""
+    future: Future = Future()
+
+    def _run() -> None:
+        try:
+            # Try to get segments as a simple API test
+            pyRofex.get_segments()
+            future.set_result(True)
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=_run, name="api-probe", daemon=True).start()
+    return future
+
+
 @mcp.tool()
 def get_session_status(user_id: str = "anonymous") -> str:
     """
@@ -304,15 +382,9 @@ def get_session_status(user_id: str = "anonymous") -> str:
 
         if success and session:
             # Test session validity with a simple API call
-            api_test = False
-            try:
-                if session.rest_client:
-                    # Try to get segments as a simple API test
-                    pyRofex.get_segments()
-                    api_test = True
-            except Exception:
-                pass
+            api_test = _probe_session_api(session)
 
+            env = session.environment
             return _safe_json({
                 "success": True,
                 "status": "authenticated",
@@ -320,12 +392,12 @@ def get_session_status(user_id: str = "anonymous") -> str:
                     "user_id": session.user_id,
                     "account": session.account,
                     "user": session.user,
-                    "environment": session.environment.name if session.environment else None,
-                    "created_at": session.created_at.isoformat(),
-                    "last_activity": session.last_activity.isoformat(),
-                    "expires_at": session.expires_at.isoformat() if session.expires_at else None,
+                    "environment": env.name if env else None,
+                    "created_at": session.created_at_iso,
+                    "last_activity": session.last_activity_iso,
+                    "expires_at": session.expires_at_iso,
                     "api_connection": api_test,
-                    "active_subscriptions": list(session.active_subscriptions.keys())
+                    "active_subscriptions": sorted(session.active_subscriptions)
                 }
             })
         else:
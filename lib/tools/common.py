@@ -9,22 +9,18 @@ This module contains common functions used across all tool modules:
 - Market data fallback logic
 """
 
-import os
-import sys
 import json
 import logging
+from enum import Enum
 from typing import Any, Dict, Optional, Tuple
 
 from mcp.server.fastmcp import FastMCP
 
 # Add pyRofex to path
-REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-PYROFEX_SRC = os.path.abspath(os.path.join(REPO_ROOT, "pyRofex-master", "src"))
-if PYROFEX_SRC not in sys.path:
-    sys.path.insert(0, PYROFEX_SRC)
+from lib import _bootstrap  # noqa: F401
 
 # Import configuration and components
-from config import settings
+import config
 from lib.pyrofex_session import PyRofexSession
 from lib.session_registry import session_registry
 
@@ -32,6 +28,33 @@ logger = logging.getLogger(__name__)
 
 _FAST_MCP: Optional[FastMCP] = None
 
+# Encoder compartido por todas las respuestas de tools: compacto y sin escapar acentos.
+# orjson es opcional (no está en requirements.txt); con o sin él el texto es el mismo:
+# Enum por su valor, datetime y demás tipos por str(). Solo cambia la forma de
+# escribir floats en notación exponencial (1e16 vs 1e+16), que parsean igual.
+# _json_loads acepta str o bytes (p. ej. response.content) con cualquiera de los dos.
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+_stdlib_encode = json.JSONEncoder(default=_json_default, separators=(",", ":"), ensure_ascii=False).encode
+
+try:  # pragma: no cover - optional dependency
+    import orjson
+
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def _encode(data: Any) -> str:
+        return orjson.dumps(data, default=_json_default, option=_ORJSON_OPTIONS).decode()
+
+    _json_loads = orjson.loads
+except ImportError:  # pragma: no cover - stdlib fallback
+    _encode = _stdlib_encode
+    _json_loads = json.loads
+
+
 def bind_mcp(instance: FastMCP) -> None:
     """Bind the shared FastMCP instance for tool registration."""
     global _FAST_MCP
@@ -47,12 +70,43 @@ def get_mcp() -> FastMCP:
 def _safe_json(data: Dict[str, Any]) -> str:
     """Safely convert dict to JSON string."""
     try:
-        return json.dumps(data, default=str)
+        return _encode(data)
     except Exception as e:
         logger.error(f"JSON encoding error: {e}")
         return json.dumps({"success": False, "error": str(e)})
 
 
+# Settlement input (upper-cased) -> canonical MEP settlement; anything else is 'CI'
+_MEP_SETTLEMENT_MAP = {
+    "CI": "CI",
+    "T0": "CI",
+    "24HS": "24hs",
+    "24H": "24hs",
+    "24 HORAS": "24hs",
+    "24-HS": "24hs",
+    "T1": "24hs",
+}
+
+
+# Alias de liquidación → parámetro del broker (T0/T1) y del Marketdata Service (t0/t1)
+_SETTLEMENT_TO_BROKER = {k: ("T0" if v == "CI" else "T1") for k, v in _MEP_SETTLEMENT_MAP.items()}
+_SETTLEMENT_TO_SERVICE = {k: v.lower() for k, v in _SETTLEMENT_TO_BROKER.items()}
+
+
+def _settlement_to_broker(value: Optional[str]) -> str:
+    """Map CI/24hs (or legacy T0/T1 and aliases) to the broker's T0/T1; anything else is T0."""
+    if not value or not isinstance(value, str):
+        return "T0"
+    return _SETTLEMENT_TO_BROKER.get(value.strip().upper(), "T0")
+
+
+def _settlement_to_service(value: Optional[str]) -> str:
+    """Map CI/24hs (or legacy T0/T1 and aliases) to the Marketdata Service's t0/t1; anything else is t0."""
+    if not value or not isinstance(value, str):
+        return "t0"
+    return _SETTLEMENT_TO_SERVICE.get(value.strip().upper(), "t0")
+
+
 def _normalize_mep_settlement_input(value: Optional[str]) -> str:
     """Normalize human settlement input for MEP flows.
 
@@ -60,25 +114,21 @@ def _normalize_mep_settlement_input(value: Optional[str]) -> str:
     - Accepts: 'CI', '24hs' (case-insensitive)
     - Also maps 'T0'->'CI' and 'T1'->'24hs' if those appear
     """
+    # Fast path: the canonical values come through as-is
+    if value == "CI" or value == "24hs":
+        return value
     if not value or not isinstance(value, str):
         return "CI"
-    v = value.strip().upper()
-    if v in ("CI",):
-        return "CI"
-    if v in ("24HS", "24H", "24 HORAS", "24-HS"):
-        return "24hs"
-    if v == "T0":
-        return "CI"
-    if v == "T1":
-        return "24hs"
-    # Fallback default
-    return "CI"
+    return _MEP_SETTLEMENT_MAP.get(value.strip().upper(), "CI")
 
 
 def _get_session(user_id: str) -> Tuple[bool, Optional[str], Optional[PyRofexSession]]:
     """Recupera la sesión activa (solo memoria)."""
     logger.debug(f"Buscando sesión para {user_id}")
 
+    # Barrido periódico de sesiones vencidas y estado WebSocket huérfano
+    session_registry.maybe_cleanup()
+
     session = session_registry.get_session(user_id)
     if session:
         logger.debug(f" Sesión válida en memoria para {user_id}")
@@ -110,7 +160,7 @@ def _ensure_authenticated(user_id: str) -> Tuple[bool, Optional[str], Optional[P
 
     # Try auto-login from config
     logger.debug(f"Attempting auto-login for {user_id}")
-    account_config = settings.get_user_account(user_id)
+    account_config = config.settings.get_user_account(user_id)
 
     if not account_config:
         logger.debug(f"No auto-login config found for {user_id}")
@@ -122,20 +172,13 @@ def _ensure_authenticated(user_id: str) -> Tuple[bool, Optional[str], Optional[P
     account = account_config.get("account", "")
     broker_id = account_config.get("broker", "")
 
-    if not all([username, password, account]):
+    if not (username and password and account):
         logger.warning(f"Incomplete credentials in config for {user_id}")
         return False, f"Configuración incompleta para {user_id}. Falta usuario, contraseña o cuenta.", None
 
-    # Get broker config to set API URL
-    broker_config = settings.get_broker_config(broker_id)
-    api_url = None
-    original_url = None
-    if broker_config:
-        api_url = broker_config.get("api_url")
-        if api_url:
-            # Temporarily update pyrofx_live_url for this authentication
-            original_url = settings.pyrofx_live_url
-            settings.pyrofx_live_url = api_url
+    # URL del broker del usuario; se pasa a la sesión sin tocar settings globales
+    broker_config = config.settings.get_broker_config(broker_id) if broker_id else None
+    api_url = broker_config.get("api_url") if broker_config else None
 
     try:
         logger.info(f"= Auto-login attempt for {user_id} (broker: {broker_id})")
@@ -148,8 +191,9 @@ def _ensure_authenticated(user_id: str) -> Tuple[bool, Optional[str], Optional[P
             username,
             password,
             account,
-            settings.live_environment,
-            max_retries=3
+            config.settings.live_environment,
+            max_retries=3,
+            api_url=api_url
         )
 
         if auth_success:
@@ -164,10 +208,6 @@ def _ensure_authenticated(user_id: str) -> Tuple[bool, Optional[str], Optional[P
     except Exception as e:
         logger.error(f"L Auto-login error for {user_id}: {e}")
         return False, f"Error en auto-login para {user_id}: {str(e)}", None
-    finally:
-        # Restore original URL if it was changed
-        if broker_config and api_url and original_url:
-            settings.pyrofx_live_url = original_url
 
 
 def _require_auth(user_id: str) -> Tuple[bool, Optional[str], Optional[PyRofexSession]]:
@@ -188,21 +228,20 @@ def _fallback_marketdata_via_pyrofex(
     Fallback to pyRofex REST when the external marketdata service is unavailable.
     Returns a consistent payload structure regardless of the original request type.
 
-    Note: This function depends on get_market_data which will be imported from market_data module.
+    Note: This function depends on _get_market_data_impl which will be imported from market_data module.
     """
     try:
         # Import here to avoid circular dependency
-        from .market_data import get_market_data
+        from .market_data import _get_market_data_impl
 
         normalized_settlement = _normalize_mep_settlement_input(settlement)
-        md_json = get_market_data(
+        parsed = _get_market_data_impl(
             symbol=symbol,
             entries=["BIDS", "OFFERS", "LAST"],
             depth=depth,
             settlement=normalized_settlement,
             user_id=user_id,
         )
-        parsed = json.loads(md_json) if isinstance(md_json, str) else md_json
         if not parsed.get("success"):
             return parsed
 
@@ -8,19 +8,24 @@ This module contains MCP tools for:
 - Integration with external marketdata service
 """
 
-import os
-import sys
+import functools
+import heapq
 import json
+import os
 import logging
+import random
+import threading
 import time
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Tuple, Union
 from datetime import datetime
 
+import requests
+from requests.adapters import HTTPAdapter
+
 # Add pyRofex to path
-REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-PYROFEX_SRC = os.path.abspath(os.path.join(REPO_ROOT, "pyRofex-master", "src"))
-if PYROFEX_SRC not in sys.path:
-    sys.path.insert(0, PYROFEX_SRC)
+from lib import _bootstrap  # noqa: F401
 
 try:
     import pyRofex
@@ -29,21 +34,203 @@ except ImportError:
     PYROFEX_AVAILABLE = False
 
 # Import configuration and components
-from config import settings
+import config
 from lib.market_helpers import MarketHelpers
+from lib.session_registry import session_registry
 # Import common utilities
-from .common import _safe_json, _require_auth, _normalize_mep_settlement_input, get_mcp
+from .common import (
+    _fallback_marketdata_via_pyrofex,
+    _json_loads,
+    _require_auth,
+    _safe_json,
+    _settlement_to_broker,
+    _settlement_to_service,
+    get_mcp,
+)
 
 logger = logging.getLogger(__name__)
 
 # Shared FastMCP instance provided by server
 mcp = get_mcp()
 
+# Pool para pedir las patas ARS/USD de un MEP en paralelo (I/O de red)
+_MEP_LEG_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="mep-leg")
+
+_DEFAULT_ENTRIES = ("BIDS", "OFFERS", "LAST")
+
+
+class _EmptyMarketDataError(Exception):
+    """pyRofex got an empty or non-JSON market data body (transient, worth retrying)."""
+
+
+# Errores de decodificación del cuerpo que devuelve pyRofex (usa simplejson)
+_DECODE_ERRORS: Tuple[type, ...] = (json.JSONDecodeError,)
+try:
+    import simplejson
+    _DECODE_ERRORS += (simplejson.JSONDecodeError,)
+except ImportError:  # pragma: no cover
+    pass
+
+# Fallas transitorias de una pata: red caída, timeout o respuesta vacía/no-JSON.
+# Otros ValueError (ticker o argumentos inválidos) no se reintentan.
+_RETRYABLE_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout, _EmptyMarketDataError)
+
 
 def _get_marketdata_base_url() -> str:
-    return settings.marketdata_url or os.getenv("MARKETDATA_SERVICE_URL") or "http://localhost:8000"
+    return config.settings.marketdata_url or os.getenv("MARKETDATA_SERVICE_URL") or "http://localhost:8000"
+
+
+@functools.lru_cache(maxsize=1)
+def _marketdata_base() -> str:
+    """Base URL without trailing slash, resolved once; cache_clear() re-reads settings/env."""
+    return _get_marketdata_base_url().rstrip("/")
+
+
+# Sesión HTTP compartida con el Marketdata Service: conexiones keep-alive reutilizadas.
+# Sin reintentos en el adapter: sumados a los timeouts un backend caído bloqueaba
+# la tool ~15s; los reintentos quedan solo en el loop de _get_market_data_batch.
+_HTTP = requests.Session()
+_HTTP_ADAPTER = HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=0)
+_HTTP.mount("http://", _HTTP_ADAPTER)
+_HTTP.mount("https://", _HTTP_ADAPTER)
+
+# Caché TTL de respuestas del Marketdata Service: (path, params) -> (vence, JSON parseado)
+_MD_QUOTES_TTL = 1.0
+_MD_CACHE_MAX = 1024
+
+# Listados de instrumentos (pyRofex y Marketdata Service), iguales para todos los usuarios;
+# los dos vencen a los _INSTRUMENTS_TTL segundos
+_INSTRUMENTS_TTL = 300.0
+_instruments_cache: Dict[str, Any] = {"data": None, "ts": 0.0}
+_instruments_lock = threading.Lock()
+# Índice de búsqueda por origen ("pyrofex" / "marketdata"): (listado indexado, [(SYMBOL, DESCRIPTION, campos)])
+_instrument_indexes: Dict[str, Tuple[list, List[Tuple[str, str, Dict[str, Any]]]]] = {}
+
+# (connect, read): un backend caído falla en ~1s sin recortar el tiempo de lectura
+_REST_TIMEOUT = (1.0, 4.0)
+_INSTRUMENTS_TIMEOUT = (1.0, 8.0)
+_md_cache: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Tuple[float, Any]] = {}
+_md_cache_lock = threading.Lock()
 
 
+def _marketdata_get(
+    path: str, params: Optional[Dict[str, str]], timeout: Union[float, Tuple[float, float]], ttl: float
+) -> Tuple[int, Any]:
+    """GET a Marketdata Service path and return (status_code, parsed JSON or None).
+
+    Successful JSON responses are cached for `ttl` seconds, so repeated lookups
+    of the same quote or instrument list skip the HTTP round-trip.
+    """
+    key = (path, tuple(sorted(params.items())) if params else ())
+    now = time.monotonic()
+    with _md_cache_lock:
+        hit = _md_cache.get(key)
+    if hit is not None and hit[0] > now:
+        return 200, hit[1]
+
+    r = _HTTP.get(f"{_marketdata_base()}{path}", params=params, timeout=timeout)
+    # Parsear los bytes directo; un cuerpo no-JSON (HTML de error, vacío) da None
+    try:
+        data = _json_loads(r.content)
+    except ValueError:
+        return r.status_code, None
+    if r.status_code == 200:
+        with _md_cache_lock:
+            if len(_md_cache) >= _MD_CACHE_MAX:
+                for stale in [k for k, (expires, _) in _md_cache.items() if expires <= now]:
+                    del _md_cache[stale]
+                if len(_md_cache) >= _MD_CACHE_MAX:
+                    _md_cache.clear()
+            _md_cache[key] = (now + ttl, data)
+    return r.status_code, data
+
+
+def _round2(x: float) -> float:
+    """Round half away from zero to 2 decimals without the decimal machinery of round()."""
+    return int(x * 100.0 + (0.5 if x >= 0 else -0.5)) / 100.0
+
+
+def _mep_rates(ars_bid: Any, ars_ask: Any, usd_bid: Any, usd_ask: Any) -> Dict[str, float]:
+    """MEP buy/sell rates and spread from the top of book of both legs."""
+    buy_rate = _round2(float(ars_bid) / float(usd_ask))
+    sell_rate = _round2(float(ars_ask) / float(usd_bid))
+    spread = _round2(sell_rate - buy_rate)
+    return {
+        "buy_rate": buy_rate,
+        "sell_rate": sell_rate,
+        "spread": spread,
+        "spread_percent": _round2(spread / buy_rate * 100.0),
+    }
+
+
+def _get_instruments_cached(ttl: float = _INSTRUMENTS_TTL, force_refresh: bool = False) -> List[Dict[str, Any]]:
+    """pyRofex detailed instruments, fetched at most once per `ttl` seconds.
+
+    Error responses are not cached; `force_refresh` skips the cached copy.
+    """
+    with _instruments_lock:
+        data = _instruments_cache["data"]
+        if not force_refresh and data is not None and time.monotonic() - _instruments_cache["ts"] < ttl:
+            return data
+        response = pyRofex.get_detailed_instruments()
+        data = response.get("instruments") if isinstance(response, dict) else None
+        if not isinstance(data, list):
+            raise ValueError(f"Respuesta inválida de instrumentos: {response}")
+        _instruments_cache["data"] = data
+        _instruments_cache["ts"] = time.monotonic()
+        return data
+
+
+def _index_entry(source: str, instrument: Dict[str, Any]) -> Tuple[str, str, Dict[str, Any]]:
+    """(SYMBOL, DESCRIPTION, result fields) for a pyRofex or Marketdata Service instrument."""
+    if source == "pyrofex":
+        instrument_id = instrument.get("instrumentId") or {}
+        symbol = instrument_id.get("symbol") or ""
+        fields = {
+            "symbol": symbol,
+            "description": instrument.get("description") or "",
+            "market": instrument_id.get("marketId"),
+            "segment": instrument_id.get("segment"),
+            "cfi_code": instrument.get("cfiCode"),
+        }
+    else:
+        # Marketdata Service: instrumento ya normalizado, se devuelven los campos mínimos
+        symbol = instrument.get("symbol") or ""
+        fields = {
+            "symbol": instrument.get("symbol"),
+            "settlement": instrument.get("settlement"),
+            "currency": instrument.get("currency"),
+            "hasMEP": instrument.get("hasMEP"),
+            "mepPair": instrument.get("mepPair"),
+        }
+    return symbol.upper(), (instrument.get("description") or "").upper(), fields
+
+
+def _instrument_index(source: str, instruments: List[Dict[str, Any]]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """Search index for a TTL-cached listing, upper-cased once and rebuilt only when the listing changes."""
+    # get/set de un dict son atómicos: en una carrera a lo sumo se indexa dos veces el mismo listado
+    cached = _instrument_indexes.get(source)
+    if cached is not None and cached[0] is instruments:
+        return cached[1]
+    index = [_index_entry(source, instrument) for instrument in instruments]
+    _instrument_indexes[source] = (instruments, index)
+    return index
+
+
+def _formatted_bbo(result: Dict[str, Any]) -> Tuple[Any, Any]:
+    """(bid, ask) prices from a get_market_data-shaped result, None where missing."""
+    block = (result.get("market_data") or {}).get("data") or {}
+    bid = block.get("bid")
+    offer = block.get("offer")
+    return (bid.get("price") if bid else None), (offer.get("price") if offer else None)
+
+
+def _service_bbo(quote: Dict[str, Any]) -> Tuple[Any, Any]:
+    """(bid, ask) prices from a Marketdata Service quote, None where missing."""
+    bids = quote.get("bids")
+    offers = quote.get("offers")
+    return (bids[0].get("price") if bids else None), (offers[0].get("price") if offers else None)
+
 
 def _fetch_bond_quotes_for_mep(
     bond_symbol: str,
@@ -51,7 +238,7 @@ def _fetch_bond_quotes_for_mep(
     user_id: str
 ) -> tuple[dict, dict]:
     """
-    Fetch both ARS and USD bond quotes using get_market_data for MEP calculations.
+    Fetch both ARS and USD bond quotes in one market data batch for MEP calculations.
 
     Args:
         bond_symbol: Base bond symbol (e.g., "AL30")
@@ -59,104 +246,82 @@ def _fetch_bond_quotes_for_mep(
         user_id: User identifier
 
     Returns:
-        Tuple of (ars_result, usd_result) dictionaries from get_market_data
+        Tuple of (ars_result, usd_result) dictionaries shaped like get_market_data
     """
     try:
-        def _fetch_one(sym: str, settle: str, retries: int = 3, delay_s: float = 0.4) -> dict:
-            """
-            Try to fetch market data for a symbol using the requested settlement.
-            Retries are limited to the same settlement; WS fallback handles gaps.
-            """
-            target_settle = (settle or "T0").upper()
-            last_err: Optional[Exception] = None
-            for attempt in range(1, retries + 1):
-                try:
-                    s = get_market_data(
-                        symbol=sym,
-                        entries=["BIDS", "OFFERS", "LAST"],
-                        depth=1,
-                        settlement=target_settle,
-                        user_id=user_id,
-                    )
-                    if not s or not isinstance(s, str) or not s.strip():
-                        raise ValueError("Empty market data response")
-                    obj = json.loads(s)
-                    if isinstance(obj, dict) and (obj.get("success") or obj.get("error")):
-                        if obj.get("success"):
-                            meta = obj.setdefault("_meta", {})
-                            meta["settlement_used"] = target_settle
-                        return obj
-                    raise ValueError("Unrecognized market data payload")
-                except Exception as e:
-                    last_err = e
-                    logger.debug(
-                        "Retry %s/%s for %s %s failed: %s",
-                        attempt,
-                        retries,
-                        sym,
-                        target_settle,
-                        e,
-                    )
-                    if attempt < retries:
-                        time.sleep(delay_s)
-                        continue
-                    error_str = str(last_err) if last_err else "unknown error"
-                    return {"success": False, "error": f"{sym}@{target_settle}: {error_str}"}
-
         # Map settlement: CI -> T0, 24hs -> T1
-        settlement_mapped = "T0" if settlement.upper() == "CI" else "T1"
+        settlement_mapped = _settlement_to_broker(settlement)
 
-        # First try REST for both legs
-        ars_result = _fetch_one(bond_symbol, settlement_mapped)
+        # First try REST for both legs in one batch (single auth check, legs in parallel).
+        # Retries are limited to the same settlement; WS fallback handles gaps.
         usd_symbol = f"{bond_symbol}D"
-        usd_result = _fetch_one(usd_symbol, settlement_mapped)
+        ars_result, usd_result = _get_market_data_batch(
+            [bond_symbol, usd_symbol], settlement_mapped, user_id, retries=3
+        )
+        for leg in (ars_result, usd_result):
+            if leg.get("success"):
+                leg.setdefault("_meta", {})["settlement_used"] = settlement_mapped
 
         # WS fallback if any leg failed
         if not (ars_result.get("success") and usd_result.get("success")):
             try:
+                # Import here to avoid circular dependency (mep uses this module's MEP helpers)
+                from .mep import (
+                    _create_error_handler,
+                    _create_exception_handler,
+                    _create_market_data_handler,
+                    _create_order_report_handler,
+                )
+
                 success, error, session = _require_auth(user_id)
                 if not success:
                     return ars_result, usd_result
 
-                # Initialize WS if needed
-                if not session_registry.websocket_initialized(user_id):
-                    md_handler = _create_market_data_handler(user_id)
-                    or_handler = _create_order_report_handler(user_id)
-                    err_handler = _create_error_handler(user_id)
-                    exc_handler = _create_exception_handler(user_id)
-                    session.init_websocket(
-                        market_data_handler=md_handler,
-                        order_report_handler=or_handler,
-                        error_handler=err_handler,
-                        exception_handler=exc_handler,
-                    )
-                    session_registry.mark_websocket_initialized(user_id)
-
                 # Determine full BYMA tickers for subscription
                 market_enum, ars_full = MarketHelpers.detect_market_and_ticker(bond_symbol, settlement)
                 _, usd_full = MarketHelpers.detect_market_and_ticker(usd_symbol, settlement)
 
-                entries = MarketHelpers.map_market_data_entries(["BIDS", "OFFERS", "LAST"])
+                entries = MarketHelpers.map_market_data_entries(_DEFAULT_ENTRIES)
+                subscription_key = (frozenset((ars_full, usd_full)), _DEFAULT_ENTRIES, market_enum)
+
+                def _ensure_ws_subscription() -> None:
+                    # Un solo init/subscribe por usuario aunque haya varios MEP concurrentes
+                    with session_registry.ws_lock(user_id):
+                        if not session_registry.websocket_initialized(user_id):
+                            session.init_websocket(
+                                market_data_handler=_create_market_data_handler(user_id),
+                                order_report_handler=_create_order_report_handler(user_id),
+                                error_handler=_create_error_handler(user_id),
+                                exception_handler=_create_exception_handler(user_id),
+                            )
+                            session_registry.mark_websocket_initialized(user_id)
+                        if not session_registry.market_data_subscribed(user_id, subscription_key):
+                            pyRofex.market_data_subscription(
+                                tickers=[ars_full, usd_full],
+                                entries=entries,
+                                market=market_enum
+                            )
+                            session_registry.record_market_data_subscription(user_id, subscription_key)
 
                 try:
-                    pyRofex.market_data_subscription(
-                        tickers=[ars_full, usd_full],
-                        entries=entries,
-                        market=market_enum
-                    )
+                    _ensure_ws_subscription()
                 except Exception:
                     # Subscription failure prevents WS fallback; log for debugging and continue without WS data
                     logger.debug("Market data subscription failed for WS fallback", exc_info=True)
                     return ars_result, usd_result
 
                 wanted = {ars_full.upper(), usd_full.upper()}
-                deadline = time.time() + 2.0
+                deadline = time.monotonic() + 2.0
                 got = {}
-                while time.time() < deadline and len(got) < 2:
+                # store_quote() setea el evento: se despierta apenas llega una cotización
+                quote_event = session_registry.quote_event(user_id)
+                while len(got) < 2:
+                    # Limpiar antes de leer: una cotización que llegue durante el scan vuelve a despertar
+                    quote_event.clear()
+                    # store_quote() ya guarda las claves en mayúsculas: sin .upper() por tick
                     user_quotes = session_registry.list_quotes(user_id)
                     for k, v in user_quotes.items():
-                        ku = k.upper()
-                        if ku in wanted and ku not in got and isinstance(v, dict):
+                        if k in wanted and k not in got and isinstance(v, dict):
                             bid = v.get("bid")
                             ask = v.get("ask")
                             last = v.get("last")
@@ -171,29 +336,18 @@ def _fetch_bond_quotes_for_mep(
                                     "last": {"price": last, "size": None, "datetime": None} if last is not None else None,
                                 },
                             }
-                            got[ku] = {"success": True, "symbol": k, "market_data": formatted}
-                    if len(got) < 2:
-                        time.sleep(0.2)
+                            got[k] = {"success": True, "symbol": k, "market_data": formatted}
+                    remaining = deadline - time.monotonic()
+                    if len(got) < 2 and remaining > 0:
+                        # Tope de 0.5s por espera para reintentar el init del WS si se cayó
+                        quote_event.wait(min(remaining, 0.5))
                         if not session_registry.websocket_initialized(user_id):
                             try:
-                                md_handler = _create_market_data_handler(user_id)
-                                or_handler = _create_order_report_handler(user_id)
-                                err_handler = _create_error_handler(user_id)
-                                exc_handler = _create_exception_handler(user_id)
-                                session.init_websocket(
-                                    market_data_handler=md_handler,
-                                    order_report_handler=or_handler,
-                                    error_handler=err_handler,
-                                    exception_handler=exc_handler,
-                                )
-                                session_registry.mark_websocket_initialized(user_id)
-                                pyRofex.market_data_subscription(
-                                    tickers=[ars_full, usd_full],
-                                    entries=entries,
-                                    market=market_enum
-                                )
+                                _ensure_ws_subscription()
                             except Exception:
                                 logger.debug("Re-initializing websocket during fallback failed", exc_info=True)
+                    else:
+                        break
 
                 # Fill missing legs from WS if available
                 if not ars_result.get("success") and ars_full.upper() in got:
@@ -215,7 +369,7 @@ def _calculate_mep_via_pyrofex(
     bond_symbol: str,
     settlement: str,
     user_id: str
-) -> str:
+) -> Dict[str, Any]:
     """
     Calculate MEP price using pyRofex get_market_data (requires authentication).
     """
@@ -223,7 +377,7 @@ def _calculate_mep_via_pyrofex(
         # Require authentication like normal orders
         success, error, session = _require_auth(user_id)
         if not success:
-            return _safe_json({"success": False, "error": error})
+            return {"success": False, "error": error}
 
         session.update_activity()
 
@@ -234,29 +388,20 @@ def _calculate_mep_via_pyrofex(
 
         # Check if both requests succeeded
         if not ars_data.get("success"):
-            return _safe_json({
+            return {
                 "success": False,
                 "error": f"Error obteniendo cotización ARS: {ars_data.get('error', 'Unknown error')}"
-            })
+            }
 
         if not usd_data.get("success"):
-            return _safe_json({
+            return {
                 "success": False,
                 "error": f"Error obteniendo cotización USD: {usd_data.get('error', 'Unknown error')}"
-            })
-
-        # Extract bid/ask prices from formatted market data
-        ars_market_data = ars_data.get("market_data", {})
-        usd_market_data = usd_data.get("market_data", {})
-
-        # Get bid/ask from formatted structure (data.bid/data.offer)
-        ars_data_block = ars_market_data.get("data", {})
-        usd_data_block = usd_market_data.get("data", {})
+            }
 
-        ars_bid = ars_data_block.get("bid", {}).get("price") if ars_data_block.get("bid") else None
-        ars_ask = ars_data_block.get("offer", {}).get("price") if ars_data_block.get("offer") else None
-        usd_bid = usd_data_block.get("bid", {}).get("price") if usd_data_block.get("bid") else None
-        usd_ask = usd_data_block.get("offer", {}).get("price") if usd_data_block.get("offer") else None
+        # Extract bid/ask prices from formatted market data (market_data.data.bid/offer)
+        ars_bid, ars_ask = _formatted_bbo(ars_data)
+        usd_bid, usd_ask = _formatted_bbo(usd_data)
 
         # Store raw prices before normalization (USD bonds are quoted per 100 nominal)
         raw_ars_bid = ars_bid * 100 if ars_bid is not None else None
@@ -266,29 +411,16 @@ def _calculate_mep_via_pyrofex(
 
         # Validate all prices are available
         if not all([ars_bid, ars_ask, usd_bid, usd_ask]):
-            return _safe_json({
+            return {
                 "success": False,
                 "error": f"Cotizaciones incompletas para MEP {bond_symbol}. Faltan precios bid/ask."
-            })
+            }
 
-        # Calculate MEP rates (same logic as before)
-        mep_buy_rate = round(float(ars_bid) / float(usd_ask), 2)
-        mep_sell_rate = round(float(ars_ask) / float(usd_bid), 2)
-
-        # Calculate spread
-        spread = round(mep_sell_rate - mep_buy_rate, 2)
-        spread_pct = round((spread / mep_buy_rate) * 100, 2)
-
-        return _safe_json({
+        return {
             "success": True,
             "bond_symbol": bond_symbol,
             "settlement": settlement,
-            "mep_rates": {
-                "buy_rate": mep_buy_rate,
-                "sell_rate": mep_sell_rate,
-                "spread": spread,
-                "spread_percent": spread_pct
-            },
+            "mep_rates": _mep_rates(ars_bid, ars_ask, usd_bid, usd_ask),
             "underlying_quotes": {
                 "ars_bond": {
                     "symbol": bond_symbol.upper(),
@@ -306,7 +438,7 @@ def _calculate_mep_via_pyrofex(
                 }
             },
             "data_source": "pyrofex"
-        })
+        }
 
     except Exception as e:
         logger.error(f"pyRofex MEP calculation error: {e}")
@@ -318,17 +450,13 @@ def _calculate_mep_via_marketdata(
     bond_symbol: str,
     settlement: str,
     user_id: str
-) -> str:
+) -> Dict[str, Any]:
     """
     Calculate MEP price using marketdata service (original implementation).
     """
     try:
-        import requests
-
-        base = _get_marketdata_base_url().rstrip("/")
-
         # Map settlement for marketdata service
-        settlement_param = "t0" if settlement.upper() == "CI" else "t1"
+        settlement_param = _settlement_to_service(settlement)
 
         # Get both ARS and USD bond quotes
         ars_symbol = bond_symbol.upper()  # e.g., AL30
@@ -338,72 +466,47 @@ def _calculate_mep_via_marketdata(
         params_ars = {"symbols": ars_symbol, "settlement": settlement_param}
         params_usd = {"symbols": usd_symbol, "settlement": settlement_param}
 
-        r_ars = requests.get(f"{base}/v1/quotes", params=params_ars, timeout=5)
-        r_usd = requests.get(f"{base}/v1/quotes", params=params_usd, timeout=5)
+        ars_future = _MEP_LEG_POOL.submit(_marketdata_get, "/v1/quotes", params_ars, _REST_TIMEOUT, _MD_QUOTES_TTL)
+        usd_future = _MEP_LEG_POOL.submit(_marketdata_get, "/v1/quotes", params_usd, _REST_TIMEOUT, _MD_QUOTES_TTL)
+        ars_status, ars_data = ars_future.result()
+        usd_status, usd_data = usd_future.result()
 
-        if r_ars.status_code != 200 or r_usd.status_code != 200:
-            return _safe_json({
+        if ars_status != 200 or usd_status != 200:
+            return {
                 "success": False,
                 "error": f"No se pudieron obtener cotizaciones para {bond_symbol} MEP"
-            })
-
-        ars_data = r_ars.json()
-        usd_data = r_usd.json()
+            }
 
         if not isinstance(ars_data, list) or not ars_data:
-            return _safe_json({
+            return {
                 "success": False,
                 "error": f"No hay datos disponibles para {ars_symbol}"
-            })
+            }
 
         if not isinstance(usd_data, list) or not usd_data:
-            return _safe_json({
+            return {
                 "success": False,
                 "error": f"No hay datos disponibles para {usd_symbol}"
-            })
+            }
 
         ars_quote = ars_data[0]
         usd_quote = usd_data[0]
 
         # Extract bid/ask prices
-        ars_bid = None
-        ars_ask = None
-        usd_bid = None
-        usd_ask = None
-
-        if ars_quote.get("bids"):
-            ars_bid = ars_quote["bids"][0].get("price")
-        if ars_quote.get("offers"):
-            ars_ask = ars_quote["offers"][0].get("price")
-        if usd_quote.get("bids"):
-            usd_bid = usd_quote["bids"][0].get("price")
-        if usd_quote.get("offers"):
-            usd_ask = usd_quote["offers"][0].get("price")
+        ars_bid, ars_ask = _service_bbo(ars_quote)
+        usd_bid, usd_ask = _service_bbo(usd_quote)
 
         if not all([ars_bid, ars_ask, usd_bid, usd_ask]):
-            return _safe_json({
+            return {
                 "success": False,
                 "error": f"Cotizaciones incompletas para MEP {bond_symbol}. Faltan precios bid/ask."
-            })
+            }
 
-        # Calculate MEP rates
-        mep_buy_rate = round(float(ars_bid) / float(usd_ask), 2)
-        mep_sell_rate = round(float(ars_ask) / float(usd_bid), 2)
-
-        # Calculate spread
-        spread = round(mep_sell_rate - mep_buy_rate, 2)
-        spread_pct = round((spread / mep_buy_rate) * 100, 2)
-
-        return _safe_json({
+        return {
             "success": True,
             "bond_symbol": bond_symbol,
             "settlement": settlement,
-            "mep_rates": {
-                "buy_rate": mep_buy_rate,
-                "sell_rate": mep_sell_rate,
-                "spread": spread,
-                "spread_percent": spread_pct
-            },
+            "mep_rates": _mep_rates(ars_bid, ars_ask, usd_bid, usd_ask),
             "underlying_quotes": {
                 "ars_bond": {
                     "symbol": ars_symbol,
@@ -418,16 +521,13 @@ def _calculate_mep_via_marketdata(
             },
             "updated_at": ars_quote.get("updatedAt") or usd_quote.get("updatedAt"),
             "data_source": "marketdata"
-        })
+        }
 
     except Exception as e:
         logger.error(f"marketdata MEP calculation error: {e}")
         raise
 
 
-@mcp.tool()
-
-
 @mcp.tool()
 def get_instruments(
     type: str = "all",
@@ -498,14 +598,10 @@ def marketdata_get_instruments() -> str:
         JSON string with instruments list from marketdata service
     """
     try:
-        import requests
-
-        base = _get_marketdata_base_url().rstrip("/")
-        r = requests.get(f"{base}/v1/instruments", timeout=10)
-        if r.status_code != 200:
-            return _safe_json({"success": False, "error": f"Marketdata service {r.status_code}"})
+        status, instruments = _marketdata_get("/v1/instruments", None, _INSTRUMENTS_TIMEOUT, _INSTRUMENTS_TTL)
+        if status != 200:
+            return _safe_json({"success": False, "error": f"Marketdata service {status}"})
 
-        instruments = r.json() if r.headers.get("content-type", "").startswith("application/json") else []
         if not isinstance(instruments, list):
             instruments = []
 
@@ -544,15 +640,10 @@ def marketdata_get_quote(
         JSON string with minimal quote fields to avoid context bloat
     """
     try:
-        import requests
-
-        base = _get_marketdata_base_url().rstrip("/")
-        s_norm = _normalize_mep_settlement_input(settlement)
-        service_settlement = "t0" if s_norm.upper() == "CI" else "t1"
+        service_settlement = _settlement_to_service(settlement)
         params = {"symbols": symbol, "settlement": service_settlement}
-        r = requests.get(f"{base}/v1/quotes", params=params, timeout=5)
-        if r.status_code == 200 and r.headers.get("content-type", "").startswith("application/json"):
-            arr = r.json()
+        status, arr = _marketdata_get("/v1/quotes", params, _REST_TIMEOUT, _MD_QUOTES_TTL)
+        if status == 200 and arr is not None:
             if isinstance(arr, list) and arr:
                 q = arr[0]
                 top_bid = (q.get("bids") or [{}])[0] if (q.get("bids") and len(q.get("bids")) > 0) else None
@@ -575,7 +666,7 @@ def marketdata_get_quote(
 
                 return _safe_json({"success": True, "data": data})
             raise ValueError(f"No data for {symbol} {settlement}")
-        raise ValueError(f"Marketdata service error ({r.status_code})")
+        raise ValueError(f"Marketdata service error ({status})")
 
     except Exception as e:
         logger.debug(f"marketdata_get_quote fallback to pyRofex for {symbol} {settlement}: {e}")
@@ -596,22 +687,19 @@ def marketdata_get_quote(
 def marketdata_get_orderbook(
     symbol: str,
     settlement: str = "CI",
-    depth: int = 5
+    depth: int = 5,
+    user_id: str = "anonymous"
 ) -> str:
     """
     Get order book (bids/offers) from the Marketdata Service with bounded depth.
-    Defaults to depth=5 to remain compact.
+    Defaults to depth=5 to remain compact. Falls back to pyRofex with the
+    session of `user_id` when the service is unavailable.
     """
     try:
-        import requests
-
-        base = _get_marketdata_base_url().rstrip("/")
-        s_norm = _normalize_mep_settlement_input(settlement)
-        service_settlement = "t0" if s_norm.upper() == "CI" else "t1"
+        service_settlement = _settlement_to_service(settlement)
         params = {"symbols": symbol, "settlement": service_settlement}
-        r = requests.get(f"{base}/v1/quotes", params=params, timeout=5)
-        if r.status_code == 200 and r.headers.get("content-type", "").startswith("application/json"):
-            arr = r.json()
+        status, arr = _marketdata_get("/v1/quotes", params, _REST_TIMEOUT, _MD_QUOTES_TTL)
+        if status == 200 and arr is not None:
             if isinstance(arr, list) and arr:
                 q = arr[0]
                 data = {
@@ -626,7 +714,7 @@ def marketdata_get_orderbook(
                 }
                 return _safe_json({"success": True, "data": data})
             raise ValueError(f"No data for {symbol} {settlement}")
-        raise ValueError(f"Marketdata service error ({r.status_code})")
+        raise ValueError(f"Marketdata service error ({status})")
 
     except Exception as e:
         logger.debug(f"marketdata_get_orderbook fallback to pyRofex for {symbol} {settlement}: {e}")
@@ -646,31 +734,20 @@ def marketdata_search_instruments(
     Returns minimal fields: symbol, settlement, currency, hasMEP, mepPair.
     """
     try:
-        import requests
-
         if not query or len(query.strip()) < 1:
             return _safe_json({"success": False, "error": "query required"})
 
-        base = _get_marketdata_base_url().rstrip("/")
-        r = requests.get(f"{base}/v1/instruments", timeout=5)
-        if r.status_code != 200:
-            return _safe_json({"success": False, "error": f"Marketdata service {r.status_code}"})
-        arr = r.json() if r.headers.get("content-type", "").startswith("application/json") else []
+        status, arr = _marketdata_get("/v1/instruments", None, _INSTRUMENTS_TIMEOUT, _INSTRUMENTS_TTL)
+        if status != 200:
+            return _safe_json({"success": False, "error": f"Marketdata service {status}"})
         if not isinstance(arr, list):
             arr = []
 
         q = query.strip().upper()
         matches = []
-        for inst in arr:
-            sym = (inst.get("symbol") or "").upper()
+        for sym, _, fields in _instrument_index("marketdata", arr):
             if q in sym:
-                matches.append({
-                    "symbol": inst.get("symbol"),
-                    "settlement": inst.get("settlement"),
-                    "currency": inst.get("currency"),
-                    "hasMEP": inst.get("hasMEP"),
-                    "mepPair": inst.get("mepPair"),
-                })
+                matches.append(fields)
             if len(matches) >= limit:
                 break
 
@@ -679,6 +756,23 @@ def marketdata_search_instruments(
         return _safe_json({"success": False, "error": str(e)})
 
 
+@mcp.tool()
+def marketdata_clear_cache() -> str:
+    """
+    Drop cached Marketdata Service responses (quotes and instruments).
+
+    The service base URL is re-read from settings/environment on the next call.
+
+    Returns:
+        JSON string with the number of cached responses removed
+    """
+    with _md_cache_lock:
+        cleared = len(_md_cache)
+        _md_cache.clear()
+    _marketdata_base.cache_clear()
+    return _safe_json({"success": True, "cleared": cleared})
+
+
 @mcp.tool()
 def get_market_data(
     symbol: str,
@@ -702,174 +796,248 @@ def get_market_data(
     Returns:
         JSON string with market data
     """
+    return _safe_json(_get_market_data_impl(symbol, entries, depth, market_id, settlement, user_id))
+
+
+def _get_market_data_impl(
+    symbol: str,
+    entries: Optional[List[str]] = None,
+    depth: int = 1,
+    market_id: Optional[str] = None,
+    settlement: str = "CI",
+    user_id: str = "anonymous"
+) -> Dict[str, Any]:
+    """get_market_data payload as a dict, for in-process callers that would otherwise re-parse the JSON."""
     try:
         success, error, session = _require_auth(user_id)
         if not success:
-            return _safe_json({"success": False, "error": error})
+            return {"success": False, "error": error}
         
         session.update_activity()
         
-        # Normalize settlement input (support CI/24hs preferred; legacy T0/T1 accepted)
-        _settlement_in = settlement
-        if isinstance(_settlement_in, str):
-            s_norm = _settlement_in.strip().upper()
-            if s_norm in ("CI", "T0"):
-                settlement_broker = "T0"
-            elif s_norm in ("24HS", "T1"):
-                settlement_broker = "T1"
-            else:
-                settlement_broker = "T0"  # default to CI as safer default
-        else:
-            settlement_broker = "T0"
+        settlement_broker = _settlement_to_broker(settlement)
 
         # Auto-detect market and full ticker if not provided
         if market_id is None:
             market_enum, full_ticker = MarketHelpers.detect_market_and_ticker(symbol, settlement_broker)
             if not market_enum:
-                return _safe_json({"success": False, "error": "Could not determine market for symbol"})
+                return {"success": False, "error": "Could not determine market for symbol"}
             logger.info(f"Auto-detected market {market_enum} for symbol {symbol} -> {full_ticker}")
         else:
             # Use provided market
             market_enum = MarketHelpers.map_market_to_enum(market_id)
             if not market_enum:
-                return _safe_json({"success": False, "error": f"Invalid market '{market_id}'"})
+                return {"success": False, "error": f"Invalid market '{market_id}'"}
             full_ticker = symbol
         
         # Default entries if none provided
         if entries is None:
-            entries = ["BIDS", "OFFERS", "LAST"]
+            entries = _DEFAULT_ENTRIES
         
         # Map entries to enums
         entry_enums = MarketHelpers.map_market_data_entries(entries)
         if not entry_enums:
-            return _safe_json({"success": False, "error": "Invalid market data entries"})
-        
-        # Get market data with explicit market
-        try:
-            result = pyRofex.get_market_data(
-                ticker=full_ticker,
-                entries=entry_enums,
-                depth=depth,
-                market=market_enum
-            )
-        except Exception as fetch_err:
-            logger.error(
-                f"pyRofex.get_market_data failed for {full_ticker} "
-                f"(market={market_enum.value if hasattr(market_enum, 'value') else market_enum}, "
-                f"entries={[e.value if hasattr(e, 'value') else str(e) for e in entry_enums]}, "
-                f"depth={depth}): {fetch_err}"
-            )
-            raise
+            return {"success": False, "error": "Invalid market data entries"}
+        
+        return _get_market_data_core(symbol, full_ticker, entry_enums, depth, market_enum)
+        
+    except Exception as e:
+        logger.error(f"get_market_data error for user {user_id}: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def _get_market_data_core(
+    symbol: str,
+    full_ticker: str,
+    entry_enums: List[Any],
+    depth: int,
+    market_enum: Any
+) -> Dict[str, Any]:
+    """Fetch and format one quote for an already resolved ticker.
+
+    Callers handle auth and ticker detection; pyRofex errors are raised.
+    """
+    # Get market data with explicit market
+    try:
+        result = pyRofex.get_market_data(
+            ticker=full_ticker,
+            entries=entry_enums,
+            depth=depth,
+            market=market_enum
+        )
+    except Exception as fetch_err:
+        logger.error(
+            f"pyRofex.get_market_data failed for {full_ticker} "
+            f"(market={market_enum.value if hasattr(market_enum, 'value') else market_enum}, "
+            f"entries={[e.value if hasattr(e, 'value') else str(e) for e in entry_enums]}, "
+            f"depth={depth}): {fetch_err}"
+        )
+        if isinstance(fetch_err, _DECODE_ERRORS):
+            raise _EmptyMarketDataError(f"Empty market data response: {fetch_err}") from fetch_err
+        raise
 
-        # Log raw response for debugging (truncate if too long)
-        log_result = str(result)[:500] + "..." if len(str(result)) > 500 else result
-        logger.info(f"Raw pyRofex.get_market_data response for {symbol} (market={market_enum}): {log_result}")
+    # Log raw response for debugging (truncate if too long)
+    log_result = str(result)[:500] + "..." if len(str(result)) > 500 else result
+    logger.info(f"Raw pyRofex.get_market_data response for {symbol} (market={market_enum}): {log_result}")
+    
+    # Validate response before formatting
+    if result is None:
+        logger.error(f"pyRofex.get_market_data returned None for symbol {symbol} on market {market_enum}")
+        return {
+            "success": False,
+            "error": f"No hay datos de mercado disponibles para {symbol}",
+            "symbol": symbol,
+            "market": str(market_enum) if market_enum else "unknown"
+        }
+    
+    if not isinstance(result, dict):
+        logger.error(f"pyRofex.get_market_data returned invalid type {type(result)} for {symbol}: {result}")
+        return {
+            "success": False,
+            "error": f"Respuesta inválida del mercado para {symbol}",
+            "symbol": symbol,
+            "market": str(market_enum) if market_enum else "unknown"
+        }
+    
+    # Check if response is an error (has 'status' key instead of 'marketData')
+    if "status" in result and "marketData" not in result:
+        logger.warning(f"API returned error for ticker {full_ticker}: {result}")
+        error_msg = result.get("message", "Error desconocido")
         
-        # Validate response before formatting
-        if result is None:
-            logger.error(f"pyRofex.get_market_data returned None for symbol {symbol} on market {market_enum}")
-            return _safe_json({
-                "success": False,
-                "error": f"No hay datos de mercado disponibles para {symbol}",
-                "symbol": symbol,
-                "market": str(market_enum) if market_enum else "unknown"
-            })
-        
-        if not isinstance(result, dict):
-            logger.error(f"pyRofex.get_market_data returned invalid type {type(result)} for {symbol}: {result}")
-            return _safe_json({
-                "success": False,
-                "error": f"Respuesta inválida del mercado para {symbol}",
-                "symbol": symbol,
-                "market": str(market_enum) if market_enum else "unknown"
-            })
-        
-        # Check if response is an error (has 'status' key instead of 'marketData')
-        if "status" in result and "marketData" not in result:
-            logger.warning(f"API returned error for ticker {full_ticker}: {result}")
-            error_msg = result.get("message", "Error desconocido")
+        # Try fallback ticker formats for BYMA instruments
+        if not "/" in symbol and market_enum == pyRofex.Market.ROFEX:  # Not a future
+            logger.info(f"Trying fallback ticker formats for {symbol}")
             
-            # Try fallback ticker formats for BYMA instruments
-            if not "/" in symbol and market_enum == pyRofex.Market.ROFEX:  # Not a future
-                logger.info(f"Trying fallback ticker formats for {symbol}")
-                
-                # Try alternative ticker formats
-                fallback_tickers = [
-                    symbol,  # Just "AL30"
-                    f"{symbol} - 24hs",  # "AL30 - 24hs"
-                    f"{symbol} - CI",    # "AL30 - CI" for T0
-                ]
+            # Try alternative ticker formats
+            fallback_tickers = [
+                symbol,  # Just "AL30"
+                f"{symbol} - 24hs",  # "AL30 - 24hs"
+                f"{symbol} - CI",    # "AL30 - CI" for T0
+            ]
+            
+            for fallback_ticker in fallback_tickers:
+                if fallback_ticker == full_ticker:  # Skip the one we already tried
+                    continue
                 
-                for fallback_ticker in fallback_tickers:
-                    if fallback_ticker == full_ticker:  # Skip the one we already tried
-                        continue
+                logger.info(f"Trying fallback ticker: {fallback_ticker}")
+                try:
+                    fallback_result = pyRofex.get_market_data(
+                        ticker=fallback_ticker,
+                        entries=entry_enums,
+                        depth=depth,
+                        market=market_enum
+                    )
                     
-                    logger.info(f"Trying fallback ticker: {fallback_ticker}")
-                    try:
-                        fallback_result = pyRofex.get_market_data(
-                            ticker=fallback_ticker,
-                            entries=entry_enums,
-                            depth=depth,
-                            market=market_enum
-                        )
-                        
-                        if fallback_result and isinstance(fallback_result, dict) and "marketData" in fallback_result:
-                            logger.info("Fallback ticker %s worked for %s", fallback_ticker, symbol)
-                            result = fallback_result
-                            full_ticker = fallback_ticker  # Update for logging
-                            break
-                    except Exception as e:
-                        logger.debug(f"Fallback ticker {fallback_ticker} failed: {e}")
-                        continue
-                else:
-                    # None of the fallback tickers worked
-                    logger.error(f"All ticker formats failed for {symbol}. Original error: {error_msg}")
-                    return _safe_json({
-                        "success": False,
-                        "error": f"No se encontraron datos de mercado para {symbol}. Error: {error_msg}",
-                        "symbol": symbol,
-                        "market": str(market_enum) if market_enum else "unknown"
-                    })
-        
-        # Format response (result should have marketData at this point)
-        formatted = MarketHelpers.format_market_data_response(result)
-        try:
-            # Apply display normalization for bonds (divide by 100)
-            sym_for_norm = formatted.get("symbol") or symbol
-            MarketHelpers.normalize_quote_block_for_display(sym_for_norm, formatted.get("data", {}))
-        except Exception as _e:
-            logger.debug(f"Display normalization skipped: {_e}")
-        
-        # If formatting failed, provide Spanish error with context
-        if "error" in formatted:
-            logger.error(f"Market data formatting failed for {symbol} on {market_enum}: {formatted['error']}")
-            available_keys = list(result.keys()) if isinstance(result, dict) else []
-            return _safe_json({
-                "success": False,
-                "error": f"No se pudieron procesar los datos de mercado para {symbol}. Claves disponibles: {available_keys}",
-                "symbol": symbol,
-                "market": str(market_enum) if market_enum else "unknown",
-                "raw_keys": available_keys
-            })
-        
-        return _safe_json({
-            "success": True,
+                    if fallback_result and isinstance(fallback_result, dict) and "marketData" in fallback_result:
+                        logger.info("Fallback ticker %s worked for %s", fallback_ticker, symbol)
+                        result = fallback_result
+                        full_ticker = fallback_ticker  # Update for logging
+                        break
+                except Exception as e:
+                    logger.debug(f"Fallback ticker {fallback_ticker} failed: {e}")
+                    continue
+            else:
+                # None of the fallback tickers worked
+                logger.error(f"All ticker formats failed for {symbol}. Original error: {error_msg}")
+                return {
+                    "success": False,
+                    "error": f"No se encontraron datos de mercado para {symbol}. Error: {error_msg}",
+                    "symbol": symbol,
+                    "market": str(market_enum) if market_enum else "unknown"
+                }
+    
+    # Format response (result should have marketData at this point)
+    formatted = MarketHelpers.format_market_data_response(result)
+    try:
+        # Apply display normalization for bonds (divide by 100)
+        sym_for_norm = formatted.get("symbol") or symbol
+        MarketHelpers.normalize_quote_block_for_display(sym_for_norm, formatted.get("data", {}))
+    except Exception as _e:
+        logger.debug(f"Display normalization skipped: {_e}")
+    
+    # If formatting failed, provide Spanish error with context
+    if "error" in formatted:
+        logger.error(f"Market data formatting failed for {symbol} on {market_enum}: {formatted['error']}")
+        available_keys = list(result.keys()) if isinstance(result, dict) else []
+        return {
+            "success": False,
+            "error": f"No se pudieron procesar los datos de mercado para {symbol}. Claves disponibles: {available_keys}",
             "symbol": symbol,
             "market": str(market_enum) if market_enum else "unknown",
-            "market_data": formatted
-        })
-        
-    except Exception as e:
-        logger.error(f"get_market_data error for user {user_id}: {e}")
-        return _safe_json({"success": False, "error": str(e)})
+            "raw_keys": available_keys
+        }
+    
+    return {
+        "success": True,
+        "symbol": symbol,
+        "market": str(market_enum) if market_enum else "unknown",
+        "market_data": formatted
+    }
 
 
+def _get_market_data_batch(
+    symbols: List[str],
+    settlement: str = "CI",
+    user_id: str = "anonymous",
+    entries: Optional[List[str]] = None,
+    depth: int = 1,
+    retries: int = 1,
+    delay_s: float = 0.2,
+    max_delay_s: float = 1.0,
+    deadline_s: float = 2.0
+) -> List[Dict[str, Any]]:
+    """Quote several BYMA symbols with a single auth check, fetching them in parallel.
+
+    Results come back in the order of `symbols`. Transient failures (network
+    errors, empty/undecodable responses) are retried up to `retries` times with
+    jittered exponential backoff, within `deadline_s` overall; anything else
+    fails at once. Failures are reported as "<symbol>@<T0|T1>: <error>".
+    """
+    deadline = time.monotonic() + deadline_s
+    success, error, session = _require_auth(user_id)
+    if not success:
+        return [{"success": False, "error": error} for _ in symbols]
+
+    session.update_activity()
+
+    settlement_broker = _settlement_to_broker(settlement)
+    entry_enums = MarketHelpers.map_market_data_entries(entries or _DEFAULT_ENTRIES)
+    if not entry_enums:
+        return [{"success": False, "error": "Invalid market data entries"} for _ in symbols]
+
+    def _fetch_one(symbol: str) -> Dict[str, Any]:
+        market_enum, full_ticker = MarketHelpers.detect_market_and_ticker(symbol, settlement_broker)
+        if not market_enum:
+            return {"success": False, "error": "Could not determine market for symbol"}
+        last_err: Optional[Exception] = None
+        for attempt in range(retries):
+            try:
+                return _get_market_data_core(symbol, full_ticker, entry_enums, depth, market_enum)
+            except _RETRYABLE_ERRORS as e:
+                last_err = e
+            except Exception as e:
+                # Ticker inválido, auth, 4xx: reintentar no cambia nada
+                last_err = e
+                break
+            logger.debug("Retry %s/%s for %s %s failed: %s", attempt + 1, retries, symbol, settlement_broker, last_err)
+            pause = min(max_delay_s, delay_s * 2 ** attempt) * random.uniform(0.8, 1.2)
+            if attempt + 1 >= retries or time.monotonic() + pause > deadline:
+                break
+            time.sleep(pause)
+        return {"success": False, "error": f"{symbol}@{settlement_broker}: {last_err}"}
+
+    if len(symbols) == 1:
+        return [_fetch_one(symbols[0])]
+    futures = [_MEP_LEG_POOL.submit(_fetch_one, symbol) for symbol in symbols]
+    return [future.result() for future in futures]
+
 
 @mcp.tool()
 def search_instruments(
     query: str,
     limit: int = 20,
-    user_id: str = "anonymous"
+    user_id: str = "anonymous",
+    force_refresh: bool = False
 ) -> str:
     """
     Search instruments by symbol or description.
@@ -878,6 +1046,7 @@ def search_instruments(
         query: Search query (symbol or text)
         limit: Maximum number of results
         user_id: User identifier
+        force_refresh: Re-fetch the instrument list instead of using the 5-minute cache
         
     Returns:
         JSON string with search results
@@ -892,38 +1061,24 @@ def search_instruments(
         if not query or len(query.strip()) < 2:
             return _safe_json({"success": False, "error": "Query must be at least 2 characters"})
         
-        # Get all instruments for searching
-        all_instruments = pyRofex.get_detailed_instruments()
-        instruments = all_instruments.get("instruments", [])
-        
-        # Search logic
+        # Search the cached, pre-uppercased index
         query_upper = query.upper().strip()
         results = []
         
-        for instrument in instruments:
-            symbol = instrument.get("instrumentId", {}).get("symbol", "")
-            description = instrument.get("description", "")
-            
+        instruments = _get_instruments_cached(force_refresh=force_refresh)
+        for symbol_up, description_up, fields in _instrument_index("pyrofex", instruments):
             # Score matches
             score = 0
-            if symbol and query_upper in symbol.upper():
-                score += 10 if symbol.upper().startswith(query_upper) else 5
-            if description and query_upper in description.upper():
+            if query_upper in symbol_up:
+                score += 10 if symbol_up.startswith(query_upper) else 5
+            if query_upper in description_up:
                 score += 3
             
             if score > 0:
-                results.append({
-                    "symbol": symbol,
-                    "description": description,
-                    "market": instrument.get("instrumentId", {}).get("marketId"),
-                    "segment": instrument.get("instrumentId", {}).get("segment"),
-                    "cfi_code": instrument.get("cfiCode"),
-                    "score": score
-                })
-        
-        # Sort by score and limit
-        results.sort(key=lambda x: x["score"], reverse=True)
-        results = results[:limit]
+                results.append(dict(fields, score=score))
+        
+        # Top `limit` by score (ties keep list order, like a stable sort)
+        results = heapq.nlargest(limit, results, key=itemgetter("score"))
         
         return _safe_json({
             "success": True,
@@ -8,17 +8,11 @@ This module contains MCP tools for:
 - Bond-based USD/ARS arbitrage flows
 """
 
-import os
-import sys
-import json
 import logging
 from typing import Optional, Dict, Any, List
 
 # Add pyRofex to path
-REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-PYROFEX_SRC = os.path.abspath(os.path.join(REPO_ROOT, "pyRofex-master", "src"))
-if PYROFEX_SRC not in sys.path:
-    sys.path.insert(0, PYROFEX_SRC)
+from lib import _bootstrap  # noqa: F401
 
 try:
     import pyRofex
@@ -27,9 +21,19 @@ except ImportError:
     PYROFEX_AVAILABLE = False
 
 # Import configuration and components
-from config import settings
+import config
+from lib.market_helpers import MarketHelpers, _div100
+from lib.session_registry import session_registry
 # Import common utilities
-from .common import _safe_json, _require_auth, _normalize_mep_settlement_input, get_mcp
+from .common import (
+    _json_loads,
+    _normalize_mep_settlement_input,
+    _require_auth,
+    _safe_json,
+    _settlement_to_broker,
+    get_mcp,
+)
+from .market_data import _calculate_mep_via_marketdata, _calculate_mep_via_pyrofex
 
 logger = logging.getLogger(__name__)
 
@@ -54,10 +58,15 @@ def calculate_mep_price(
     Returns:
         JSON string with MEP buy/sell rates and spread
     """
+    return _safe_json(_calculate_mep_price(bond_symbol, settlement, user_id))
+
+
+def _calculate_mep_price(bond_symbol: str, settlement: str, user_id: str) -> Dict[str, Any]:
+    """calculate_mep_price payload as a dict, so the previews don't re-parse its JSON."""
     # Normalize settlement to 'CI' or '24hs' (default CI)
     settlement = _normalize_mep_settlement_input(settlement)
 
-    if settings.use_pyrofex_for_mep:
+    if config.settings.use_pyrofex_for_mep:
         logger.info(f"Using pyRofex for MEP calculation (user: {user_id})")
         try:
             # Try primary method with get_market_data
@@ -66,17 +75,17 @@ def calculate_mep_price(
             logger.warning(f"pyRofex MEP calculation failed: {e}")
 
             # Fallback to marketdata service if available
-            if settings.marketdata_url:
+            if config.settings.marketdata_url:
                 logger.info("Falling back to marketdata service")
                 try:
                     return _calculate_mep_via_marketdata(bond_symbol, settlement, user_id)
                 except Exception as e2:
                     logger.error(f"Fallback MEP calculation also failed: {e2}")
 
-            return _safe_json({
+            return {
                 "success": False,
                 "error": "No se pudo calcular el precio MEP. Tanto pyRofex como el servicio de respaldo fallaron."
-            })
+            }
     else:
         logger.info(f"Using marketdata service for MEP calculation (user: {user_id})")
         # Current implementation
@@ -117,8 +126,7 @@ def preview_mep_buy(
 
         # Normalize and get current MEP rate
         settlement = _normalize_mep_settlement_input(settlement)
-        mep_calc_result = calculate_mep_price(bond_symbol, settlement, user_id)
-        mep_data = json.loads(mep_calc_result)
+        mep_data = _calculate_mep_price(bond_symbol, settlement, user_id)
 
         if not mep_data.get("success"):
             return _safe_json({
@@ -173,10 +181,10 @@ def preview_mep_buy(
         effective_rate = round(actual_ars_received / actual_usd_cost, 2) if actual_usd_cost > 0 else 0
 
         # Map settlement for order generation
-        order_settlement = "T0" if settlement.upper() == "CI" else "T1"
+        order_settlement = _settlement_to_broker(settlement)
 
         # Calculate commission for MEP operations (0.5% per leg)
-        mep_commission_rate = settings.commission_rate
+        mep_commission_rate = config.settings.commission_rate
         usd_commission = round(actual_usd_cost * mep_commission_rate, 2)
         ars_commission = round(actual_ars_received * mep_commission_rate, 2)
 
@@ -278,8 +286,7 @@ def preview_mep_sell(
 
         # Normalize and get current MEP rate
         settlement = _normalize_mep_settlement_input(settlement)
-        mep_calc_result = calculate_mep_price(bond_symbol, settlement, user_id)
-        mep_data = json.loads(mep_calc_result)
+        mep_data = _calculate_mep_price(bond_symbol, settlement, user_id)
 
         if not mep_data.get("success"):
             return _safe_json({
@@ -334,10 +341,10 @@ def preview_mep_sell(
         effective_rate = round(actual_ars_cost / actual_usd_received, 2) if actual_usd_received > 0 else 0
 
         # Map settlement for order generation
-        order_settlement = "T0" if settlement.upper() == "CI" else "T1"
+        order_settlement = _settlement_to_broker(settlement)
 
         # Calculate commission for MEP operations (0.5% per leg)
-        mep_commission_rate = settings.commission_rate
+        mep_commission_rate = config.settings.commission_rate
         usd_commission = round(actual_usd_received * mep_commission_rate, 2)
         ars_commission = round(actual_ars_cost * mep_commission_rate, 2)
 
@@ -447,7 +454,7 @@ def execute_mep_orders(
                 settlement_in = (o or {}).get("settlement")
                 # Accept both human ('CI'/'24hs') and broker ('T0'/'T1') inputs, default CI
                 human_settlement = _normalize_mep_settlement_input(settlement_in)
-                settlement = "T0" if human_settlement.upper() == "CI" else "T1"
+                settlement = _settlement_to_broker(human_settlement)
                 tif = (o or {}).get("time_in_force") or "DAY"
 
                 if not symbol or not side or not size:
@@ -470,7 +477,7 @@ def execute_mep_orders(
                     user_id=user_id,
                 )
 
-                resp = json.loads(resp_json)
+                resp = _json_loads(resp_json)
                 if resp.get("success"):
                     executions.append({
                         "index": idx,
@@ -529,12 +536,12 @@ def execute_mep_buy(
         # Normalize settlement; default CI
         settlement = _normalize_mep_settlement_input(settlement)
         prev_json = preview_mep_buy(usd_amount, bond_symbol, settlement, user_id)
-        prev = json.loads(prev_json)
+        prev = _json_loads(prev_json)
         if not prev.get("success"):
             return _safe_json(prev)
 
         exec_json = execute_mep_orders(prev.get("orders", []), user_id)
-        exec_data = json.loads(exec_json)
+        exec_data = _json_loads(exec_json)
         return _safe_json({
             "success": exec_data.get("success", False),
             "operation_type": "MEP_BUY",
@@ -562,12 +569,12 @@ def execute_mep_sell(
         # Normalize settlement; default CI
         settlement = _normalize_mep_settlement_input(settlement)
         prev_json = preview_mep_sell(usd_amount, bond_symbol, settlement, user_id)
-        prev = json.loads(prev_json)
+        prev = _json_loads(prev_json)
         if not prev.get("success"):
             return _safe_json(prev)
 
         exec_json = execute_mep_orders(prev.get("orders", []), user_id)
-        exec_data = json.loads(exec_json)
+        exec_data = _json_loads(exec_json)
         return _safe_json({
             "success": exec_data.get("success", False),
             "operation_type": "MEP_SELL",
@@ -591,30 +598,20 @@ def _create_market_data_handler(user_id: str):
             
             # Cache the data
             if symbol:
-                # Normalize for display if bond
-                def _div100(v):
-                    try:
-                        return round(float(v) / 100.0, 6)
-                    except Exception:
-                        return v
-                is_bond = False
+                prices = [
+                    ((market_data.get("BI") or [{}])[0] or {}).get("price"),
+                    ((market_data.get("OF") or [{}])[0] or {}).get("price"),
+                    market_data.get("LA", {}).get("price"),
+                    market_data.get("HI", {}).get("price"),
+                    market_data.get("LO", {}).get("price"),
+                ]
+                # Normalize for display if bond: a single bond lookup for every price of the tick
                 try:
-                    is_bond = MarketHelpers.is_bond_symbol(symbol)
+                    if MarketHelpers.is_bond_symbol(symbol):
+                        prices = [_div100(price) for price in prices]
                 except Exception:
-                    is_bond = False
-
-                bid_price = (market_data.get("BI", [{}])[0] or {}).get("price")
-                ask_price = (market_data.get("OF", [{}])[0] or {}).get("price")
-                last_price = market_data.get("LA", {}).get("price")
-                high_price = market_data.get("HI", {}).get("price")
-                low_price = market_data.get("LO", {}).get("price")
-
-                if is_bond:
-                    bid_price = _div100(bid_price)
-                    ask_price = _div100(ask_price)
-                    last_price = _div100(last_price)
-                    high_price = _div100(high_price)
-                    low_price = _div100(low_price)
+                    pass
+                bid_price, ask_price, last_price, high_price, low_price = prices
 
                 session_registry.store_quote(
                     user_id,
@@ -9,17 +9,12 @@ This module contains MCP tools for:
 - Trade history retrieval
 """
 
-import os
-import sys
 import logging
 from typing import Optional, List
 from datetime import datetime, timedelta
 
 # Add pyRofex to path
-REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-PYROFEX_SRC = os.path.abspath(os.path.join(REPO_ROOT, "pyRofex-master", "src"))
-if PYROFEX_SRC not in sys.path:
-    sys.path.insert(0, PYROFEX_SRC)
+from lib import _bootstrap  # noqa: F401
 
 try:
     import pyRofex
@@ -28,7 +23,6 @@ except ImportError:
     PYROFEX_AVAILABLE = False
 
 # Import configuration and components
-from config import settings
 from lib.market_helpers import MarketHelpers
 # Import common utilities
 from .common import _safe_json, _require_auth, _normalize_mep_settlement_input, get_mcp
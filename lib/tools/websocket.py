@@ -9,16 +9,11 @@ This module contains MCP tools for:
 - Subscription management
 """
 
-import os
-import sys
 import logging
 from typing import Optional, List, Dict, Any
 
 # Add pyRofex to path
-REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-PYROFEX_SRC = os.path.abspath(os.path.join(REPO_ROOT, "pyRofex-master", "src"))
-if PYROFEX_SRC not in sys.path:
-    sys.path.insert(0, PYROFEX_SRC)
+from lib import _bootstrap  # noqa: F401
 
 try:
     import pyRofex
@@ -27,7 +22,6 @@ except ImportError:
     PYROFEX_AVAILABLE = False
 
 # Import configuration and components
-from config import settings
 from lib.session_registry import session_registry
 from lib.market_helpers import MarketHelpers
 # Import common utilities
@@ -113,12 +107,7 @@ def subscribe_market_data(
                     state["market_subscriptions"].append(symbol)
             
             # Update session subscriptions
-            for symbol in symbols:
-                session.active_subscriptions[f"md:{symbol}"] = {
-                    "type": "market_data",
-                    "symbol": symbol,
-                    "entries": entries
-                }
+            session.active_subscriptions.update(f"md:{symbol}" for symbol in symbols)
             
             logger.info(f"Market data subscription created for user {user_id}: {symbols}")
             
@@ -196,10 +185,7 @@ def subscribe_order_reports(
                 state["order_subscriptions"].append(trading_account)
             
             # Update session subscriptions
-            session.active_subscriptions[f"or:{trading_account}"] = {
-                "type": "order_reports",
-                "account": trading_account
-            }
+            session.active_subscriptions.add(f"or:{trading_account}")
             
             logger.info(f"Order reports subscription created for user {user_id}, account {trading_account}")
             
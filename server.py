@@ -11,13 +11,13 @@ try:
 except Exception:
     pass
 
-from config import settings
+import config
 from mcp.server.fastmcp import FastMCP
 
 from lib.tools import register_all_tools
 
 logging.basicConfig(
-    level=getattr(logging, settings.log_level, logging.INFO),
+    level=getattr(logging, config.settings.log_level, logging.INFO),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     stream=sys.stderr,
 )
@@ -0,0 +1,148 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import config
+from config import Settings
+
+
+class BrokerConfigCacheTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "broker_config.json")
+        Settings.reload()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+        Settings.reload()
+
+    def _write(self, payload) -> None:
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+
+    def test_reuses_parsed_config_while_file_unchanged(self):
+        """Second load of an unchanged file returns the cached parse."""
+        self._write({"brokers": {"eco": {"default": True}}})
+
+        first = Settings._load_broker_config(self.path)
+        second = Settings._load_broker_config(self.path)
+
+        self.assertIs(first, second)
+
+    def test_file_change_invalidates_cache(self):
+        """Rewriting the file (new mtime/size) forces a fresh parse."""
+        self._write({"brokers": {}})
+        Settings._load_broker_config(self.path)
+
+        self._write({"brokers": {"veta": {"default": False}}})
+        stat_result = os.stat(self.path)
+        os.utime(self.path, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 1_000_000))
+
+        reloaded = Settings._load_broker_config(self.path)
+        self.assertIn("veta", reloaded["brokers"])
+
+    def test_missing_path_is_negative_cached_until_reload(self):
+        """A missing candidate is not probed again until reload() clears the cache."""
+        self.assertIsNone(Settings._load_broker_config(self.path))
+        self.assertIn(self.path, config._MISSING_PATHS)
+
+        self._write({"brokers": {}})
+        self.assertIsNone(Settings._load_broker_config(self.path))
+
+        Settings.reload()
+        self.assertEqual(Settings._load_broker_config(self.path), {"brokers": {}})
+
+    def test_other_stat_errors_are_not_negative_cached(self):
+        """Only ENOENT is remembered; e.g. EACCES is retried on the next load."""
+        with patch("config.os.stat", side_effect=PermissionError):
+            self.assertIsNone(Settings._load_broker_config(self.path))
+        self.assertNotIn(self.path, config._MISSING_PATHS)
+
+
+class BrokerIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.settings = Settings(broker_config={
+            "brokers": {
+                "eco": {"api_url": "https://api.eco.xoms.com.ar/", "default": False},
+                "veta": {"api_url": "https://api.veta.xoms.com.ar/", "default": True},
+            },
+            "user_accounts": {"trader": {"broker": "veta", "username": "u", "password": "p", "account": "1"}},
+        })
+
+    def test_default_broker_drives_live_url(self):
+        """Without an explicit URL the default broker's api_url is used."""
+        self.assertEqual(self.settings.get_default_broker()["api_url"], "https://api.veta.xoms.com.ar/")
+        self.assertEqual(self.settings.pyrofx_live_url, "https://api.veta.xoms.com.ar/")
+
+    def test_accessors_without_broker_config(self):
+        """Settings without broker_config expose empty lookups and the ECO URL."""
+        empty = Settings()
+        self.assertIsNone(empty.get_broker_config("eco"))
+        self.assertIsNone(empty.get_default_broker())
+        self.assertEqual(empty.list_available_brokers(), ())
+        self.assertIsNone(empty.get_user_account("trader"))
+        self.assertIsNone(empty.get_default_user())
+        self.assertEqual(empty.pyrofx_live_url, "https://api.eco.xoms.com.ar/")
+
+    def test_lookups(self):
+        self.assertEqual(self.settings.list_available_brokers(), ("eco", "veta"))
+        self.assertIs(self.settings.list_configured_users(), self.settings.list_configured_users())
+        self.assertEqual(self.settings.get_broker_config("eco")["default"], False)
+        self.assertEqual(self.settings.get_default_user(), "trader")
+        self.assertEqual(self.settings.get_user_account("trader")["account"], "1")
+
+    def test_password_env_reference_is_resolved(self):
+        """A ${VAR} password is read from the environment and memoized once set."""
+        settings = Settings(broker_config={
+            "user_accounts": {"trader": {"username": "u", "password": "${MERVAL_TEST_PASSWORD}", "account": "1"}},
+        })
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(settings.get_user_account("trader")["password"], "")
+
+        with patch.dict(os.environ, {"MERVAL_TEST_PASSWORD": "secreto"}):
+            account = settings.get_user_account("trader")
+        self.assertEqual(account["password"], "secreto")
+        self.assertIs(settings.get_user_account("trader"), account)
+
+    def test_user_account_is_read_only(self):
+        """The shared account mapping cannot be mutated; dict() gives a private copy."""
+        account = self.settings.get_user_account("trader")
+        with self.assertRaises(TypeError):
+            account["password"] = "otro"
+
+        copy = dict(account)
+        copy["password"] = "otro"
+        self.assertEqual(self.settings.get_user_account("trader")["password"], "p")
+
+
+class SettingsLoadTests(unittest.TestCase):
+    def tearDown(self) -> None:
+        Settings.reload()
+
+    def test_load_is_memoized_until_reload(self):
+        """load() returns the same instance; reload() builds and publishes a new one."""
+        first = Settings.load()
+        self.assertIs(Settings.load(), first)
+
+        reloaded = Settings.reload()
+        self.assertIsNot(reloaded, first)
+        self.assertIs(config.settings, reloaded)
+
+    def test_reload_drops_resolved_accounts(self):
+        """reload() clears the user-account memo of the discarded instance."""
+        first = Settings.load()
+        first._user_cache["trader"] = {"password": "viejo"}
+
+        Settings.reload()
+        self.assertEqual(first._user_cache, {})
+
+    def test_validate_reports_first_invalid_value(self):
+        Settings(commission_rate=0.0).validate()
+        with self.assertRaisesRegex(ValueError, "SESSION_TTL_HOURS"):
+            Settings(session_ttl_hours=0, pyrofx_request_timeout=0).validate()
+
+
+if __name__ == "__main__":
+    unittest.main()
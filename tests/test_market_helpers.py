@@ -0,0 +1,251 @@
+import json
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from lib import market_helpers
+from lib.market_helpers import MarketHelpers
+from lib.tools.common import _safe_json
+
+
+class IsBondSymbolTests(unittest.TestCase):
+    def setUp(self) -> None:
+        MarketHelpers._is_bond_symbol_cached.cache_clear()
+
+    def test_recognizes_fallback_roots_and_variants(self):
+        """Fallback roots match as root, currency variant and full BYMA ticker."""
+        with patch.object(MarketHelpers, "_refresh_bond_cache_if_needed"):
+            self.assertTrue(MarketHelpers.is_bond_symbol("AL30"))
+            self.assertTrue(MarketHelpers.is_bond_symbol("al30d"))
+            self.assertTrue(MarketHelpers.is_bond_symbol("MERV - XMEV - GD30 - 24hs"))
+            self.assertFalse(MarketHelpers.is_bond_symbol("GGAL"))
+            self.assertFalse(MarketHelpers.is_bond_symbol(""))
+
+    def test_result_is_memoized_per_symbol(self):
+        with patch.object(MarketHelpers, "_refresh_bond_cache_if_needed"):
+            MarketHelpers.is_bond_symbol("AL30")
+            MarketHelpers.is_bond_symbol("AL30")
+        self.assertEqual(MarketHelpers._is_bond_symbol_cached.cache_info().hits, 1)
+
+
+class BondCacheRefreshTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._saved_cache = MarketHelpers._bond_cache
+        MarketHelpers._bond_cache = dict(self._saved_cache, updated_at=0.0)
+        self.fake_pyrofex = MagicMock()
+        patches = [
+            patch.object(market_helpers, "PYROFEX_AVAILABLE", True),
+            patch.object(market_helpers, "pyRofex", self.fake_pyrofex, create=True),
+            patch.object(market_helpers, "CFICode", SimpleNamespace(BOND="BOND"), create=True),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self) -> None:
+        MarketHelpers._bond_cache = self._saved_cache
+        MarketHelpers._is_bond_symbol_cached.cache_clear()
+
+    @staticmethod
+    def _instruments(*symbols):
+        return {"instruments": [{"instrumentId": {"symbol": s}} for s in symbols]}
+
+    def test_first_load_is_synchronous(self):
+        self.fake_pyrofex.get_instruments.return_value = self._instruments("MERV - XMEV - TX26 - 24hs")
+        self.assertTrue(MarketHelpers.is_bond_symbol("TX26"))
+        self.fake_pyrofex.get_instruments.assert_called_once()
+
+    def test_expired_cache_is_served_while_refreshing_in_background(self):
+        self.fake_pyrofex.get_instruments.return_value = self._instruments("MERV - XMEV - TX26 - 24hs")
+        MarketHelpers._refresh_bond_cache_if_needed()
+        MarketHelpers._bond_cache["updated_at"] -= MarketHelpers.BOND_CACHE_TTL_SECONDS + 1
+
+        release = threading.Event()
+
+        def slow_fetch(*args, **kwargs):
+            release.wait(5)
+            return self._instruments("MERV - XMEV - TX28 - 24hs")
+
+        self.fake_pyrofex.get_instruments.side_effect = slow_fetch
+        self.assertTrue(MarketHelpers.is_bond_symbol("TX26"))
+        self.assertFalse(MarketHelpers.is_bond_symbol("TX28"))
+
+        release.set()
+        for thread in threading.enumerate():
+            if thread.name == "bond-cache-refresh":
+                thread.join(5)
+        self.assertTrue(MarketHelpers.is_bond_symbol("TX28"))
+        self.assertEqual(self.fake_pyrofex.get_instruments.call_count, 2)
+
+
+class NormalizePriceForDisplayTests(unittest.TestCase):
+    def test_bond_prices_carry_no_float_noise(self):
+        cases = {80123.3: 801.233, 4567.89: 45.6789, 99.9: 0.999, "85580": 855.8, 6250: 62.5}
+        with patch.object(MarketHelpers, "_refresh_bond_cache_if_needed"):
+            for raw, expected in cases.items():
+                self.assertEqual(repr(MarketHelpers.normalize_price_for_display("AL30", raw)), repr(expected), raw)
+
+    def test_non_numeric_values_pass_through(self):
+        with patch.object(MarketHelpers, "_refresh_bond_cache_if_needed"):
+            self.assertIsNone(MarketHelpers.normalize_price_for_display("AL30", None))
+            self.assertEqual(MarketHelpers.normalize_price_for_display("AL30", "n/a"), "n/a")
+
+
+class FormatMarketDataResponseTests(unittest.TestCase):
+    def test_formats_top_of_book_and_stats(self):
+        response = {
+            "instrumentId": {"symbol": "GGAL", "marketId": "ROFX"},
+            "timestamp": 1,
+            "marketData": {
+                "BI": [{"price": 10.0, "size": 2}],
+                "OF": [],
+                "LA": {"price": 10.5, "size": 1, "datetime": "2024-01-02"},
+                "HI": {"price": 11.0},
+                "VU": {"size": 300},
+            },
+        }
+        formatted = MarketHelpers.format_market_data_response(response)
+        self.assertEqual(formatted["symbol"], "GGAL")
+        self.assertEqual(formatted["data"], {
+            "bid": {"price": 10.0, "size": 2},
+            "last": {"price": 10.5, "size": 1, "datetime": "2024-01-02"},
+            "high": 11.0,
+            "volume": 300,
+        })
+
+    def test_reports_missing_market_data(self):
+        self.assertIn("error", MarketHelpers.format_market_data_response({"status": "OK"}))
+        self.assertIn("error", MarketHelpers.format_market_data_response(None))
+
+
+class NormalizeQuoteBlockTests(unittest.TestCase):
+    def test_bond_block_is_divided_once(self):
+        data = {"bid": {"price": 85580.0, "size": 1}, "last": {"price": 85600}, "high": 86000, "volume": 10}
+        with patch.object(MarketHelpers, "_refresh_bond_cache_if_needed"):
+            result = MarketHelpers.normalize_quote_block_for_display("AL30", data)
+        self.assertIs(result, data)
+        self.assertEqual(data, {"bid": {"price": 855.8, "size": 1}, "last": {"price": 856.0}, "high": 860.0, "volume": 10})
+
+    def test_non_bond_block_is_untouched(self):
+        data = {"bid": {"price": 1500.0}}
+        with patch.object(MarketHelpers, "_refresh_bond_cache_if_needed"):
+            MarketHelpers.normalize_quote_block_for_display("GGAL", data)
+        self.assertEqual(data, {"bid": {"price": 1500.0}})
+
+
+class ExtractRootSymbolTests(unittest.TestCase):
+    def test_extracts_root_from_byma_tickers(self):
+        self.assertEqual(MarketHelpers._extract_root_symbol("MERV - XMEV - AL30 - 24hs"), "AL30")
+        self.assertEqual(MarketHelpers._extract_root_symbol("gd30d - CI"), "GD30D")
+        self.assertEqual(MarketHelpers._extract_root_symbol(" ggal "), "GGAL")
+
+    def test_leaves_unknown_formats_untouched(self):
+        self.assertEqual(MarketHelpers._extract_root_symbol("AL30 - 72HS"), "AL30 - 72HS")
+        self.assertEqual(MarketHelpers._extract_root_symbol("DLR/DIC23"), "DLR/DIC23")
+
+
+class CanonicalizeSymbolTests(unittest.TestCase):
+    def test_maps_aliases_in_every_supported_form(self):
+        for raw in ("YPF", "ypf 24hs", "MERV - XMEV - YPF - 24hs"):
+            self.assertEqual(MarketHelpers.canonicalize_symbol(raw), "YPFD", raw)
+        self.assertEqual(MarketHelpers.canonicalize_symbol("banco macro"), "BMA")
+        self.assertEqual(MarketHelpers.canonicalize_symbol("BANCO_MACRO CI"), "BMA")
+
+    def test_leaves_futures_and_unknown_symbols(self):
+        self.assertEqual(MarketHelpers.canonicalize_symbol("dlr/dic23"), "DLR/DIC23")
+        self.assertEqual(MarketHelpers.canonicalize_symbol("GGAL 24hs"), "GGAL 24HS")
+
+
+class MepPairTests(unittest.TestCase):
+    def test_counterpart_in_both_directions(self):
+        self.assertEqual(MarketHelpers.get_mep_counterpart("AL30"), "AL30D")
+        self.assertEqual(MarketHelpers.get_mep_counterpart("GD30D"), "GD30")
+        self.assertIsNone(MarketHelpers.get_mep_counterpart("GGAL"))
+
+    def test_eligibility_and_read_only_pairs(self):
+        self.assertTrue(MarketHelpers.is_mep_eligible_bond("DICPD"))
+        self.assertFalse(MarketHelpers.is_mep_eligible_bond("TX26"))
+        with self.assertRaises(TypeError):
+            MarketHelpers.get_mep_bond_pairs()["TX26"] = "TX26D"
+
+    def test_recommended_bonds_are_plain_json_encodable_copies(self):
+        bonds = MarketHelpers.get_recommended_mep_bonds()
+        self.assertEqual([b["symbol"] for b in bonds], ["AL30", "GD30", "AE38"])
+        self.assertEqual(json.loads(_safe_json({"bonds": bonds}))["bonds"][1]["usd_symbol"], "GD30D")
+
+        bonds[0]["symbol"] = "otro"
+        self.assertEqual(MarketHelpers.get_recommended_mep_bonds()[0]["symbol"], "AL30")
+
+
+class ValidateMepOrderPairTests(unittest.TestCase):
+    def test_accepts_opposite_sides(self):
+        ars = {"symbol": "AL30", "side": "buy", "size": 10}
+        usd = {"symbol": "AL30D", "side": "SELL", "size": 10}
+        self.assertEqual(MarketHelpers.validate_mep_order_pair(ars, usd), (True, "Valid MEP order pair"))
+
+    def test_rejects_same_side(self):
+        ars = {"symbol": "AL30", "side": "BUY", "size": 10}
+        usd = {"symbol": "AL30D", "side": "BUY", "size": 10}
+        ok, message = MarketHelpers.validate_mep_order_pair(ars, usd)
+        self.assertFalse(ok)
+        self.assertIn("side combination", message)
+
+    def test_rejects_ineligible_bond_and_size_mismatch(self):
+        ok, message = MarketHelpers.validate_mep_order_pair({"symbol": "TX26"}, {"symbol": "TX26D"})
+        self.assertEqual((ok, message), (False, "Bond TX26 is not MEP eligible"))
+
+        ok, message = MarketHelpers.validate_mep_order_pair(
+            {"symbol": "AL30", "side": "BUY", "size": 10}, {"symbol": "AL30D", "side": "BUY", "size": 5},
+        )
+        self.assertFalse(ok)
+        self.assertIn("sizes must match", message)
+
+
+class DetectMepOperationTests(unittest.TestCase):
+    def test_detects_mep_buy_in_any_order(self):
+        usd = {"symbol": "AL30D", "side": "buy", "size": 10, "price": 0.6}
+        ars = {"symbol": "AL30", "side": "SELL", "size": 10, "price": 850}
+        for orders in ([usd, ars], [ars, usd]):
+            detected = MarketHelpers.detect_mep_operation(orders)
+            self.assertEqual(detected["operation_type"], "MEP_BUY")
+            self.assertIs(detected["ars_order"], ars)
+            self.assertAlmostEqual(detected["usd_amount"], 6.0)
+
+    def test_rejects_mismatched_pairs_and_sides(self):
+        self.assertIsNone(MarketHelpers.detect_mep_operation([
+            {"symbol": "AL30", "side": "SELL"}, {"symbol": "GD30D", "side": "BUY"},
+        ]))
+        self.assertIsNone(MarketHelpers.detect_mep_operation([
+            {"symbol": "AL30", "side": "BUY"}, {"symbol": "AL30D", "side": "BUY"},
+        ]))
+        self.assertIsNone(MarketHelpers.detect_mep_operation([{"symbol": "AL30D", "side": "BUY"}]))
+
+
+class MemoizedMappingTests(unittest.TestCase):
+    def test_detect_market_and_ticker_is_memoized(self):
+        MarketHelpers.detect_market_and_ticker.cache_clear()
+        first = MarketHelpers.detect_market_and_ticker("al30", "CI")
+        self.assertEqual(first[1], "MERV - XMEV - AL30 - CI")
+        self.assertIs(MarketHelpers.detect_market_and_ticker("al30", "CI"), first)
+        self.assertEqual(MarketHelpers.detect_market_and_ticker.cache_info().hits, 1)
+
+    def test_entry_lists_are_private_copies(self):
+        first = MarketHelpers.map_market_data_entries(["BIDS", "offers", "NOPE"])
+        self.assertEqual(len(first), 2)
+        first.clear()
+        self.assertEqual(len(MarketHelpers.map_market_data_entries(["BIDS", "offers", "NOPE"])), 2)
+
+
+class ValidateSymbolTests(unittest.TestCase):
+    def test_accepts_stocks_and_futures(self):
+        for symbol in ("GGAL", "ggal", "DLR/DIC23", "AL30-24HS"):
+            self.assertTrue(MarketHelpers.validate_symbol(symbol), symbol)
+
+    def test_rejects_malformed_symbols(self):
+        for symbol in ("", None, "GG AL", "DLR/DICIEMBRE"):
+            self.assertFalse(MarketHelpers.validate_symbol(symbol), symbol)
+
+
+if __name__ == "__main__":
+    unittest.main()
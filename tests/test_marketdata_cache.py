@@ -0,0 +1,150 @@
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+import server  # noqa: F401  (binds the MCP instance before importing tools)
+from config import Settings
+from lib.tools import market_data
+
+
+def _response(status_code=200, body=b'[{"symbol": "AL30"}]'):
+    return MagicMock(status_code=status_code, content=body, headers={"content-type": "application/json"})
+
+
+class MarketdataCacheTests(unittest.TestCase):
+    def setUp(self) -> None:
+        market_data._md_cache.clear()
+        self.addCleanup(market_data._md_cache.clear)
+
+    def test_repeated_quote_is_served_from_cache(self):
+        params = {"symbols": "AL30", "settlement": "t0"}
+        with patch.object(market_data._HTTP, "get", return_value=_response()) as get:
+            first = market_data._marketdata_get("/v1/quotes", params, 5, 60)
+            second = market_data._marketdata_get("/v1/quotes", dict(params), 5, 60)
+        self.assertEqual(first, (200, [{"symbol": "AL30"}]))
+        self.assertEqual(second, first)
+        get.assert_called_once()
+
+    def test_errors_and_expired_entries_are_refetched(self):
+        with patch.object(market_data._HTTP, "get", return_value=_response(503, b"[]")) as get:
+            market_data._marketdata_get("/v1/instruments", None, 5, 60)
+            market_data._marketdata_get("/v1/instruments", None, 5, 60)
+        self.assertEqual(get.call_count, 2)
+
+        with patch.object(market_data._HTTP, "get", return_value=_response()) as get:
+            market_data._marketdata_get("/v1/instruments", None, 5, 0)
+            market_data._marketdata_get("/v1/instruments", None, 5, 0)
+        self.assertEqual(get.call_count, 2)
+
+    def test_non_json_body_is_reported_without_data(self):
+        with patch.object(market_data._HTTP, "get", return_value=_response(502, b"<html>Bad Gateway</html>")):
+            self.assertEqual(market_data._marketdata_get("/v1/quotes", None, 5, 60), (502, None))
+        self.assertEqual(market_data._md_cache, {})
+
+    def test_clear_cache_tool(self):
+        with patch.object(market_data._HTTP, "get", return_value=_response()):
+            market_data._marketdata_get("/v1/instruments", None, 5, 60)
+        self.assertIn('"cleared":1', market_data.marketdata_clear_cache())
+        self.assertEqual(market_data._md_cache, {})
+
+    def test_base_url_is_resolved_once_until_cleared(self):
+        market_data._marketdata_base.cache_clear()
+        self.addCleanup(market_data._marketdata_base.cache_clear)
+        with patch.object(market_data, "_get_marketdata_base_url", return_value="http://md:8000/") as resolve, \
+                patch.object(market_data._HTTP, "get", return_value=_response()) as get:
+            market_data._marketdata_get("/v1/quotes", {"symbols": "AL30"}, 5, 0)
+            market_data._marketdata_get("/v1/quotes", {"symbols": "GD30"}, 5, 0)
+            market_data.marketdata_clear_cache()
+            market_data._marketdata_get("/v1/quotes", {"symbols": "AL30"}, 5, 0)
+        self.assertEqual(get.call_args.args[0], "http://md:8000/v1/quotes")
+        self.assertEqual(resolve.call_count, 2)
+
+    def test_adapter_does_not_retry(self):
+        """Retries live in one layer only; a dead backend fails within the timeout."""
+        self.assertEqual(market_data._HTTP.get_adapter("http://md:8000/").max_retries.total, 0)
+
+    def test_base_url_follows_settings_reload(self):
+        self.addCleanup(Settings.reload)
+        with patch.dict("os.environ", {"MARKETDATA_URL": "http://md-nuevo:9000"}):
+            Settings.reload()
+            self.assertEqual(market_data._get_marketdata_base_url(), "http://md-nuevo:9000")
+
+
+class SearchInstrumentsTests(unittest.TestCase):
+    def setUp(self) -> None:
+        market_data._md_cache.clear()
+        self.addCleanup(market_data._md_cache.clear)
+
+    def test_substring_search_reuses_index_for_cached_list(self):
+        body = b'[{"symbol": "AL30", "currency": "ARS"}, {"symbol": "AL30D", "currency": "USD"}, {"symbol": "GD30"}]'
+        with patch.object(market_data._HTTP, "get", return_value=_response(body=body)) as get:
+            result = market_data.marketdata_search_instruments("l30", limit=5)
+            self.assertEqual(get.call_args.kwargs["timeout"], market_data._INSTRUMENTS_TIMEOUT)
+            index = market_data._instrument_indexes["marketdata"][1]
+            market_data.marketdata_search_instruments("GD")
+        self.assertIn('"count":2', result)
+        self.assertIn('"currency":"USD"', result)
+        self.assertIs(market_data._instrument_indexes["marketdata"][1], index)
+
+
+class MarketdataFallbackTests(unittest.TestCase):
+    def setUp(self) -> None:
+        market_data._md_cache.clear()
+        self.addCleanup(market_data._md_cache.clear)
+
+    def test_quote_and_orderbook_fall_back_to_pyrofex_for_the_user(self):
+        fallback = {"success": True, "data": {"symbol": "AL30"}, "source": "pyrofex"}
+        with patch.object(market_data._HTTP, "get", return_value=_response(status_code=503, body=b"{}")), \
+                patch.object(market_data, "_fallback_marketdata_via_pyrofex", return_value=fallback) as via_pyrofex:
+            quote = market_data.marketdata_get_quote("AL30", "CI", user_id="ana")
+            book = market_data.marketdata_get_orderbook("AL30", "CI", depth=3, user_id="ana")
+        self.assertIn('"source":"pyrofex"', quote)
+        self.assertIn('"source":"pyrofex"', book)
+        self.assertEqual(via_pyrofex.call_args_list[0].args, ("AL30", "CI", 1, "ana"))
+        self.assertEqual(via_pyrofex.call_args_list[1].args, ("AL30", "CI", 3, "ana"))
+
+
+class PyrofexInstrumentsCacheTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._reset()
+        self.addCleanup(self._reset)
+        patcher = patch.object(market_data, "_require_auth", return_value=(True, None, MagicMock()))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _reset() -> None:
+        market_data._instruments_cache.update(data=None, ts=0.0)
+        market_data._instrument_indexes.clear()
+
+    def test_instrument_list_is_fetched_once_within_ttl(self):
+        response = {"instruments": [{"instrumentId": {"symbol": "MERV - XMEV - AL30 - CI"}, "description": "Bonar 2030"}]}
+        with patch.object(market_data.pyRofex, "get_detailed_instruments", return_value=response) as fetch:
+            first = market_data.search_instruments("AL30")
+            market_data.search_instruments("bonar")
+            self.assertEqual(fetch.call_count, 1)
+            market_data.search_instruments("AL30", force_refresh=True)
+            self.assertEqual(fetch.call_count, 2)
+        self.assertIn('"count":1', first)
+
+    def test_results_are_ranked_by_score_and_limited(self):
+        response = {"instruments": [
+            {"instrumentId": {"symbol": "GGAL"}, "description": "Grupo Galicia AL"},
+            {"instrumentId": {"symbol": "MERV - XMEV - AL30 - CI"}, "description": "Bonar"},
+            {"instrumentId": {"symbol": "AL30D"}},
+            {"instrumentId": {"symbol": "AL35"}, "description": "Bonar 2035 AL"},
+        ]}
+        with patch.object(market_data.pyRofex, "get_detailed_instruments", return_value=response):
+            result = json.loads(market_data.search_instruments("al", limit=3))
+        self.assertEqual([(r["symbol"], r["score"]) for r in result["results"]],
+                         [("AL35", 13), ("AL30D", 10), ("GGAL", 8)])
+
+    def test_error_responses_are_not_cached(self):
+        with patch.object(market_data.pyRofex, "get_detailed_instruments", return_value={"status": "ERROR"}) as fetch:
+            self.assertIn('"success":false', market_data.search_instruments("AL30"))
+            market_data.search_instruments("AL30")
+        self.assertEqual(fetch.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,10 @@
-import json
 import unittest
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
+
+import simplejson
 
 import server
-from lib.tools import market_data
+from lib.tools import market_data, mep
 
 
 class FetchBondQuotesTests(unittest.TestCase):
@@ -13,34 +14,122 @@ class FetchBondQuotesTests(unittest.TestCase):
     def test_records_original_settlement_metadata(self):
         """Successful fetch records settlement metadata using requested CI/T0."""
 
-        def fake_get_market_data(symbol, entries=None, depth=1, settlement="CI", user_id="anonymous"):
-            payload = {
+        def fake_core(symbol, full_ticker, entry_enums, depth, market_enum):
+            return {
                 "success": True,
                 "symbol": symbol,
                 "market_data": {"data": {"bid": {"price": 855.8, "size": 1}, "offer": {"price": 856.1, "size": 1}}},
             }
-            return json.dumps(payload)
 
-        with patch("lib.tools.market_data.get_market_data", side_effect=fake_get_market_data):
+        with patch("lib.tools.market_data._get_market_data_core", side_effect=fake_core) as core, \
+                patch("lib.tools.market_data._require_auth", return_value=(True, None, MagicMock())) as auth:
             ars_result, usd_result = market_data._fetch_bond_quotes_for_mep("AL30", "CI", self.user_id)
 
         self.assertTrue(ars_result["success"])
         self.assertTrue(usd_result["success"])
         self.assertEqual(usd_result["_meta"]["settlement_used"], "T0")
+        self.assertEqual(sorted(c.args[1] for c in core.call_args_list),
+                         ["MERV - XMEV - AL30 - CI", "MERV - XMEV - AL30D - CI"])
+        auth.assert_called_once()
 
     def test_aggregates_errors_when_all_attempts_fail(self):
         """Failure message lists the attempted settlements for easier debugging."""
 
-        def always_fail(symbol, entries=None, depth=1, settlement="CI", user_id="anonymous"):
+        def always_fail(*args, **kwargs):
             raise ValueError("Expecting value: line 1 column 1 (char 0)")
 
-        with patch("lib.tools.market_data.get_market_data", side_effect=always_fail), \
-                patch("lib.tools.market_data._require_auth", return_value=(False, "skip", None)):
+        auth_results = [(True, None, MagicMock()), (False, "skip", None)]
+        with patch("lib.tools.market_data._get_market_data_core", side_effect=always_fail), \
+                patch("lib.tools.market_data._require_auth", side_effect=auth_results), \
+                patch("lib.tools.market_data.time.sleep"):
             _, usd_result = market_data._fetch_bond_quotes_for_mep("AL30", "CI", self.user_id)
 
         self.assertFalse(usd_result["success"])
         self.assertIn("AL30D@T0", usd_result["error"])
 
+    def test_permanent_errors_are_not_retried(self):
+        auth_results = [(True, None, MagicMock()), (False, "skip", None)]
+        with patch("lib.tools.market_data._get_market_data_core", side_effect=RuntimeError("Invalid ticker")) as core, \
+                patch("lib.tools.market_data._require_auth", side_effect=auth_results), \
+                patch("lib.tools.market_data.time.sleep") as sleep:
+            ars_result, _ = market_data._fetch_bond_quotes_for_mep("AL30", "CI", self.user_id)
+
+        self.assertEqual(core.call_count, 2)
+        sleep.assert_not_called()
+        self.assertEqual(ars_result["error"], "AL30@T0: Invalid ticker")
+
+    def test_transient_errors_back_off_within_the_deadline(self):
+        empty = market_data._EmptyMarketDataError("Empty market data response")
+        with patch("lib.tools.market_data._get_market_data_core", side_effect=empty) as core, \
+                patch("lib.tools.market_data._require_auth", return_value=(True, None, MagicMock())), \
+                patch("lib.tools.market_data.time.sleep") as sleep:
+            (result,) = market_data._get_market_data_batch(["AL30"], "CI", self.user_id, retries=3)
+
+        self.assertFalse(result["success"])
+        self.assertEqual(core.call_count, 3)
+        first, second = (c.args[0] for c in sleep.call_args_list)
+        self.assertTrue(0.16 <= first <= 0.24 and 0.32 <= second <= 0.48)
+
+
+class GetMarketDataCoreTests(unittest.TestCase):
+    def test_undecodable_body_becomes_retryable(self):
+        with patch.object(market_data.pyRofex, "get_market_data",
+                          side_effect=simplejson.JSONDecodeError("Expecting value", "", 0)):
+            with self.assertRaises(market_data._EmptyMarketDataError):
+                market_data._get_market_data_core("AL30", "MERV - XMEV - AL30 - CI", [], 1, None)
+
+    def test_other_value_errors_are_not_retried(self):
+        with patch.object(market_data.pyRofex, "get_market_data", side_effect=ValueError("bad ticker")) as fetch, \
+                patch("lib.tools.market_data._require_auth", return_value=(True, None, MagicMock())), \
+                patch("lib.tools.market_data.time.sleep") as sleep:
+            (result,) = market_data._get_market_data_batch(["AL30"], "CI", "ana", retries=3)
+        fetch.assert_called_once()
+        sleep.assert_not_called()
+        self.assertEqual(result["error"], "AL30@T0: bad ticker")
+
+
+class MepRatesTests(unittest.TestCase):
+    def test_rates_and_spread_are_rounded_to_cents(self):
+        rates = market_data._mep_rates(1200.0, 1212.5, 0.99, 1.0)
+        self.assertEqual(rates, {"buy_rate": 1200.0, "sell_rate": 1224.75, "spread": 24.75, "spread_percent": 2.06})
+
+    def test_bbo_extraction_tolerates_missing_sides(self):
+        formatted = {"market_data": {"data": {"bid": {"price": 855.8}, "offer": None}}}
+        self.assertEqual(market_data._formatted_bbo(formatted), (855.8, None))
+        self.assertEqual(market_data._formatted_bbo({"success": True}), (None, None))
+        self.assertEqual(market_data._service_bbo({"bids": [], "offers": [{"price": 1.0}]}), (None, 1.0))
+
+    def test_round2_is_symmetric(self):
+        self.assertEqual(market_data._round2(1.005 + 1e-9), 1.01)
+        self.assertEqual(market_data._round2(-1.236), -1.24)
+        self.assertEqual(market_data._round2(3.0), 3.0)
+
+
+class CalculateMepPriceTests(unittest.TestCase):
+    def test_falls_back_to_marketdata_and_serializes_once(self):
+        payload = {"success": True, "mep_rates": {"buy_rate": 1200.0}, "data_source": "marketdata"}
+        fake_settings = MagicMock(use_pyrofex_for_mep=True, marketdata_url="http://md")
+        with patch.object(mep.config, "settings", fake_settings), \
+                patch.object(mep, "_calculate_mep_via_pyrofex", side_effect=RuntimeError("ws caido")), \
+                patch.object(mep, "_calculate_mep_via_marketdata", return_value=payload) as via_md:
+            self.assertIs(mep._calculate_mep_price("AL30", "ci", "ana"), payload)
+            self.assertIn('"data_source":"marketdata"', mep.calculate_mep_price("AL30", "ci", "ana"))
+        self.assertEqual(via_md.call_args.args[1], "CI")
+
+
+class MarketDataHandlerTests(unittest.TestCase):
+    def test_bond_tick_is_normalized_with_a_single_lookup(self):
+        message = {
+            "instrumentId": {"symbol": "MERV - XMEV - AL30 - CI"},
+            "marketData": {"BI": [{"price": 85580}], "OF": [], "LA": {"price": 85600}, "VU": {"size": 3}},
+        }
+        with patch.object(mep.MarketHelpers, "is_bond_symbol", return_value=True) as is_bond, \
+                patch.object(mep.session_registry, "store_quote") as store:
+            mep._create_market_data_handler("ana")(message)
+        is_bond.assert_called_once()
+        quote = store.call_args.args[2]
+        self.assertEqual((quote["bid"], quote["ask"], quote["last"], quote["volume"]), (855.8, None, 856.0, 3))
+
 
 if __name__ == "__main__":
     unittest.main()
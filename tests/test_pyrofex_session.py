@@ -0,0 +1,96 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from lib import pyrofex_session
+from lib.pyrofex_session import SESSION_DURATION, PyRofexSession
+
+
+def _authenticated_session(user_id: str = "ana") -> PyRofexSession:
+    session = PyRofexSession(user_id)
+    session.authenticated = True
+    session.rest_client = object()
+    session._start_validity_window()
+    return session
+
+
+class SessionValidityTests(unittest.TestCase):
+    def test_valid_until_the_window_ends(self):
+        session = _authenticated_session()
+        self.assertTrue(session.is_valid())
+
+        expired_at = session._expires_monotonic + 1
+        with patch("lib.pyrofex_session.time.monotonic", return_value=expired_at):
+            self.assertFalse(session.is_valid())
+
+    def test_expires_at_is_kept_for_display(self):
+        session = _authenticated_session()
+        self.assertEqual(session.expires_at - session.last_activity, SESSION_DURATION)
+
+    def test_unauthenticated_session_is_invalid(self):
+        self.assertFalse(PyRofexSession("ana").is_valid())
+
+
+class IsoTimestampTests(unittest.TestCase):
+    def test_formats_once_until_the_value_changes(self):
+        session = _authenticated_session()
+        first = session.last_activity_iso
+        self.assertEqual(first, session.last_activity.isoformat())
+        self.assertIs(session.last_activity_iso, first)
+
+        session.update_activity()
+        session.last_activity += SESSION_DURATION
+        self.assertEqual(session.last_activity_iso, session.last_activity.isoformat())
+
+    def test_to_dict_uses_cached_strings(self):
+        session = PyRofexSession("ana")
+        data = session.to_dict()
+        self.assertEqual(data["created_at"], session.created_at.isoformat())
+        self.assertIsNone(data["expires_at"])
+
+
+class RefreshTokenTests(unittest.TestCase):
+    def test_reads_token_from_cached_environment_config(self):
+        session = _authenticated_session()
+        session.rest_client = MagicMock()
+        session.environment_config = {"token": "nuevo"}
+
+        self.assertTrue(session.refresh_token())
+        session.rest_client.update_token.assert_called_once()
+        self.assertEqual(session.token, "nuevo")
+
+
+class AuthenticateWithRetryTests(unittest.TestCase):
+    def test_credential_errors_are_not_retried(self):
+        session = PyRofexSession("ana")
+        with patch.object(session, "authenticate", side_effect=Exception("Invalid username or password")) as auth:
+            with self.assertRaises(Exception):
+                session.authenticate_with_retry("u", "p", "a")
+        auth.assert_called_once()
+
+    def test_transient_errors_are_retried(self):
+        session = PyRofexSession("ana")
+        with patch.object(session, "authenticate", side_effect=[Exception("Connection timeout"), True]) as auth, \
+                patch("lib.pyrofex_session.time.sleep"):
+            self.assertTrue(session.authenticate_with_retry("u", "p", "a"))
+        self.assertEqual(auth.call_count, 2)
+
+
+    def test_api_url_is_passed_through(self):
+        session = PyRofexSession("ana")
+        with patch.object(session, "authenticate", return_value=True) as auth:
+            session.authenticate_with_retry("u", "p", "a", api_url="https://api.veta.xoms.com.ar/")
+        self.assertEqual(auth.call_args.kwargs["api_url"], "https://api.veta.xoms.com.ar/")
+
+
+class SetupEnvironmentTests(unittest.TestCase):
+    def test_broker_url_overrides_default_without_touching_settings(self):
+        env = pyrofex_session.Environment.LIVE
+        config = {env: {}}
+        with patch.object(pyrofex_session.pyrofex_globals, "environment_config", config):
+            PyRofexSession("ana")._setup_pyrofex_environment("u", "p", "a", env, "https://api.veta.xoms.com.ar/")
+        self.assertEqual(config[env]["url"], "https://api.veta.xoms.com.ar/")
+        self.assertEqual(config[env]["account"], "a")
+
+
+if __name__ == "__main__":
+    unittest.main()
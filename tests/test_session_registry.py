@@ -0,0 +1,181 @@
+import unittest
+from unittest.mock import patch
+
+from lib.pyrofex_session import PyRofexSession
+from lib.session_registry import MAX_ORDER_UPDATES, SessionRegistry
+
+
+def _session(user_id: str, authenticated: bool = True) -> PyRofexSession:
+    session = PyRofexSession(user_id)
+    if authenticated:
+        session.authenticated = True
+        session.rest_client = object()
+        session._start_validity_window()
+    return session
+
+
+class CleanupTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.registry = SessionRegistry()
+
+    def test_removes_only_expired_sessions(self):
+        fresh, stale = _session("ana"), _session("beto")
+        stale._expires_monotonic -= 10 * 3600
+        self.registry.store_session(fresh)
+        self.registry.store_session(stale)
+
+        with patch.object(SessionRegistry, "remove_session", wraps=self.registry.remove_session) as remove:
+            self.assertEqual(self.registry.cleanup(), 1)
+        remove.assert_called_once_with("beto")
+        self.assertTrue(self.registry.has_session("ana"))
+
+    def test_renewed_session_is_rescheduled(self):
+        session = _session("ana")
+        self.registry.store_session(session)
+        original = session._expires_monotonic
+        self.registry._expiry_heap[0] = (original - 10 * 3600, "ana")
+
+        self.assertEqual(self.registry.cleanup(), 0)
+        self.assertEqual(self.registry._expiry_heap, [(original, "ana")])
+
+    def test_unauthenticated_session_is_removed_on_next_cleanup(self):
+        self.registry.store_session(_session("ana", authenticated=False))
+        self.assertEqual(self.registry.cleanup(), 1)
+        self.assertFalse(self.registry.has_session("ana"))
+
+    def test_prunes_idle_connection_state_without_session(self):
+        self.registry.store_session(_session("ana"))
+        self.registry.get_connection_state("ana")
+        self.registry.append_order_update("beto", {"n": 1})
+
+        self.assertEqual(self.registry.cleanup(), 0)
+        self.assertEqual(self.registry.connection_count(), 2)
+
+        self.assertEqual(self.registry.cleanup(connection_ttl=-1), 1)
+        self.assertIsNone(self.registry.peek_connection_state("beto"))
+        self.assertIsNotNone(self.registry.peek_connection_state("ana"))
+
+    def test_prune_tolerates_touches_from_other_threads(self):
+        for user_id in ("ana", "beto", "carla"):
+            self.registry.get_connection_state(user_id)
+        registry = self.registry
+
+        class TouchingSessions(dict):
+            def __contains__(self, user_id):
+                # Un handler del WebSocket toca un estado en medio del recorrido
+                registry.get_connection_state("ana")
+                return super().__contains__(user_id)
+
+        self.registry._sessions = TouchingSessions()
+        self.assertEqual(self.registry.cleanup(connection_ttl=-1), 3)
+
+    def test_maybe_cleanup_is_throttled(self):
+        self.registry.store_session(_session("ana", authenticated=False))
+        self.assertEqual(self.registry.maybe_cleanup(interval=60), 1)
+
+        self.registry.store_session(_session("beto", authenticated=False))
+        self.assertEqual(self.registry.maybe_cleanup(interval=60), 0)
+        self.assertTrue(self.registry.has_session("beto"))
+
+
+class QuoteCacheTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.registry = SessionRegistry()
+
+    def test_quotes_are_scoped_per_user(self):
+        self.registry.store_quote("ana", "al30", {"bid": 1})
+        self.registry.store_quote("ana", "GD30", {"bid": 2})
+        self.registry.store_quote("beto", "AL30", {"bid": 3})
+
+        self.assertEqual(self.registry.list_quotes("ana"), {"AL30": {"bid": 1}, "GD30": {"bid": 2}})
+        self.assertEqual(self.registry.list_quotes("nadie"), {})
+        self.assertEqual(self.registry.quote_count(), 3)
+
+    def test_quote_count_tracks_overwrites_and_removals(self):
+        self.registry.store_quote("ana", "AL30", {"bid": 1})
+        self.registry.store_quote("ana", "al30", {"bid": 2})
+        self.registry.store_quote("beto", "GD30", {"bid": 3})
+        self.assertEqual(self.registry.quote_count(), 2)
+
+        self.registry.store_session(_session("beto"))
+        self.registry.remove_session("beto")
+        self.assertEqual(self.registry.quote_count(), 1)
+
+    def test_quote_event_is_dropped_with_the_session(self):
+        self.registry.store_session(_session("ana"))
+        self.registry.quote_event("ana")
+        self.registry.remove_session("ana")
+        self.assertNotIn("ana", self.registry._quote_events)
+
+    def test_symbol_keys_are_shared_across_users(self):
+        self.registry.store_quote("ana", "gd" + "30", {"bid": 1})
+        self.registry.store_quote("beto", "GD" + "30".lower(), {"bid": 2})
+        (ana_key,) = self.registry.list_quotes("ana")
+        (beto_key,) = self.registry.list_quotes("beto")
+        self.assertIs(ana_key, beto_key)
+
+    def test_store_quote_sets_the_user_event(self):
+        event = self.registry.quote_event("ana")
+        self.assertIs(self.registry.quote_event("ana"), event)
+
+        self.registry.store_quote("beto", "AL30", {"bid": 1})
+        self.assertFalse(event.is_set())
+        self.registry.store_quote("ana", "AL30", {"bid": 1})
+        self.assertTrue(event.is_set())
+
+    def test_list_quotes_returns_a_copy(self):
+        self.registry.store_quote("ana", "AL30", {"bid": 1})
+        self.registry.list_quotes("ana").clear()
+        self.assertEqual(len(self.registry.list_quotes("ana")), 1)
+
+    def test_clear_user_quotes_only_affects_that_user(self):
+        self.registry.store_quote("ana", "AL30", {"bid": 1})
+        self.registry.store_quote("beto", "AL30", {"bid": 3})
+
+        self.registry.clear_user_quotes("ana")
+
+        self.assertEqual(self.registry.list_quotes("ana"), {})
+        self.assertEqual(self.registry.quote_count(), 1)
+
+
+class OrderUpdateTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.registry = SessionRegistry()
+
+    def test_keeps_only_the_most_recent_updates(self):
+        for i in range(MAX_ORDER_UPDATES + 5):
+            self.registry.append_order_update("ana", {"n": i})
+
+        updates = self.registry.list_order_updates("ana")
+        self.assertEqual(len(updates), MAX_ORDER_UPDATES)
+        self.assertEqual(updates[0], {"n": 5})
+        self.assertEqual(updates[-1], {"n": MAX_ORDER_UPDATES + 4})
+        self.assertEqual(self.registry.order_update_count("ana"), MAX_ORDER_UPDATES)
+
+    def test_subscriptions_reset_with_a_new_websocket(self):
+        key = (frozenset({"MERV - XMEV - AL30 - CI"}), ("BIDS",), None)
+        self.assertIs(self.registry.ws_lock("ana"), self.registry.ws_lock("ana"))
+
+        self.registry.mark_websocket_initialized("ana")
+        self.registry.record_market_data_subscription("ana", key)
+        self.assertTrue(self.registry.market_data_subscribed("ana", key))
+        self.assertFalse(self.registry.market_data_subscribed("beto", key))
+
+        self.registry.get_connection_state("ana")["initialized"] = False
+        self.assertFalse(self.registry.market_data_subscribed("ana", key))
+        self.registry.mark_websocket_initialized("ana")
+        self.assertFalse(self.registry.market_data_subscribed("ana", key))
+
+    def test_ws_lock_is_dropped_with_the_connection(self):
+        self.registry.ws_lock("ana")
+        self.registry.remove_connection("ana")
+        self.assertNotIn("ana", self.registry._ws_locks)
+
+    def test_connection_state_is_reused(self):
+        state = self.registry.get_connection_state("ana")
+        self.assertIs(self.registry.get_connection_state("ana"), state)
+        self.assertEqual(self.registry.list_order_updates("beto"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import threading
+import unittest
+from unittest.mock import patch
+
+import server
+from lib.pyrofex_session import PyRofexSession
+from lib.tools import auth
+
+
+class ProbeSessionApiTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.session = PyRofexSession("ana")
+        self.session.rest_client = object()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def tearDown(self) -> None:
+        self.release.set()
+
+    def _hung_get_segments(self):
+        self.calls += 1
+        self.release.wait(5)
+
+    def test_hung_probe_is_reused_instead_of_stacking(self):
+        with patch.object(auth, "_API_PROBE_TIMEOUT", 0.05), \
+                patch.object(auth, "_API_PROBE_TTL", 0), \
+                patch.object(auth.pyRofex, "get_segments", side_effect=self._hung_get_segments):
+            self.assertFalse(auth._probe_session_api(self.session))
+            self.assertFalse(auth._probe_session_api(self.session))
+            self.assertEqual(self.calls, 1)
+
+            self.release.set()
+            self.session._api_probe_future.result(timeout=1)
+            self.assertTrue(auth._probe_session_api(self.session))
+
+    def test_new_probe_after_the_previous_one_finished(self):
+        with patch.object(auth, "_API_PROBE_TTL", 0), \
+                patch.object(auth.pyRofex, "get_segments", return_value={}) as get_segments:
+            self.assertTrue(auth._probe_session_api(self.session))
+            self.assertTrue(auth._probe_session_api(self.session))
+        self.assertEqual(get_segments.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
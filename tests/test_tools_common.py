@@ -0,0 +1,75 @@
+import importlib.util
+import json
+import unittest
+from datetime import datetime
+from enum import Enum
+
+from lib.tools import common
+from lib.tools.common import (
+    _normalize_mep_settlement_input,
+    _safe_json,
+    _settlement_to_broker,
+    _settlement_to_service,
+)
+
+
+class NormalizeMepSettlementTests(unittest.TestCase):
+    def test_maps_known_inputs(self):
+        cases = {
+            "CI": "CI", "ci": "CI", " t0 ": "CI",
+            "24hs": "24hs", "24HS": "24hs", "24 horas": "24hs", "24-hs": "24hs", "T1": "24hs",
+        }
+        for raw, expected in cases.items():
+            self.assertEqual(_normalize_mep_settlement_input(raw), expected, raw)
+
+    def test_defaults_to_ci(self):
+        for raw in (None, "", "48hs", 24):
+            self.assertEqual(_normalize_mep_settlement_input(raw), "CI", raw)
+
+    def test_maps_straight_to_broker_and_service_codes(self):
+        for raw in ("CI", " t0 ", None, "48hs"):
+            self.assertEqual((_settlement_to_broker(raw), _settlement_to_service(raw)), ("T0", "t0"), raw)
+        for raw in ("24hs", "24 horas", "T1"):
+            self.assertEqual((_settlement_to_broker(raw), _settlement_to_service(raw)), ("T1", "t1"), raw)
+
+
+class SafeJsonTests(unittest.TestCase):
+    def test_encodes_like_json_dumps_with_str_default(self):
+        data = {"precio": 855.8, "operación": "compra", 1: None, "at": datetime(2024, 1, 2, 3, 4, 5)}
+        self.assertEqual(json.loads(_safe_json(data)), json.loads(json.dumps(data, default=str)))
+        self.assertIn("operación", _safe_json(data))
+
+
+class _Side(Enum):
+    BUY = "BUY"
+
+
+_PAYLOAD = {
+    "success": True,
+    "precio": 855.8,
+    "operación": "compra",
+    "cantidad": 10,
+    1: None,
+    "at": datetime(2024, 1, 2, 3, 4, 5),
+    "side": _Side.BUY,
+    "book": [{"price": 0.1, "size": -3}, {"price": 123456789.123, "size": 0}],
+}
+
+
+class EncoderParityTests(unittest.TestCase):
+    def test_stdlib_encoder_serializes_enum_by_value(self):
+        self.assertEqual(json.loads(common._stdlib_encode(_PAYLOAD))["side"], "BUY")
+
+    @unittest.skipUnless(importlib.util.find_spec("orjson"), "orjson no instalado")
+    def test_orjson_and_stdlib_produce_the_same_json(self):
+        self.assertIsNot(common._encode, common._stdlib_encode)
+        self.assertEqual(common._encode(_PAYLOAD), common._stdlib_encode(_PAYLOAD))
+
+    @unittest.skipUnless(importlib.util.find_spec("orjson"), "orjson no instalado")
+    def test_orjson_and_stdlib_parse_the_same(self):
+        raw = common._stdlib_encode(_PAYLOAD).encode()
+        self.assertEqual(common._json_loads(raw), json.loads(raw))
+
+
+if __name__ == "__main__":
+    unittest.main()